@@ -0,0 +1,102 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Time the phases of `pyarmasync.repository.Repository.build` and count metadata calls.
+
+Usage::
+
+  python benchmarks/bench_build_phases.py --files 20000
+
+The measured build is a rebuild where nothing changed, which is dominated by metadata access.
+Run with a cold page cache (e.g. after ``echo 3 > /proc/sys/vm/drop_caches``) to observe the
+cost of each metadata call on disk.
+"""
+
+import argparse
+import collections
+import functools
+import os
+import tempfile
+from typing import Any, Callable, Counter
+
+from pyarmasync import repository
+
+calls: Counter[str] = collections.Counter()
+
+
+def counted(name: str, function: Callable) -> Callable:
+    """Wrap `function` so that its calls are counted under `name`."""
+    @functools.wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        calls[name] += 1
+        return function(*args, **kwargs)
+    return wrapper
+
+
+def populate(path: str, files: int) -> None:
+    """Create `files` small files spread over mods and addon folders."""
+    for index in range(files):
+        directory = os.path.join(path, '@mod{}'.format(index % 50), 'addons{}'.format(index % 7))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'file{}.paa'.format(index)), mode='wb') as file:
+            file.write(index.to_bytes(4, 'little'))
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=20000, help='number of files')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        populate(directory, args.files)
+        repo = repository.Repository.initialize(directory, 'benchmark', 'http://localhost/')
+        repo.build()
+
+        # Stats of DirEntry objects do not go through os.stat: the build counts them itself
+        originals = {name: getattr(os, name) for name in ('scandir', 'remove')}
+        isfile = os.path.isfile
+        try:
+            for name, function in originals.items():
+                setattr(os, name, counted(name, function))
+            os.path.isfile = counted('path.isfile', isfile)
+            stats = repo.build()
+        finally:
+            for name, function in originals.items():
+                setattr(os, name, function)
+            os.path.isfile = isfile
+
+    print('phase timings:')
+    for name, elapsed in stats.phases.items():
+        print('  {:<24} {:>8.3f} s'.format(name, elapsed))
+    print('  {:<24} {:>8.3f} s'.format('total', stats.duration))
+    print('metadata calls:')
+    calls['stat'] = stats.stat_calls
+    for name in ('path.isfile', 'remove', 'scandir', 'stat'):
+        print('  {:<24} {:>8}'.format(name, calls[name]))
+    print('  {:<24} {:>8}'.format('directories scanned', stats.directories_scanned))
+
+
+if __name__ == '__main__':
+    main()
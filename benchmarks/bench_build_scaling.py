@@ -0,0 +1,85 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Measure how `pyarmasync.repository.Repository.build` scales with the number of jobs.
+
+Usage::
+
+  python benchmarks/bench_build_scaling.py --files 200 --size 16 --max-jobs 8
+
+Every round is a paranoid build, so all files are hashed regardless of the stored tree. Run
+with a cold page cache (e.g. after ``echo 3 > /proc/sys/vm/drop_caches``) to measure disk-bound
+behaviour instead of memory bandwidth.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from pyarmasync import repository
+
+
+def populate(path: str, files: int, size: int) -> None:
+    """Create `files` files of `size` bytes spread over a handful of mods."""
+    chunk = os.urandom(1024 * 1024)
+    for index in range(files):
+        directory = os.path.join(path, '@mod{}'.format(index % 8), 'addons')
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, 'file{}.pbo'.format(index)), mode='wb') as file:
+            written = 0
+            while written < size:
+                written += file.write(chunk[:size - written])
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=200, help='number of files')
+    parser.add_argument('--size', type=int, default=16, help='file size in MiB')
+    parser.add_argument('--max-jobs', type=int, default=os.cpu_count() or 1,
+                        help='highest number of jobs to measure')
+    args = parser.parse_args()
+
+    total = args.files * args.size * 1024 * 1024
+    with tempfile.TemporaryDirectory() as directory:
+        populate(directory, args.files, args.size * 1024 * 1024)
+        repo = repository.Repository.initialize(directory, 'benchmark', 'http://localhost/')
+        repo.build()
+
+        print('{:>5} {:>10} {:>10} {:>8}'.format('jobs', 'seconds', 'MB/s', 'speedup'))
+        baseline = None
+        jobs = 1
+        while jobs <= args.max_jobs:
+            start = time.perf_counter()
+            repo.build(paranoid=True, jobs=jobs)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print('{:>5} {:>10.2f} {:>10.1f} {:>8.2f}'.format(jobs, elapsed, total / elapsed / 1e6,
+                                                              baseline / elapsed))
+            jobs *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Measure throughput and peak memory usage of file checksums and signatures.
+
+Every available hash algorithm is measured, unless some are selected with ``--algorithm``, both
+by `pyarmasync.repository.file_checksum` and by `pyarmasync.signature.file_signature`, which is
+what builds run, along with plain reads of the file as a reference of disk speed. The file is
+read from the page cache after the first round: drop caches or use a file larger than memory to
+measure cold reads.
+
+Usage::
+
+  python benchmarks/bench_checksum.py --size 2048 --buffer 1024 --algorithm xxh3
+
+"""
+
+import argparse
+import functools
+import os
+import resource
+import tempfile
+import time
+
+from pyarmasync import hashing, repository, signature
+
+
+def create_file(path: str, size: int) -> None:
+    """Write `size` bytes of pseudo-random data to `path`."""
+    chunk = os.urandom(1024 * 1024)
+    with open(path, mode='wb') as file:
+        written = 0
+        while written < size:
+            written += file.write(chunk[:size - written])
+
+
+def read_file(path: str, buffer_size: int) -> None:
+    """Read the file at `path` like `repository.file_checksum` does, without hashing it."""
+    buffer = bytearray(buffer_size)
+    with open(path, mode='rb', buffering=0) as file:
+        while file.readinto(buffer):
+            pass
+
+
+def peak_rss() -> int:
+    """Return peak resident set size of the current process in bytes."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=1024, help='file size in MiB')
+    parser.add_argument('--buffer', type=int, default=1024, help='read buffer size in KiB')
+    parser.add_argument('--rounds', type=int, default=3, help='number of timed rounds')
+    parser.add_argument('--algorithm', action='append', choices=hashing.available(),
+                        help='hash algorithm to measure, may be repeated (default: all)')
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    buffer_size = args.buffer * 1024
+    candidates = {'read': lambda path: read_file(path, buffer_size)}
+    for algorithm in args.algorithm or hashing.available():
+        candidates[algorithm] = functools.partial(repository.file_checksum, algorithm=algorithm,
+                                                  buffer_size=buffer_size)
+        candidates[algorithm + ' signature'] = functools.partial(signature.file_signature,
+                                                                 algorithm=algorithm)
+
+    print('file size:           {} MiB'.format(args.size))
+    print('buffer size:         {} KiB'.format(args.buffer))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'payload.pbo')
+        create_file(path, size)
+        rss_before = peak_rss()
+
+        for name, function in candidates.items():
+            timings = []
+            for _ in range(args.rounds):
+                start = time.perf_counter()
+                function(path)
+                timings.append(time.perf_counter() - start)
+            print('{:<20} {:.1f} MB/s'.format(name + ':', size / min(timings) / 1e6))
+
+    print('peak RSS delta:      {:.1f} MiB'.format((peak_rss() - rss_before) / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    main()
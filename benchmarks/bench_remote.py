@@ -0,0 +1,104 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Measure throughput of `pyarmasync.transport` against a local HTTP stand-in server.
+
+Usage::
+
+  python benchmarks/bench_remote.py --files 2000 --size 4
+
+Small files measure per-request overhead (connection setup, round trips), which dominates
+fetching synchronization data; the large file measures range request throughput.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import urllib.request
+
+from pyarmasync import transport
+
+from server import Server
+
+
+def report(name: str, elapsed: float, requests: int, size: int) -> None:
+    """Print one result line."""
+    print('{:<28} {:>8.2f} s {:>10.0f} req/s {:>10.1f} MB/s'.format(
+        name, elapsed, requests / elapsed, size / elapsed / 1e6))
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=2000, help='number of small files')
+    parser.add_argument('--size', type=int, default=4, help='small file size in KiB')
+    parser.add_argument('--large', type=int, default=256, help='large file size in MiB')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        keys = ['@mod/file{}.paa'.format(index) for index in range(args.files)]
+        os.makedirs(os.path.join(directory, '@mod'))
+        for key in keys:
+            with open(os.path.join(directory, key), mode='wb') as file:
+                file.write(os.urandom(args.size * 1024))
+        with open(os.path.join(directory, 'large.pbo'), mode='wb') as file:
+            for _ in range(args.large):
+                file.write(os.urandom(1024 * 1024))
+        server = Server(directory)
+        small_total = args.files * args.size * 1024
+
+        start = time.perf_counter()
+        for key in keys:
+            with urllib.request.urlopen(server.url + key) as response:
+                response.read()
+        report('urllib, one at a time', time.perf_counter() - start, args.files, small_total)
+
+        for connections in (1, 4, 8, 16):
+            remote = transport.HTTPTransport(server.url, connections=connections)
+            start = time.perf_counter()
+            for _ in remote.fetch_many((key, None, None) for key in keys):
+                pass
+            report('pooled, {} connections'.format(connections), time.perf_counter() - start,
+                   args.files, small_total)
+            remote.close()
+
+        large_total = args.large * 1024 * 1024
+        chunk = 8 * 1024 * 1024
+        for connections in (1, 4):
+            remote = transport.HTTPTransport(server.url, connections=connections)
+            requests = [('large.pbo', offset, offset + chunk)
+                        for offset in range(0, large_total, chunk)]
+            start = time.perf_counter()
+            for _ in remote.fetch_many(requests):
+                pass
+            report('ranges, {} connections'.format(connections), time.perf_counter() - start,
+                   len(requests), large_total)
+            remote.close()
+
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+r"""Benchmark repository builds and client synchronizations on synthetic modpacks.
+
+Usage::
+
+  python benchmarks/bench_suite.py --profile small --patterns modify insert rename \\
+      --output results.json
+  python benchmarks/bench_suite.py --profile small --compare results.json
+
+A repository shaped by the chosen profile (see `generator.profiles`) is built and synchronized
+by a client through a local HTTP server. Then each mutation pattern is applied in turn, and the
+repository rebuilt and synchronized again. Results are written as JSON; comparing them with a
+previous run reports metrics which grew beyond the tolerance, exiting with status 1.
+
+`peak_rss` is the high-water mark of the whole process, so it only grows across phases.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+import generator
+
+from pyarmasync import client, repository
+
+from server import Server
+
+# Metrics which should not grow between runs, checked by `--compare`
+_TRACKED_METRICS = ('wall_time', 'peak_rss', 'bytes_hashed', 'bytes_transferred', 'requests')
+_TIME_RESOLUTION = 0.05  # Seconds, smaller differences of wall time are noise
+
+
+def peak_rss() -> int:
+    """Return the peak resident set size of the process in bytes."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def measure_build(repo: repository.Repository) -> Dict[str, Any]:
+    """Build `repo`, return build metrics."""
+    start = time.perf_counter()
+    stats = repo.build()
+    elapsed = time.perf_counter() - start
+    metrics = {'wall_time': elapsed, 'peak_rss': peak_rss(), 'files': len(repo.file_checksums),
+               'bytes_hashed': stats.bytes_read}
+    metrics.update(stats.counters)
+    metrics.update(('phase_' + name, seconds) for name, seconds in stats.phases.items())
+    return metrics
+
+
+def measure_sync(consumer: client.Client) -> Dict[str, Any]:
+    """Synchronize `consumer`, return synchronization metrics."""
+    start = time.perf_counter()
+    stats = consumer.sync()
+    elapsed = time.perf_counter() - start
+    metrics = {'wall_time': elapsed, 'peak_rss': peak_rss()}
+    metrics.update(stats.counters)
+    metrics.update(('phase_' + name, seconds) for name, seconds in stats.phases.items())
+    return metrics
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return a description of the tracked metrics which grew beyond `tolerance`."""
+    previous = {entry['name']: entry['metrics'] for entry in baseline['results']}
+    regressions = []
+    for entry in results['results']:
+        for metric in _TRACKED_METRICS:
+            old = previous.get(entry['name'], {}).get(metric)
+            new = entry['metrics'].get(metric)
+            if old is None or new is None or new <= old * (1 + tolerance):
+                continue
+            if metric != 'wall_time' or new - old > _TIME_RESOLUTION:
+                regressions.append('{} {}: {} -> {}'.format(entry['name'], metric, old, new))
+    return regressions
+
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profile', choices=sorted(generator.profiles), default='small',
+                        help='repository shape')
+    parser.add_argument('--mods', type=int, help='override the number of mods')
+    parser.add_argument('--files', type=int, help='override the number of files per mod')
+    parser.add_argument('--large-size', type=int, help='override the large PBO size in MiB')
+    parser.add_argument('--patterns', nargs='*', choices=generator.patterns,
+                        default=['touch', 'modify', 'insert', 'add', 'rename', 'delete'],
+                        help='mutations applied between versions')
+    parser.add_argument('--share', type=float, default=0.1, help='share of files mutated')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the repository layout')
+    parser.add_argument('--output', help='write results to this file instead of stdout')
+    parser.add_argument('--compare', help='results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative growth of a metric reported as regression')
+    args = parser.parse_args()
+
+    profile = generator.profiles[args.profile]
+    if args.mods is not None:
+        profile = profile._replace(mods=args.mods)
+    if args.files is not None:
+        profile = profile._replace(files=args.files)
+    if args.large_size is not None:
+        profile = profile._replace(large_size=args.large_size * generator.MiB)
+
+    results: Dict[str, Any] = {
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(), 'platform': platform.platform(),
+        'profile': dict(profile._asdict(), name=args.profile), 'seed': args.seed,
+        'results': [],
+    }
+
+    def record(name: str, metrics: Dict[str, Any]) -> None:
+        results['results'].append({'name': name, 'metrics': metrics})
+        values = ('{}={:.3f}'.format(key, value) if isinstance(value, float)
+                  else '{}={}'.format(key, value) for key, value in metrics.items())
+        print('{:<24} {}'.format(name, ', '.join(values)), file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as directory:
+        repo_path = os.path.join(directory, 'repository')
+        generator.generate(repo_path, profile, args.seed)
+        repo = repository.Repository.initialize(repo_path, 'benchmark', 'http://localhost/')
+        server = Server(repo_path)
+        consumer = client.Client.create(os.path.join(directory, 'client'), server.url, False)
+
+        record('build/initial', measure_build(repo))
+        record('sync/initial', measure_sync(consumer))
+        record('build/unchanged', measure_build(repo))
+        record('sync/unchanged', measure_sync(consumer))
+        for seed, pattern in enumerate(args.patterns, start=args.seed + 1):
+            files = generator.mutate(repo_path, pattern, args.share, seed)
+            metrics = measure_build(repo)
+            metrics['files_mutated'] = files
+            record('build/' + pattern, metrics)
+            record('sync/' + pattern, measure_sync(consumer))
+
+        server.stop()
+
+    content = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, mode='w') as file:
+            file.write(content + '\n')
+    else:
+        print(content)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print('regression: ' + regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
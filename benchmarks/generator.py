@@ -0,0 +1,147 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Generate synthetic repositories resembling real modpacks, shared by the benchmarks.
+
+A modpack is made of `@mod` folders holding many tiny files (configs, keys, signatures) and a
+few large PBOs. Mutations reproduce what happens between two releases of a modpack.
+"""
+
+import os
+import random
+import shutil
+from typing import Dict, List, NamedTuple
+
+MiB = 1024 * 1024
+_CHUNK = 4 * MiB
+
+# Mutation patterns applied by `mutate`
+patterns = ('none', 'touch', 'modify', 'append', 'insert', 'add', 'delete', 'rename')
+
+
+class Profile(NamedTuple):
+    """Shape of a synthetic repository."""
+
+    mods: int = 10
+    files: int = 100  # Files per mod
+    tiny_size: int = 4096  # Tiny files are sized uniformly up to this many bytes
+    large_files: int = 1  # Large PBOs per mod
+    large_size: int = 64 * MiB  # Large PBOs are sized between half and twice this many bytes
+    duplicates: float = 0.05  # Share of mods shipping a copy of the large PBOs of another
+
+
+profiles = {
+    'tiny': Profile(mods=3, files=20, large_files=1, large_size=MiB),
+    'small': Profile(),
+    'modpack': Profile(mods=40, files=500, large_files=4, large_size=512 * MiB),
+    'huge': Profile(mods=80, files=1000, large_files=2, large_size=2048 * MiB),
+}
+
+
+def write_random(path: str, size: int) -> None:
+    """Write a file of `size` random bytes at `path`."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode='wb') as file:
+        while size > 0:
+            size -= file.write(os.urandom(min(size, _CHUNK)))
+
+
+def generate(path: str, profile: Profile, seed: int = 0) -> Dict[str, int]:
+    """Populate `path` with a repository shaped as `profile`, return file sizes by path.
+
+    Layout and sizes only depend on `seed`; file contents are random.
+    """
+    rng = random.Random(seed)
+    sizes: Dict[str, int] = {}
+    large_files: List[str] = []
+    for mod in range(profile.mods):
+        mod_path = os.path.join(path, '@mod{}'.format(mod))
+        for index in range(profile.files):
+            directory = ('addons', 'keys', 'optionals', '')[index % 4]
+            file_path = os.path.join(mod_path, directory, 'file{}.bin'.format(index))
+            sizes[file_path] = rng.randint(0, profile.tiny_size)
+            write_random(file_path, sizes[file_path])
+
+        for index in range(profile.large_files):
+            file_path = os.path.join(mod_path, 'addons', 'large{}.pbo'.format(index))
+            if large_files and rng.random() < profile.duplicates:
+                shutil.copyfile(rng.choice(large_files), file_path)
+                sizes[file_path] = os.path.getsize(file_path)
+                continue
+            sizes[file_path] = rng.randint(profile.large_size // 2, profile.large_size * 2)
+            write_random(file_path, sizes[file_path])
+            large_files.append(file_path)
+    return sizes
+
+
+def mutate(path: str, pattern: str, share: float = 0.1, seed: int = 0) -> int:
+    """Apply mutation `pattern` to a share of the files in `path`, return the files affected.
+
+    * touch: update modification times only;
+    * modify: overwrite a block in the middle of files;
+    * append: append data to files;
+    * insert: insert data at the beginning of files, shifting their whole content;
+    * add: add new files next to existing ones;
+    * delete: delete files;
+    * rename: rename a share of mod folders.
+    """
+    if pattern not in patterns:
+        raise ValueError('Unknown mutation pattern {}'.format(pattern))
+    rng = random.Random(seed)
+
+    if pattern == 'none':
+        return 0
+    if pattern == 'rename':
+        mods = sorted(entry.path for entry in os.scandir(path)
+                      if entry.is_dir() and entry.name.startswith('@'))
+        renamed = rng.sample(mods, max(1, int(len(mods) * share))) if mods else []
+        for mod in renamed:
+            os.rename(mod, mod + '_renamed')
+        return len(renamed)
+
+    files = sorted(os.path.join(root, name) for root, directories, names in os.walk(path)
+                   for name in names if not root.startswith(os.path.join(path, '.pyarmasync')))
+    selected = rng.sample(files, max(1, int(len(files) * share))) if files else []
+    for file_path in selected:
+        if pattern == 'touch':
+            os.utime(file_path)
+        elif pattern == 'modify':
+            with open(file_path, mode='r+b') as file:
+                size = os.fstat(file.fileno()).st_size
+                file.seek(size // 2)
+                file.write(os.urandom(min(size // 2, 4096)))
+        elif pattern == 'append':
+            with open(file_path, mode='ab') as file:
+                file.write(os.urandom(4096))
+        elif pattern == 'insert':
+            temporary_path = file_path + '.tmp'
+            with open(file_path, mode='rb') as source, open(temporary_path, mode='wb') as dest:
+                dest.write(os.urandom(rng.randint(1, 4096)))
+                shutil.copyfileobj(source, dest, _CHUNK)
+            os.replace(temporary_path, file_path)
+        elif pattern == 'add':
+            write_random(file_path + '.new', rng.randint(0, 64 * 1024))
+        elif pattern == 'delete':
+            os.remove(file_path)
+    return len(selected)
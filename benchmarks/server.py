@@ -0,0 +1,89 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Local HTTP stand-in for a repository server, shared by the benchmarks."""
+
+import functools
+import http.server
+import io
+import os
+import threading
+from typing import Any, Optional
+
+
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Serve static files over persistent connections, supporting single range requests."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    requests = 0
+
+    def send_head(self) -> Optional[Any]:
+        """Answer with partial content if a range is requested."""
+        type(self).requests += 1
+        header = self.headers.get('Range')
+        path = self.translate_path(self.path)
+        if header is None or not os.path.isfile(path):
+            return super().send_head()
+
+        first, last = header.replace('bytes=', '').split('-')
+        with open(path, mode='rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            file.seek(start)
+            content = file.read(end - start + 1)
+
+        self.send_response(206)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, size))
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        return io.BytesIO(content)
+
+    def log_message(self, *args: Any) -> None:
+        """Keep benchmark output clean."""
+        pass
+
+
+class Server(object):
+    """Serve a directory over HTTP from a background thread."""
+
+    def __init__(self, path: str) -> None:
+        """Start serving `path`."""
+        handler = functools.partial(RangeRequestHandler, directory=path)
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.httpd.daemon_threads = True
+        self.url = 'http://127.0.0.1:{}/'.format(self.httpd.server_address[1])
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def requests(self) -> int:
+        """Count requests served so far."""
+        return RangeRequestHandler.requests
+
+    def stop(self) -> None:
+        """Stop serving."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -23,18 +23,108 @@
 
 """Module for repository consumer operations."""
 
+import collections
+import contextlib
 import os
+from typing import (AbstractSet, Any, BinaryIO, Deque, Dict, Iterable, Iterator, List, Mapping,
+                    Optional, Set, Tuple)
 
-from . import configuration, utils
+from . import (compression, configuration, delta, exceptions, hashing, journal, pack, repository,
+               schedule, signature, stats, store, transport, tree, utils)
+
+# A contiguous part of a file: start and end offsets, plus the offset of its local copy if any
+Segment = Tuple[int, int, Optional[int]]
+
+# A request for a segment, with the raw and stored sizes of its blocks if fetched compressed
+SegmentRequest = Tuple[transport.Request, Optional[Tuple[List[int], List[int]]]]
+
+
+# Counters reported by `Client.sync`; `bytes_relocated` and `bytes_resumed` count the bytes of
+# moved files and of partial files kept from an interrupted synchronization, which are also part
+# of `bytes_reused`; `bytes_decompressed` counts the bytes obtained from compressed blocks;
+# `files_shared` counts the files materialized from the content store
+sync_counters = ('files_checked', 'files_skipped', 'files_hashed', 'files_updated', 'files_copied',
+                 'files_shared', 'files_moved', 'files_patched', 'files_removed',
+                 'bytes_transferred', 'bytes_reused', 'bytes_relocated', 'bytes_resumed',
+                 'bytes_decompressed', 'bytes_read', 'bytes_written', 'requests')
+
+# Counters reported by `Client.verify`; `files_damaged` counts files whose content no longer
+# matches the checksum recorded by the last synchronization
+verify_counters = ('files_checked', 'files_skipped', 'files_hashed', 'files_missing',
+                   'files_damaged', 'bytes_read', 'bytes_written')
 
 
 class Client(object):
     """Provide operations on a repository client."""
 
-    def __init__(self, path: str, repository_url: str) -> None:
-        """Initialize object."""
-        self.path = path
-        self.remote = Remote(repository_url)
+    def __init__(self, path: str, repository_url: str,
+                 hardlink_duplicates: bool = configuration.hardlink_duplicates,
+                 connections: int = configuration.transport_connections,
+                 rate_limit: Optional[int] = configuration.rate_limit,
+                 required_mods: Iterable[str] = (),
+                 content_store: Optional[store.ContentStore] = None) -> None:
+        """Initialize object.
+
+        Files sharing the same content are fetched once, then copied locally: as reflinks where
+        the file system supports them, or as hard links if `hardlink_duplicates` is set.
+
+        At most `connections` requests are sent to the repository at once, fetching no more
+        than `rate_limit` bytes per second overall. Files of `required_mods`, top-level
+        directories of the repository, are downloaded first, see `schedule`.
+
+        Synchronized files are added to `content_store` if set, which may be shared with clients
+        of other repositories: content found there is materialized rather than fetched.
+        """
+        self.path = os.path.abspath(path)
+        self.remote = Remote(repository_url, connections, rate_limit)
+        self.hardlink_duplicates = hardlink_duplicates
+        self.required_mods = set(required_mods)
+        self.content_store = content_store
+
+        # Whole file hash algorithm, strong block hash and block compression of the repository,
+        # read from its index on each synchronization
+        self.hash_algorithm: str = hashing.legacy_algorithm
+        self.block_hash = signature.default_block_hash
+        self.block_compression: Optional[str] = None
+        self._compressed_directory = configuration.compressed_directory
+        self._patches_directory = configuration.patches_directory
+
+        # Statistics of the last synchronization, and hooks run around each of its phases
+        self.stats = stats.Stats('sync', sync_counters)
+        self.hooks: List[stats.Hook] = []
+
+        # Progress of the files updated by the running or last synchronization, and hooks run
+        # every time it advances, e.g. to display it along with the time left
+        self.progress = schedule.Progress(0, 0)
+        self.progress_hooks: List[schedule.ProgressHook] = []
+
+        self._index_path = os.path.join(self.path, configuration.index_directory)
+        self._tree_file_path = os.path.join(self._index_path, configuration.client_tree)
+        self._hashes_file_path = os.path.join(self._index_path, configuration.client_hashes)
+
+        # Contains checksum and local stat signature of synchronized files, keyed by path
+        # relative to the client, to quickly check if a file is up to date
+        self.file_checksums: Dict[str, tree.FileEntry] = tree.read_tree(self._tree_file_path)
+
+        # Progress of partial downloads, to resume them after an interruption
+        self.journal = journal.Journal(
+            os.path.join(self._index_path, configuration.client_journal))
+
+        # Directory hashes of the repository as of the last synchronization
+        self.directory_hashes: Dict[str, bytes] = {}
+        if os.path.isfile(self._hashes_file_path):
+            self.directory_hashes = dict(utils.read_metadata(self._hashes_file_path))
+
+        # Generation and hash algorithm of the repository as of the last synchronization
+        self._index_file_path = os.path.join(self._index_path, configuration.client_index)
+        self.generation: Optional[int] = None
+        if os.path.isfile(self._index_file_path):
+            index_content = utils.read_metadata(self._index_file_path)
+            self.generation = index_content.get('generation')
+            self.hash_algorithm = index_content.get('hash_algorithm', self.hash_algorithm)
+
+        # Keys of the files found missing or damaged by the last verification
+        self.damaged_files: Set[str] = set()
 
     @staticmethod
     def check_presence(path: str) -> bool:
@@ -72,15 +162,843 @@ class Client(object):
         index_content = {'remote_url': url, 'configuration_version': configuration.version}
         utils.write_metadata(index_file, index_content)
 
+        return cls(abs_path, url)
+
+    def sync(self) -> stats.Stats:
+        """Download missing and changed files from the repository, remove deleted ones.
+
+        Changed files are patched by fetching only the blocks that are not available locally.
+        Files sharing their content with another one are fetched once and copied locally. Files
+        moved in the repository are moved locally rather than fetched again.
+
+        Directory hashes published by the repository tell which directories changed since the
+        last synchronization: when none did and local files are untouched, only the repository
+        information is fetched; otherwise files of unchanged directories are not checked.
+
+        When the change lists published since the generation of the last synchronization are
+        available, the repository tree is rebuilt by applying them to the local one rather than
+        fetched entirely.
+
+        Return the statistics of the synchronization, also available as `stats`.
+        """
+        self.stats = stats.Stats('sync', sync_counters, self.hooks)
+        requests = self.remote.requests
+        with self.stats.phase('metadata'):
+            repo_info = self.remote.fetch_metadata(
+                '/'.join((configuration.index_directory, configuration.index_file)))
+            self.hash_algorithm = repo_info.get('hash_algorithm', hashing.legacy_algorithm)
+            self.block_hash = repo_info.get('block_hash', signature.default_block_hash)
+            # Compressed blocks are an optimization: fetch raw ones if the codec is missing
+            self.block_compression = repo_info.get('block_compression')
+            if self.block_compression not in compression.available():
+                self.block_compression = None
+            self._compressed_directory = repo_info.get('compressed_directory',
+                                                       self._compressed_directory)
+            self._patches_directory = repo_info.get('patches_directory', self._patches_directory)
+        with self.stats.phase('check'):
+            modified_files = self._modified_files()
+
+        root_hash = repo_info.get('root_hash')
+        if root_hash is not None and root_hash == self.directory_hashes.get('') and \
+                not modified_files:
+            self.stats.count('files_skipped', len(self.file_checksums))
+            self.stats.count('bytes_reused',
+                             sum(entry.size for entry in self.file_checksums.values()))
+            self.stats.count('requests', self.remote.requests - requests)
+            return self.stats.finish()
+
+        with self.stats.phase('metadata'):
+            changes = self._apply_change_lists(repo_info)
+            # Local entries are only trusted to match the repository once this sync completes
+            self.generation = None
+            remote_tree: Mapping[str, tree.FileEntry]
+            remote_hashes: Dict[str, bytes]
+            if changes is not None:
+                remote_tree, remote_hashes = changes
+            else:
+                remote_tree = tree.load_tree(self.remote.fetch(repo_info['tree_file_path']))
+                remote_hashes = {}
+                if root_hash is not None:
+                    remote_hashes = dict(self.remote.fetch_metadata(
+                        repo_info['directory_hashes_path']))
+        unchanged_directories = {directory for directory, digest in remote_hashes.items()
+                                 if self.directory_hashes.get(directory) == digest}
+
+        with self.stats.phase('remove'):
+            removed_files = set(self.file_checksums) - set(remote_tree)
+            for key, source_key in self._detect_moves(remote_tree, removed_files).items():
+                self._move_file(source_key, key)
+                removed_files.remove(source_key)
+            for key in sorted(removed_files):
+                self._remove_file(key)
+                self.stats.count('files_removed')
+
+        # Local files holding each content, to copy from instead of fetching it again
+        contents: Dict[bytes, str] = {}
+        changed_files = []
+        with self.stats.phase('check'):
+            for key, remote_entry in sorted(remote_tree.items()):
+                if key in self.file_checksums and key not in modified_files and \
+                        key.rpartition('/')[0] in unchanged_directories:
+                    self.stats.count('files_skipped')
+                    current = True
+                else:
+                    self.stats.count('files_checked')
+                    current = self._is_current(key, remote_entry)
+                if current:
+                    self.stats.count('bytes_reused', remote_entry.size)
+                    if remote_entry.content:
+                        contents.setdefault(remote_entry.content, key)
+                else:
+                    changed_files.append(key)
+
+        fetched_files = []
+        copied_files = []
+        stored_files = []
+        for key in changed_files:
+            content = remote_tree[key].content
+            if content in contents:
+                copied_files.append(key)
+            elif self.content_store is not None and self.content_store.get(
+                    self.hash_algorithm, remote_tree[key].checksum) is not None:
+                stored_files.append(key)
+                if content:
+                    contents[content] = key
+            else:
+                fetched_files.append(key)
+                if content:
+                    contents[content] = key
+
+        fetched_files = schedule.download_order(remote_tree, fetched_files, self.required_mods)
+        self.progress = schedule.Progress(
+            len(fetched_files) + len(copied_files) + len(stored_files),
+            sum(remote_tree[key].size for key in fetched_files + copied_files + stored_files))
+        self.progress.hooks = list(self.progress_hooks)
+
+        with self.stats.phase('sync_data'):
+            sync_data = self._fetch_sync_data(repo_info['sync_pack_directory'], fetched_files)
+        with self.stats.phase('update'):
+            # Files of required mods are all downloaded before the others. Within each group,
+            # small files missing locally have nothing to reuse: they are fetched concurrently,
+            # while other files are updated one at a time, each using concurrent requests
+            for group in schedule.priority_groups(fetched_files, self.required_mods):
+                new_files = [key for key in group if self._fetched_whole(key, sync_data[key])]
+                skipped = set(new_files)
+                for key in self._write_new_files(new_files, sync_data):
+                    self._file_updated(key, remote_tree[key])
+                for key in group:
+                    if key not in skipped:
+                        self._update_file(key, sync_data[key])
+                        self._file_updated(key, remote_tree[key])
+        with self.stats.phase('copy'):
+            for key in stored_files:
+                self._materialize_file(key, remote_tree[key])
+                self.stats.count('files_updated')
+                self.progress.complete(remote_tree[key].size)
+            for key in copied_files:
+                self._copy_file(contents[remote_tree[key].content], key)
+                self.stats.count('files_updated')
+                self.progress.complete(remote_tree[key].size)
+
+        # Partial files of interrupted synchronizations which turned out not to be needed
+        with self.stats.phase('remove'):
+            for key in list(self.journal.files):
+                partial_path = self._absolute_path(key) + configuration.partial_extension
+                if os.path.isfile(partial_path):
+                    os.remove(partial_path)
+                    self._prune_directories(os.path.dirname(partial_path))
+                self.journal.finish(key)
+
+        if self.content_store is not None:
+            with self.stats.phase('store'):
+                self._store_files()
+
+        with self.stats.phase('tree'):
+            self.stats.count('bytes_written',
+                             tree.write_tree(self._tree_file_path, self.file_checksums))
+            self.directory_hashes = remote_hashes
+            self.stats.count('bytes_written',
+                             utils.write_metadata(self._hashes_file_path, remote_hashes))
+            self.generation = repo_info.get('generation')
+            # Clients not made by `create` have no index yet: record the repository like it does
+            index_content: Dict[str, Any] = {'remote_url': self.remote.url,
+                                             'configuration_version': configuration.version}
+            if os.path.isfile(self._index_file_path):
+                index_content = dict(utils.read_metadata(self._index_file_path))
+            index_content['generation'] = self.generation
+            index_content['hash_algorithm'] = self.hash_algorithm
+            self.stats.count('bytes_written',
+                             utils.write_metadata(self._index_file_path, index_content))
+        self.stats.count('requests', self.remote.requests - requests)
+        return self.stats.finish()
+
+    def verify(self, deep: bool = False, jobs: int = configuration.build_jobs) -> stats.Stats:
+        """Check local files against the checksums recorded by the last synchronization.
+
+        Files whose stat signature did not change since are trusted unless `deep` is set, the
+        others are hashed again using `jobs` threads. Files found to match get their stat
+        signature refreshed. Missing and damaged files are listed in `damaged_files` and are
+        repaired by the next synchronization.
+
+        Return the statistics of the verification, also available as `stats`.
+        """
+        self.stats = stats.Stats('verify', verify_counters, self.hooks)
+        self.damaged_files = set()
+        suspicious = []
+        with self.stats.phase('check'):
+            for key, entry in self.file_checksums.items():
+                self.stats.count('files_checked')
+                try:
+                    stat = os.stat(self._absolute_path(key))
+                except FileNotFoundError:
+                    self.damaged_files.add(key)
+                    self.stats.count('files_missing')
+                    continue
+                if deep or not entry.same_stat(stat):
+                    suspicious.append(key)
+                else:
+                    self.stats.count('files_skipped')
+
+        updated = False
+        with self.stats.phase('hash'):
+            for key, local_entry, error in utils.bounded_map(self._hash_file, suspicious, jobs):
+                entry = self.file_checksums[key]
+                if error is not None or local_entry is None or \
+                        local_entry.checksum != entry.checksum:
+                    self.damaged_files.add(key)
+                    self.stats.count('files_damaged')
+                    # The next synchronization hashes files whose stat signature differs
+                    self.file_checksums[key] = entry._replace(mtime_ns=-1)
+                    updated = True
+                elif local_entry[1:4] != entry[1:4]:
+                    self.file_checksums[key] = local_entry._replace(content=entry.content)
+                    updated = True
+
+        if updated:
+            with self.stats.phase('tree'):
+                self.stats.count('bytes_written',
+                                 tree.write_tree(self._tree_file_path, self.file_checksums))
+        return self.stats.finish()
+
+    def _hash_file(self, key: str) -> tree.FileEntry:
+        """Return a tree entry for the local copy of `key`, hashing its content."""
+        path = self._absolute_path(key)
+        stat = os.stat(path)
+        self.stats.count('files_hashed')
+        self.stats.count('bytes_read', stat.st_size)
+        return tree.FileEntry(repository.file_checksum(path, self.hash_algorithm),
+                              stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def _apply_change_lists(self, repo_info: Mapping[str, Any]) \
+            -> Optional[Tuple[Dict[str, tree.FileEntry], Dict[str, bytes]]]:
+        """Rebuild the repository tree from the local one and the change lists published since.
+
+        Return the tree and its directory hashes, or None if the change lists needed are no
+        longer available or do not lead to the published tree.
+        """
+        generation = repo_info.get('generation')
+        if self.generation is None or generation is None or \
+                not repo_info['oldest_generation'] - 1 <= self.generation <= generation:
+            return None
+
+        remote_tree = dict(self.file_checksums)
+        requests = [('/'.join((repo_info['changes_directory'], str(number))), None, None)
+                    for number in range(self.generation + 1, generation + 1)]
+        for content in self.remote.fetch_many(requests):
+            tree.apply_changes(remote_tree, utils.unpack_metadata(content))
+
+        remote_hashes = tree.directory_hashes(remote_tree)
+        if remote_hashes[''] != repo_info.get('root_hash'):
+            return None
+        return remote_tree, remote_hashes
+
+    def _modified_files(self) -> Set[str]:
+        """Return the keys of synchronized files whose stat signature changed or were removed."""
+        modified_files = set()
+        for key, entry in self.file_checksums.items():
+            try:
+                stat = os.stat(self._absolute_path(key))
+            except FileNotFoundError:
+                modified_files.add(key)
+                continue
+            if not entry.same_stat(stat):
+                modified_files.add(key)
+        return modified_files
+
+    def _detect_moves(self, remote_tree: Mapping[str, tree.FileEntry],
+                      removed_files: Iterable[str]) -> Dict[str, str]:
+        """Match files missing locally to removed files holding the same content.
+
+        Only removed files whose stat signature shows they were not modified locally are
+        considered. Return removed keys keyed by the key they should be moved to.
+        """
+        removed = {}
+        for key in removed_files:
+            path = self._absolute_path(key)
+            if os.path.isfile(path) and self.file_checksums[key].same_stat(os.stat(path)):
+                removed[key] = self.file_checksums[key]
+        if not removed:
+            return {}
+
+        added = {key: entry for key, entry in remote_tree.items()
+                 if not os.path.isfile(self._absolute_path(key))}
+        return tree.match_moves(removed, added)
+
+    def _move_file(self, source_key: str, key: str) -> None:
+        """Move the local copy of `source_key` to `key`, keeping its tree entry.
+
+        The moved file is then checked as any other file, so a wrong match only costs patching.
+        """
+        path = self._absolute_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self._absolute_path(source_key), path)
+        self._prune_directories(os.path.dirname(self._absolute_path(source_key)))
+
+        self.file_checksums[key] = self.file_checksums.pop(source_key)
+        self.stats.count('bytes_relocated', self.file_checksums[key].size)
+        self.stats.count('files_moved')
+
+    def _fetch_sync_data(self, pack_directory: str, keys: Iterable[str]) \
+            -> Dict[str, signature.FileSignature]:
+        """Fetch synchronization data of `keys` from the packs holding it.
+
+        The header and index of each pack are read with a single request in most cases, along
+        with the records of small packs. Close records past it are fetched together through
+        range requests.
+        """
+        packs: Dict[str, List[str]] = {}
+        for key in keys:
+            packs.setdefault(pack.pack_name(key), []).append(key)
+
+        sync_data: Dict[str, signature.FileSignature] = {}
+        for name, pack_keys in packs.items():
+            pack_path = pack_directory + '/' + name
+            head = self.remote.fetch(pack_path, 0, configuration.pack_prefetch)
+            index_end = pack.header.size + pack.index_length(head)
+            if len(head) < index_end:
+                head += self.remote.fetch(pack_path, len(head), index_end)
+            index, records_offset = pack.load_index(head)
+            missing = [key for key in pack_keys if key not in index]
+            if missing:
+                raise exceptions.SyncError('No synchronization data published for {}'.format(
+                    missing[0]))
+
+            pack_keys.sort(key=lambda key: index[key])
+            ranges = pack.coalesce((index[key] for key in pack_keys), configuration.pack_max_gap)
+            # Records fetched along with the index are not requested again
+            available = len(head) - records_offset
+            fetched = self.remote.fetch_many(
+                (pack_path, records_offset + max(start, available), records_offset + end)
+                for start, end in ranges if end > available)
+            position = 0
+            for start, end in ranges:
+                content = head[records_offset + start:records_offset + min(end, available)]
+                if end > available:
+                    content += next(fetched)
+                while position < len(pack_keys) and index[pack_keys[position]][0] < end:
+                    key = pack_keys[position]
+                    offset, length = index[key]
+                    record = content[offset - start:offset - start + length]
+                    sync_data[key] = signature.FileSignature.from_metadata(
+                        utils.unpack_metadata(record))
+                    position += 1
+
+        return sync_data
+
+    def _is_current(self, key: str, remote_entry: tree.FileEntry) -> bool:
+        """Check whether the local copy of `key` matches `remote_entry`."""
+        path = self._absolute_path(key)
+        if not os.path.isfile(path):
+            return False
+
+        stat = os.stat(path)
+        local_entry = self.file_checksums.get(key)
+        if local_entry is None or not local_entry.same_stat(stat):
+            if stat.st_size != remote_entry.size:
+                return False
+            self.stats.count('files_hashed')
+            self.stats.count('bytes_read', stat.st_size)
+            local_entry = tree.FileEntry(repository.file_checksum(path, self.hash_algorithm),
+                                         stat.st_size, stat.st_mtime_ns, stat.st_ino)
+            self.file_checksums[key] = local_entry
+
+        if local_entry.checksum != remote_entry.checksum:
+            return False
+        if local_entry.content != remote_entry.content:
+            self.file_checksums[key] = local_entry._replace(content=remote_entry.content)
+        return True
+
+    def _file_updated(self, key: str, remote_entry: tree.FileEntry) -> None:
+        """Account the local copy of `key` as updated to `remote_entry`."""
+        self.file_checksums[key] = self.file_checksums[key]._replace(content=remote_entry.content)
+        self.stats.count('files_updated')
+        self.progress.complete(remote_entry.size)
+
+    def _fetched_whole(self, key: str, sync_data: signature.FileSignature) -> bool:
+        """Check whether `key` is missing locally and small enough to be fetched at once."""
+        return not self.remote.direct and sync_data.size <= configuration.max_range_size and \
+            not os.path.lexists(self._absolute_path(key))
+
+    def _write_new_files(self, keys: List[str],
+                         sync_data: Mapping[str, signature.FileSignature]) -> Iterator[str]:
+        """Fetch files missing locally through concurrent requests, yield keys once written.
+
+        Each file is checked against its checksum as it is written, then moved in place.
+        """
+        requests = [(key, self._segment_requests(
+            key, _segments([None] * len(sync_data[key].blocks), sync_data[key]), sync_data[key]))
+            for key in keys]
+        fetched = self._fetch_requests(
+            request for _, key_requests in requests for request in key_requests)
+        for key, key_requests in requests:
+            path = self._absolute_path(key)
+            partial_path = path + configuration.partial_extension
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            hasher = hashing.new(self.hash_algorithm)
+            with open(partial_path, mode='wb') as dest:
+                for _ in key_requests:
+                    content = next(fetched)
+                    hasher.update(content)
+                    self.stats.count('bytes_written', dest.write(content))
+                    self.progress.advance(len(content))
+            if hasher.digest() != sync_data[key].checksum:
+                os.remove(partial_path)
+                raise exceptions.SyncError('Checksum mismatch after synchronizing {}'.format(key))
+            os.replace(partial_path, path)
+
+            stat = os.stat(path)
+            self.file_checksums[key] = tree.FileEntry(sync_data[key].checksum, stat.st_size,
+                                                      stat.st_mtime_ns, stat.st_ino)
+            yield key
+
+    def _update_file(self, key: str, sync_data: signature.FileSignature) -> None:
+        """Rebuild the local copy of `key` from local blocks and ranges fetched remotely.
+
+        The file is patched in place when every reusable block is already at its final offset,
+        otherwise it is assembled in a partial file which then replaces the local copy. The
+        progress of partial files is recorded in the journal: the blocks written by an
+        interrupted synchronization are checked and kept rather than fetched again.
+
+        If the repository publishes a delta patch from the local version of the file, it is
+        applied instead when much smaller than the blocks to fetch, see
+        `configuration.patch_ratio`.
+        """
+        path = self._absolute_path(key)
+        sources = signature.match_blocks(path, sync_data, block_hash=self.block_hash)
+        segments = list(_segments(sources, sync_data))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        missing = sum(end - start for start, end, source in segments if source is None)
+        local_entry = self.file_checksums.get(key)
+        if sync_data.patch_size and local_entry is not None and \
+                local_entry.checksum == sync_data.patch_source and \
+                sync_data.patch_size <= configuration.patch_ratio * missing and \
+                local_entry.same_stat(os.stat(path)) and self._apply_patch(key, sync_data):
+            return
+
+        # Files with nothing to reuse are cloned whole from repositories on local file systems
+        if self.remote.direct and all(source is None for _, _, source in segments) and \
+                self.remote.clone(key, path):
+            self.stats.count('bytes_transferred', sync_data.size)
+            self.stats.count('bytes_written', sync_data.size)
+        # Hard links are replaced rather than patched, not to modify the files sharing them
+        elif os.path.isfile(path) and os.stat(path).st_nlink == 1 and \
+                all(source in (None, start) for start, _, source in segments):
+            fetched = self._fetch_segments(key, segments, sync_data)
+            with open(path, mode='r+b') as dest:
+                for start, end, source in segments:
+                    if source is None:
+                        self.stats.count('bytes_written',
+                                         self._write_fetched(key, dest, start, end, next(fetched)))
+                    else:
+                        self.stats.count('bytes_reused', end - start)
+                dest.truncate(sync_data.size)
+        else:
+            partial_path = path + configuration.partial_extension
+            written_blocks = self._resume(key, partial_path, sync_data)
+            if written_blocks:
+                segments = list(_segments(sources, sync_data, written_blocks))
+            self.journal.start(key, sync_data, written_blocks)
+            fetched = self._fetch_segments(key, segments, sync_data)
+            with open(partial_path, mode='r+b' if written_blocks else 'wb') as dest:
+                local = open(path, mode='rb') if os.path.isfile(path) else None
+                try:
+                    for start, end, source in segments:
+                        if source is None:
+                            written = self._write_fetched(key, dest, start, end, next(fetched))
+                        else:
+                            dest.seek(start)
+                            written = dest.write(os.pread(local.fileno(),  # type: ignore
+                                                          end - start, source))
+                            self.stats.count('bytes_reused', end - start)
+                        self.stats.count('bytes_written', written)
+                        if self.journal.mark(key, start, end):
+                            dest.flush()
+                            self.journal.save()
+                    dest.truncate(sync_data.size)
+                except BaseException:
+                    dest.flush()
+                    self.journal.save()
+                    raise
+                finally:
+                    if local is not None:
+                        local.close()
+            os.replace(partial_path, path)
+            self.journal.finish(key)
+
+        checksum = repository.file_checksum(path, self.hash_algorithm)
+        self.stats.count('bytes_read', sync_data.size)
+        if checksum != sync_data.checksum:
+            raise exceptions.SyncError('Checksum mismatch after synchronizing {}'.format(key))
+
+        stat = os.stat(path)
+        self.file_checksums[key] = tree.FileEntry(checksum, stat.st_size, stat.st_mtime_ns,
+                                                  stat.st_ino)
+
+    def _apply_patch(self, key: str, sync_data: signature.FileSignature) -> bool:
+        """Rebuild the local copy of `key` by applying the delta patch published for it.
+
+        Return False, leaving the local copy untouched, if the result does not match `sync_data`.
+        """
+        path = self._absolute_path(key)
+        patch = self._fetch_patch(key, sync_data.patch_size)
+        patched_path = path + '.patch' + configuration.partial_extension
+        hasher = hashing.new(self.hash_algorithm)
+        matches = False
+        try:
+            with contextlib.suppress(ValueError), open(patched_path, mode='wb') as dest:
+                for chunk in delta.apply(path, patch):
+                    hasher.update(chunk)
+                    self.stats.count('bytes_written', dest.write(chunk))
+                matches = hasher.digest() == sync_data.checksum
+        finally:
+            if not matches:
+                os.remove(patched_path)
+        if not matches:
+            return False
+        os.replace(patched_path, path)
+
+        stat = os.stat(path)
+        self.file_checksums[key] = tree.FileEntry(sync_data.checksum, stat.st_size,
+                                                  stat.st_mtime_ns, stat.st_ino)
+        self.stats.count('files_patched')
+        return True
+
+    def _fetch_patch(self, key: str, size: int) -> Iterator[bytes]:
+        """Fetch the delta patch of `key`, `size` bytes long, yielding it by ranges in order.
+
+        Ranges are at most `configuration.max_range_size` bytes, so that large patches are
+        applied as they arrive rather than held in memory.
+        """
+        patch_key = '/'.join((self._patches_directory, key))
+        step = configuration.max_range_size
+        requests: List[transport.Request] = [(patch_key, start, min(start + step, size))
+                                             for start in range(0, size, step)]
+        for chunk in self.remote.fetch_many(requests):
+            self.stats.count('bytes_transferred', len(chunk))
+            yield chunk
+
+    def _resume(self, key: str, partial_path: str, sync_data: signature.FileSignature) \
+            -> Set[int]:
+        """Return the blocks of the partial file of `key` which were written and are valid."""
+        written_blocks = self.journal.written_blocks(key, sync_data)
+        if not written_blocks or not os.path.isfile(partial_path):
+            return set()
+
+        valid_blocks = set()
+        with open(partial_path, mode='rb') as partial:
+            for index in sorted(written_blocks):
+                start = index * sync_data.block_size
+                length = min(sync_data.block_size, sync_data.size - start)
+                block = os.pread(partial.fileno(), length, start)
+                expected = sync_data.blocks[index]
+                if len(block) == length and \
+                        signature.block_signature(block, self.block_hash) == expected:
+                    valid_blocks.add(index)
+                    self.stats.count('bytes_resumed', length)
+                    self.stats.count('bytes_reused', length)
+                self.stats.count('bytes_read', len(block))
+        return valid_blocks
+
+    def _copy_file(self, source_key: str, key: str) -> None:
+        """Make the local copy of `key` a copy of the synchronized file `source_key`."""
+        path = self._absolute_path(key)
+        utils.clone_file(self._absolute_path(source_key), path, self.hardlink_duplicates)
+
+        stat = os.stat(path)
+        self.file_checksums[key] = self.file_checksums[source_key]._replace(
+            size=stat.st_size, mtime_ns=stat.st_mtime_ns, inode=stat.st_ino)
+        self.stats.count('bytes_reused', stat.st_size)
+        self.stats.count('files_copied')
+
+    def _write_fetched(self, key: str, dest: BinaryIO, start: int, end: int,
+                       content: Optional[bytes]) -> int:
+        """Write a segment of `key` yielded by `_fetch_segments` to `dest`, return its size.
+
+        Segments left to the transport (None) are copied by it directly into `dest`.
+        """
+        if content is not None:
+            dest.seek(start)
+            written = dest.write(content)
+        else:
+            dest.flush()
+            written = self.remote.copy(key, dest.fileno(), start, end, start)
+            self.stats.count('bytes_transferred', written)
+        self.progress.advance(written)
+        return written
+
+    def _materialize_file(self, key: str, remote_entry: tree.FileEntry) -> None:
+        """Make the local copy of `key` a copy of its content held by the content store."""
+        path = self._absolute_path(key)
+        if not self.content_store.materialize(  # type: ignore
+                self.hash_algorithm, remote_entry.checksum, path):
+            raise exceptions.SyncError('Content of {} left the store'.format(key))
+
+        stat = os.stat(path)
+        self.file_checksums[key] = remote_entry._replace(
+            size=stat.st_size, mtime_ns=stat.st_mtime_ns, inode=stat.st_ino)
+        self.stats.count('bytes_reused', stat.st_size)
+        self.stats.count('files_shared')
+
+    def _store_files(self) -> None:
+        """Add the synchronized files not stored yet to the content store, then save it.
+
+        Files whose stat signature changed since they were checked are left out.
+        """
+        content_store: store.ContentStore = self.content_store  # type: ignore
+        for key, entry in self.file_checksums.items():
+            if content_store.get(self.hash_algorithm, entry.checksum) is not None:
+                continue
+            path = self._absolute_path(key)
+            if os.path.isfile(path) and entry.same_stat(os.stat(path)):
+                content_store.add(self.hash_algorithm, entry.checksum, path)
+        self.stats.count('bytes_written', content_store.save())
+
+    def _fetch_segments(self, key: str, segments: Iterable[Segment],
+                        sync_data: signature.FileSignature) -> Iterator[Optional[bytes]]:
+        """Fetch the segments of `key` not available locally, accounting for transferred bytes.
+
+        Segments are fetched from the compressed payload of the file when the repository
+        publishes one and it saves enough bytes, see `configuration.compression_ratio`. With
+        transports writing content directly to local files, segments are not fetched and None is
+        yielded instead, see `_write_fetched`.
+        """
+        if self.remote.direct:
+            yield from (None for _, _, source in segments if source is None)
+            return
+        yield from self._fetch_requests(self._segment_requests(key, segments, sync_data))
+
+    def _segment_requests(self, key: str, segments: Iterable[Segment],
+                          sync_data: signature.FileSignature) -> List[SegmentRequest]:
+        """Build the requests fetching the segments of `key` not available locally."""
+        requests: List[SegmentRequest] = []
+        codec = self.block_compression or ''
+        block_size = sync_data.block_size
+        offsets = compression.offsets(sync_data.compressed)
+        for start, end, source in segments:
+            if source is not None:
+                continue
+            first, last = start // block_size, -(-end // block_size)
+            compressed = bool(codec and sync_data.compressed)
+            if compressed:
+                stored = offsets[last] - offsets[first]
+                compressed = stored <= configuration.compression_ratio * (end - start)
+            if not compressed:
+                requests.append(((key, start, end), None))
+                continue
+            requests.append(((self._compressed_directory + '/' + key, offsets[first],
+                              offsets[last]),
+                             ([min(block_size, sync_data.size - index * block_size)
+                               for index in range(first, last)],
+                              list(sync_data.compressed[first:last]))))
+        return requests
+
+    def _fetch_requests(self, requests: Iterable[SegmentRequest]) -> Iterator[bytes]:
+        """Fetch `requests` concurrently, yielding their raw content in order."""
+        codec = self.block_compression or ''
+        pending: Deque[Optional[Tuple[List[int], List[int]]]] = collections.deque()
+
+        def remote_requests() -> Iterator[transport.Request]:
+            for request, blocks in requests:
+                pending.append(blocks)
+                yield request
+
+        for content in self.remote.fetch_many(remote_requests()):
+            blocks = pending.popleft()
+            self.stats.count('bytes_transferred', len(content))
+            if blocks is not None:
+                content = compression.decompress_blocks(codec, content, *blocks)
+                self.stats.count('bytes_decompressed', len(content))
+            yield content
+
+    def _remove_file(self, key: str) -> None:
+        """Remove the local copy of `key` and any directory left empty."""
+        path = self._absolute_path(key)
+        if os.path.isfile(path):
+            os.remove(path)
+        del self.file_checksums[key]
+        self._prune_directories(os.path.dirname(path))
+
+    def _prune_directories(self, directory: str) -> None:
+        """Remove `directory` and its parents as long as they are empty."""
+        while directory != self.path and os.path.isdir(directory) and not os.listdir(directory):
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
+
+    def _absolute_path(self, key: str) -> str:
+        """Resolve a repository tree key to an absolute path."""
+        return os.path.join(self.path, *key.split('/'))
+
+
+class MultiClient(object):
+    """Synchronize the clients of several repositories sharing a content store.
+
+    Content common to several repositories, such as mods part of more than one modpack, is
+    downloaded and stored once, then materialized by every client needing it, see
+    `store.ContentStore`. Subscriptions are recorded in the directory of the store.
+    """
+
+    def __init__(self, path: str, hardlink: bool = configuration.store_hardlinks,
+                 connections: int = configuration.transport_connections,
+                 rate_limit: Optional[int] = configuration.rate_limit) -> None:
+        """Initialize object, loading the store at `path` and its subscriptions.
+
+        `connections` and `rate_limit` apply to each client, which are synchronized in turn.
+        """
+        self.store = store.ContentStore(path, hardlink)
+        self.connections = connections
+        self.rate_limit = rate_limit
+        self._subscriptions_path = os.path.join(self.store.path,
+                                                configuration.store_subscriptions)
+
+        # Client path, repository URL and required mods of every subscription, keyed by name
+        self.subscriptions: Dict[str, Tuple[str, str, Tuple[str, ...]]] = {}
+        if os.path.isfile(self._subscriptions_path):
+            self.subscriptions = dict(utils.read_metadata(self._subscriptions_path))
+        self.clients = {name: self._client(*subscription)
+                        for name, subscription in self.subscriptions.items()}
+
+    def subscribe(self, name: str, path: str, url: str, required_mods: Iterable[str] = ()) \
+            -> Client:
+        """Track the repository at `url` as `name`, synchronizing it to `path`."""
+        path = Client.create(path, url, overwrite=False).path
+        self.subscriptions[name] = (path, url, tuple(sorted(required_mods)))
+        self.clients[name] = self._client(*self.subscriptions[name])
+        utils.write_metadata(self._subscriptions_path, self.subscriptions)
+        return self.clients[name]
+
+    def unsubscribe(self, name: str) -> None:
+        """Stop tracking the repository subscribed as `name`, leaving its files in place.
+
+        Stored content only used by its client is removed by the next `collect`.
+        """
+        del self.subscriptions[name]
+        del self.clients[name]
+        utils.write_metadata(self._subscriptions_path, self.subscriptions)
+
+    def sync(self) -> Dict[str, stats.Stats]:
+        """Synchronize every client, return their statistics keyed by subscription name."""
+        return {name: self.clients[name].sync() for name in sorted(self.clients)}
+
+    def collect(self) -> int:
+        """Remove stored content no client uses anymore, return the number of blobs removed."""
+        referenced = {self.store.key(client.hash_algorithm, entry.checksum)
+                      for client in self.clients.values()
+                      for entry in client.file_checksums.values()}
+        removed = self.store.collect(referenced)
+        self.store.save()
+        return removed
+
+    def _client(self, path: str, url: str, required_mods: Iterable[str]) -> Client:
+        """Create the client of a subscription, backed by the shared store."""
+        return Client(path, url, connections=self.connections, rate_limit=self.rate_limit,
+                      required_mods=required_mods, content_store=self.store)
+
+
+def _segments(sources: List[Optional[int]], sync_data: signature.FileSignature,
+              skipped_blocks: AbstractSet[int] = frozenset()) -> Iterator[Segment]:
+    """Split the file described by `sync_data` in contiguous segments to fetch or copy.
+
+    Segments to be fetched are no larger than `configuration.max_range_size`. Blocks in
+    `skipped_blocks` are left out of the segments.
+    """
+    block_size = sync_data.block_size
+    current: Optional[List[Any]] = None
+
+    for index, source in enumerate(sources):
+        start = index * block_size
+        end = min(start + block_size, sync_data.size)
+        if index in skipped_blocks:
+            if current is not None:
+                yield current[0], current[1], current[2]
+            current = None
+            continue
+        if current is not None:
+            if source is None:
+                extend = current[2] is None and end - current[0] <= configuration.max_range_size
+            else:
+                extend = current[2] is not None and current[2] + start - current[0] == source
+            if extend:
+                current[1] = end
+                continue
+
+        if current is not None:
+            yield current[0], current[1], current[2]
+        current = [start, end, source]
+
+    if current is not None:
+        yield current[0], current[1], current[2]
+
 
 class Remote(object):
     """Middleware to access a repository."""
 
-    def __init__(self, url: str) -> None:
-        """Initialize object."""
+    def __init__(self, url: str, connections: int = configuration.transport_connections,
+                 rate_limit: Optional[int] = configuration.rate_limit) -> None:
+        """Initialize object, fetching at most `rate_limit` bytes per second if set."""
         self._url = utils.RepositoryURL(url)
+        self.transport = transport.create(self.url, connections, rate_limit)
+        self.requests = 0
 
     @property
-    def url(self):
+    def url(self) -> str:
         """Hide internal usage of `RepositoryURL`."""
-        return self._url.url
+        return str(self._url.url)
+
+    def fetch(self, path: str, start: Optional[int] = None, end: Optional[int] = None) -> bytes:
+        """Fetch the content of `path`, or its bytes from `start` to `end` (excluded)."""
+        self.requests += 1
+        return self.transport.fetch(path, start, end)
+
+    def fetch_many(self, requests: Iterable[transport.Request]) -> Iterator[bytes]:
+        """Fetch `requests` concurrently, yielding their content in order."""
+        return self.transport.fetch_many(self._counted(requests))
+
+    @property
+    def direct(self) -> bool:
+        """Tell whether content is copied to local files without going through memory."""
+        return self.transport.direct
+
+    def copy(self, path: str, destination: int, start: int = 0, end: Optional[int] = None,
+             offset: int = 0) -> int:
+        """Write the bytes of `path` from `start` to `end` (excluded) to `destination` at `offset`.
+
+        `destination` is a file descriptor. Return the number of bytes written.
+        """
+        self.requests += 1
+        return self.transport.copy(path, destination, start, end, offset)
+
+    def clone(self, path: str, destination: str) -> bool:
+        """Make `destination` a copy of `path`, return False if not supported by the transport."""
+        self.requests += 1
+        return self.transport.clone(path, destination)
+
+    def _counted(self, requests: Iterable[transport.Request]) -> Iterator[transport.Request]:
+        """Count `requests` as they are issued."""
+        for request in requests:
+            self.requests += 1
+            yield request
+
+    def fetch_metadata(self, path: str) -> Any:
+        """Fetch and decode the application metadata stored at `path`."""
+        return utils.unpack_metadata(self.fetch(path))
@@ -0,0 +1,144 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Compress the blocks served to clients.
+
+Static HTTP servers do not compress ranges on the fly, so repositories may store a compressed
+payload next to each file: its blocks compressed one by one and concatenated, so that any run of
+blocks can be fetched with a single range request and decompressed on its own. The stored size of
+each block is recorded in the synchronization data of the file. Blocks that do not compress are
+stored raw, files that do not compress at all get no payload.
+
+Supported codecs are ``zlib`` and ``zstd``, which requires the ``zstandard`` package.
+"""
+
+import itertools
+import os
+import zlib
+from typing import Callable, Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+from . import configuration, exceptions
+
+
+class Codec(NamedTuple):
+    """Functions compressing and decompressing a single block."""
+
+    compress: Callable[[bytes], bytes]
+    decompress: Callable[[bytes], bytes]
+
+
+def _zlib() -> Codec:
+    """Create a zlib codec."""
+    return Codec(zlib.compress, zlib.decompress)
+
+
+def _zstd() -> Codec:
+    """Create a Zstandard codec; compressors are not thread safe, do not share it."""
+    import zstandard
+    return Codec(zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress)
+
+
+_CODECS: Dict[str, Callable[[], Codec]] = {
+    'zlib': _zlib,
+    'zstd': _zstd,
+}
+
+
+def codec(name: str) -> Codec:
+    """Create the codec `name`.
+
+    Raise `exceptions.UnsupportedCompression` if the codec is unknown or if the package
+    implementing it is not installed.
+    """
+    factory = _CODECS.get(name)
+    if factory is None:
+        raise exceptions.UnsupportedCompression(
+            available(), 'Unknown compression codec {}.'.format(name))
+    try:
+        return factory()
+    except ImportError:
+        raise exceptions.UnsupportedCompression(
+            available(), 'Compression codec {} requires an optional package.'.format(name))
+
+
+def available() -> List[str]:
+    """List the codecs usable in this environment."""
+    usable = []
+    for name, factory in _CODECS.items():
+        try:
+            factory()
+        except ImportError:
+            continue
+        usable.append(name)
+    return usable
+
+
+def compress_file(path: str, payload_path: str, block_size: int, codec_name: str,
+                  ratio: float = configuration.compression_ratio) -> Tuple[int, ...]:
+    """Store the blocks of the file at `path` compressed one by one at `payload_path`.
+
+    Return the stored size of each block. If the payload is larger than `ratio` times the file,
+    nothing is stored and an empty tuple is returned.
+    """
+    compress = codec(codec_name).compress
+    stored = []
+    os.makedirs(os.path.dirname(payload_path), exist_ok=True)
+    try:
+        with open(path, mode='rb') as file, open(payload_path, mode='wb') as payload:
+            block = file.read(block_size)
+            while block:
+                compressed = compress(block)
+                stored.append(payload.write(compressed if len(compressed) < len(block) else block))
+                block = file.read(block_size)
+    except BaseException:
+        os.remove(payload_path)
+        raise
+
+    size = os.path.getsize(path)
+    if not size or sum(stored) > ratio * size:
+        os.remove(payload_path)
+        return ()
+    return tuple(stored)
+
+
+def offsets(stored: Sequence[int]) -> List[int]:
+    """Return the offset of each block in a payload, followed by the size of the payload."""
+    return [0, *itertools.accumulate(stored)]
+
+
+def decompress_blocks(codec_name: str, data: bytes, lengths: Iterable[int],
+                      stored: Iterable[int]) -> bytes:
+    """Decompress consecutive blocks fetched from a payload.
+
+    `lengths` are the sizes of the blocks once decompressed and `stored` their sizes in `data`.
+    """
+    decompress = codec(codec_name).decompress
+    view = memoryview(data)
+    blocks = []
+    offset = 0
+    for length, stored_length in zip(lengths, stored):
+        block = bytes(view[offset:offset + stored_length])
+        blocks.append(block if stored_length == length else decompress(block))
+        offset += stored_length
+    return b''.join(blocks)
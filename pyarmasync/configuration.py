@@ -24,6 +24,9 @@
 
 """Provide access to the configuration."""
 
+import os
+from typing import Optional
+
 # Common configuration parameters
 version = '0.1.0'
 index_directory = '.pyarmasync'
@@ -32,6 +35,48 @@ index_directory = '.pyarmasync'
 index_file = 'repoinfo'
 extension = '.pyarmasync'
 tree_file = 'repotree'
+directory_hashes_file = 'repohashes'
+build_file = 'repobuild'  # Settings the tree and packs were last built with
+pack_directory = 'packs'
+generations_directory = 'generations'
+changes_directory = 'changes'
+generation_retention = 16  # Generations, along with their change lists, kept by repositories
+read_buffer_size = 1024 * 1024  # Bytes read at once when hashing a file
+hash_algorithm = 'blake2b'  # Whole file hash of new repositories: xxh3, blake2b or blake3
+compressed_directory = 'blocks'
+block_compression: Optional[str] = None  # Codec of blocks served compressed: zlib, zstd or None
+compression_ratio = 0.9  # Compressed blocks are used when no larger than this share of raw ones
+previous_directory = 'previous'
+patches_directory = 'patches'
+delta_patches = False  # Keep former versions of large files to publish delta patches
+patch_min_size = 4 * 1024 * 1024  # Files smaller than this get no delta patch
+patch_max_ratio = 0.5  # Patches larger than this share of the new version are dropped
+patch_time_budget = 300.0  # Seconds a build may spend computing delta patches
+block_size = 128 * 1024  # Size of the blocks described by synchronization data
+build_jobs = os.cpu_count() or 1  # Files processed concurrently during a build
+
+watch_debounce = 0.5  # Seconds without changes before rebuilding watched files
+watch_interval = 2.0  # Seconds between scans when inotify is not available
 
 # Client-specific parameters
 client_index = 'clientinfo'
+client_tree = 'clienttree'
+client_hashes = 'clienthashes'
+client_journal = 'clientjournal'
+journal_interval = 8 * 1024 * 1024  # Bytes downloaded between saves of the transfer journal
+partial_extension = '.part'
+max_range_size = 8 * 1024 * 1024  # Upper bound of bytes requested by a single range request
+pack_prefetch = 64 * 1024  # Bytes fetched at once when reading a pack header and index
+pack_max_gap = 16 * 1024  # Unneeded bytes fetched to merge close records in a single request
+rolling_budget = 1024 * 1024  # Bytes scanned one at a time when searching shifted blocks
+patch_ratio = 0.5  # Patches are applied when no larger than this share of the bytes to fetch
+hardlink_duplicates = False  # Hard link files sharing the same content instead of copying them
+transport_connections = 8  # Concurrent requests to a remote repository
+transport_retries = 3
+transport_backoff = 0.5  # Seconds waited before retrying a failed request, doubled every time
+transport_timeout = 30.0
+rate_limit: Optional[int] = None  # Bytes per second fetched from a remote repository, if limited
+transfer_chunk = 64 * 1024  # Bytes transferred between two checks of the rate limit
+store_index = 'storeindex'
+store_subscriptions = 'subscriptions'
+store_hardlinks = True  # Share content stored once between clients as hard links, see `store`
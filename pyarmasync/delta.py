@@ -0,0 +1,256 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Compute and apply binary delta patches between two versions of a file.
+
+Block signatures only find data at the offsets of whole blocks; when a file is repacked, data
+shifted by a few bytes or moved around makes most blocks fetched again. A patch describes the new
+version of a file as a sequence of instructions, in the manner of VCDIFF:
+
+* COPY: append `length` bytes of the former version, from `offset`;
+* ADD: append `length` literal bytes, carried by the patch.
+
+The instruction stream, preceded by a header, is compressed with zlib.
+
+Patches are computed greedily: samples of the former version are indexed at a fixed stride, the
+new version is scanned for them, and every match found is extended backward and forward as far
+as both versions agree.
+"""
+
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
+
+magic = b'PASDELTA'
+format_version = 1
+_HEADER = struct.Struct('<8sHQ')
+_COPY = struct.Struct('<cQQ')
+_ADD = struct.Struct('<cQ')
+_OP_COPY = b'C'
+_OP_ADD = b'A'
+sample_size = 64  # Bytes of the former version indexed at each sample
+_MAX_SAMPLES = 256 * 1024  # Bound the memory used by the index of samples
+_COMPARE_CHUNK = 64 * 1024
+_CHECK_INTERVAL = 64 * 1024  # Bytes scanned between checks of the deadline
+
+
+class BudgetExceeded(Exception):
+    """The patch would exceed its size limit, or could not be computed in time."""
+
+    pass
+
+
+def diff(source_path: str, target_path: str, patch_path: str, max_size: Optional[int] = None,
+         deadline: Optional[float] = None) -> int:
+    """Store at `patch_path` a patch turning the file at `source_path` into `target_path`.
+
+    Raise `BudgetExceeded` if the literal data of the patch exceeds `max_size` bytes or if
+    `time.monotonic()` passes `deadline`; nothing is stored then. Return the size of the patch.
+    """
+    try:
+        with open(source_path, mode='rb') as source_file, \
+                open(target_path, mode='rb') as target_file, \
+                open(patch_path, mode='wb') as patch:
+            source = _map(source_file)
+            target = _map(target_file)
+            compressor = zlib.compressobj()
+            written = patch.write(compressor.compress(
+                _HEADER.pack(magic, format_version, len(target))))
+            for instruction in _instructions(source, target, max_size, deadline):
+                written += patch.write(compressor.compress(instruction))
+            written += patch.write(compressor.flush())
+    except BaseException:
+        os.remove(patch_path)
+        raise
+    return written
+
+
+def apply(source_path: str, patch: Union[bytes, Iterable[bytes]],
+          chunk_size: int = 8 * 1024 * 1024) -> Iterator[bytes]:
+    """Yield the content of the new version described by `patch`, in order.
+
+    `patch` is either the whole patch or its successive chunks, decompressed and parsed as they
+    come so that it is never held in memory. Data copied from the former version, at
+    `source_path`, and literal data are yielded in chunks of at most `chunk_size` bytes. Raise
+    ValueError if `patch` is not a valid patch.
+    """
+    stream = _Stream([patch] if isinstance(patch, bytes) else patch, chunk_size)
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        raise ValueError('Not a patch.')
+    signature, version, size = _HEADER.unpack(header)
+    if signature != magic or version != format_version:
+        raise ValueError('Not a patch or unsupported format version.')
+
+    produced = 0
+    with open(source_path, mode='rb') as source:
+        while True:
+            operation = stream.read(1)
+            if not operation:
+                break
+            if operation == _OP_COPY:
+                _, offset, length = _COPY.unpack(operation + stream.read_exactly(_COPY.size - 1))
+                end = offset + length
+                while offset < end:
+                    chunk = os.pread(source.fileno(), min(chunk_size, end - offset), offset)
+                    if not chunk:
+                        raise ValueError('Patch copies data beyond the former version.')
+                    offset += len(chunk)
+                    produced += len(chunk)
+                    yield chunk
+            elif operation == _OP_ADD:
+                _, length = _ADD.unpack(operation + stream.read_exactly(_ADD.size - 1))
+                while length:
+                    chunk = stream.read_exactly(min(chunk_size, length))
+                    length -= len(chunk)
+                    produced += len(chunk)
+                    yield chunk
+            else:
+                raise ValueError('Invalid patch instruction.')
+    if produced != size:
+        raise ValueError('Truncated patch.')
+
+
+class _Stream(object):
+    """Decompressed content of a patch received as successive compressed chunks."""
+
+    def __init__(self, chunks: Iterable[bytes], chunk_size: int) -> None:
+        """Initialize object, decompressing at most `chunk_size` bytes at once."""
+        self._chunks = iter(chunks)
+        self._chunk_size = chunk_size
+        self._decompressor = zlib.decompressobj()
+        self._buffer = b''
+        self._position = 0
+
+    def read(self, size: int) -> bytes:
+        """Return the next `size` bytes, fewer only at the end of the patch."""
+        while len(self._buffer) - self._position < size and self._fill():
+            pass
+        data = self._buffer[self._position:self._position + size]
+        self._position += len(data)
+        return data
+
+    def read_exactly(self, size: int) -> bytes:
+        """Return the next `size` bytes, raise ValueError if the patch ends before."""
+        data = self.read(size)
+        if len(data) < size:
+            raise ValueError('Truncated patch.')
+        return data
+
+    def _fill(self) -> bool:
+        """Decompress more data into the buffer, return False at the end of the patch."""
+        compressed: Optional[bytes] = self._decompressor.unconsumed_tail
+        if not compressed:
+            if self._decompressor.eof:
+                return False
+            compressed = next(self._chunks, None)
+            if compressed is None:
+                raise ValueError('Truncated patch.')
+        try:
+            data = self._decompressor.decompress(compressed, self._chunk_size)
+        except zlib.error as error:
+            raise ValueError('Not a patch.') from error
+        self._buffer = self._buffer[self._position:] + data
+        self._position = 0
+        return True
+
+
+def _map(file: Any) -> Any:
+    """Memory-map `file` for reading, empty files cannot be mapped."""
+    if not os.fstat(file.fileno()).st_size:
+        return b''
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _instructions(source: Any, target: Any, max_size: Optional[int],
+                  deadline: Optional[float]) -> Iterator[bytes]:
+    """Yield the encoded instructions building `target` from `source`."""
+    stride = max(sample_size, len(source) // _MAX_SAMPLES)
+    samples: Dict[int, int] = {}
+    for offset in range(0, len(source) - sample_size + 1, stride):
+        samples.setdefault(hash(source[offset:offset + sample_size]), offset)
+
+    added = 0
+    pending = 0  # Start of the literal data not yet emitted
+    position = 0
+    next_check = _CHECK_INTERVAL
+    while position + sample_size <= len(target):
+        if position >= next_check:
+            next_check = position + _CHECK_INTERVAL
+            if deadline is not None and time.monotonic() > deadline:
+                raise BudgetExceeded('Deadline reached.')
+            if max_size is not None and added + position - pending > max_size:
+                raise BudgetExceeded('Patch too large.')
+
+        sample = target[position:position + sample_size]
+        found = samples.get(hash(sample))
+        if found is None or source[found:found + sample_size] != sample:
+            position += 1
+            continue
+
+        offset = found
+        backward = 0
+        while backward < min(position - pending, offset) and \
+                source[offset - backward - 1] == target[position - backward - 1]:
+            backward += 1
+        start, offset = position - backward, offset - backward
+        length = _common_length(source, offset, target, start)
+
+        if start > pending:
+            added += start - pending
+            yield _ADD.pack(_OP_ADD, start - pending) + target[pending:start]
+        yield _COPY.pack(_OP_COPY, offset, length)
+        position = pending = start + length
+
+    if len(target) > pending:
+        added += len(target) - pending
+        yield _ADD.pack(_OP_ADD, len(target) - pending) + target[pending:]
+    if max_size is not None and added > max_size:
+        raise BudgetExceeded('Patch too large.')
+
+
+def _common_length(first: Any, first_offset: int, second: Any, second_offset: int) -> int:
+    """Count the bytes `first` and `second` have in common from the given offsets on."""
+    length = 0
+    limit = min(len(first) - first_offset, len(second) - second_offset)
+    while length < limit:
+        size = min(_COMPARE_CHUNK, limit - length)
+        if first[first_offset + length:first_offset + length + size] == \
+                second[second_offset + length:second_offset + length + size]:
+            length += size
+            continue
+        # Bisect the chunk for the first differing byte
+        low, high = 0, size
+        while low < high:
+            middle = (low + high + 1) // 2
+            if first[first_offset + length:first_offset + length + middle] == \
+                    second[second_offset + length:second_offset + length + middle]:
+                low = middle
+            else:
+                high = middle - 1
+        return length + low
+    return length
@@ -24,7 +24,7 @@
 
 """This module contains the set of custom exceptions used."""
 
-from typing import Sequence
+from typing import Any, Mapping, Sequence
 
 
 class InvalidURL(ValueError):
@@ -41,3 +41,53 @@ class UnsupportedURLSchema(ValueError):
         self.supported_schemas: Sequence = supported_schemas
 
         super().__init__(*args)
+
+
+class RemoteError(IOError):
+    """The remote repository answered a request with an error."""
+
+    def __init__(self, status: int, *args: str) -> None:
+        """Initialize RemoteError with the HTTP `status` of the response."""
+        self.status: int = status
+
+        super().__init__(*args)
+
+
+class SyncError(RuntimeError):
+    """A file could not be synchronized with the repository."""
+
+    pass
+
+
+class BuildError(RuntimeError):
+    """Some files could not be processed while building a repository."""
+
+    def __init__(self, errors: Mapping[str, Exception], *args: str, stats: Any = None) -> None:
+        """Initialize BuildError with `errors`, the exception raised for each failed file.
+
+        `stats` holds the statistics of the build, which went on despite the errors.
+        """
+        self.errors: Mapping[str, Exception] = errors
+        self.stats: Any = stats
+
+        super().__init__(*args)
+
+
+class UnsupportedHashAlgorithm(ValueError):
+    """The hash algorithm is unknown or its implementation is not installed."""
+
+    def __init__(self, supported_algorithms: Sequence, *args: str) -> None:
+        """Initialize UnsupportedHashAlgorithm with `supported_algorithms`."""
+        self.supported_algorithms: Sequence = supported_algorithms
+
+        super().__init__(*args)
+
+
+class UnsupportedCompression(ValueError):
+    """The compression codec is unknown or its implementation is not installed."""
+
+    def __init__(self, supported_codecs: Sequence, *args: str) -> None:
+        """Initialize UnsupportedCompression with `supported_codecs`."""
+        self.supported_codecs: Sequence = supported_codecs
+
+        super().__init__(*args)
@@ -0,0 +1,154 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Whole file hash algorithms.
+
+The algorithm used to hash files is a repository setting, recorded in the repository index so
+that clients verify files the same way:
+
+* ``xxh3``: 128 bit XXH3, a fast non-cryptographic hash (requires the ``xxhash`` package);
+* ``blake2b``: 128 bit BLAKE2b, a strong cryptographic hash available in the standard library;
+* ``blake3``: 128 bit BLAKE3, a strong cryptographic hash faster than BLAKE2b, using several
+  threads on large buffers (requires the ``blake3`` package);
+* ``adler32``: the checksum used by former versions, kept to read their repositories.
+
+Digests are always `digest_size` bytes long, shorter ones being padded with leading zeros, so
+that checksums of any algorithm fit the same tree records.
+"""
+
+import abc
+import hashlib
+import zlib
+from typing import Any, Callable, Dict, List, Union
+
+from . import exceptions
+
+digest_size = 16
+legacy_algorithm = 'adler32'
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class Hasher(abc.ABC):
+    """Incrementally hash data with one of the supported algorithms."""
+
+    @abc.abstractmethod
+    def update(self, data: BytesLike) -> None:
+        """Feed `data` to the hash."""
+
+    @abc.abstractmethod
+    def digest(self) -> bytes:
+        """Return the digest of the data fed so far, `digest_size` bytes long."""
+
+
+class _Adler32(Hasher):
+    """Adler32 checksum, as computed by former versions."""
+
+    def __init__(self) -> None:
+        """Initialize the checksum."""
+        self._checksum = zlib.adler32(b'')
+
+    def update(self, data: BytesLike) -> None:
+        """Feed `data` to the checksum."""
+        self._checksum = zlib.adler32(data, self._checksum)
+
+    def digest(self) -> bytes:
+        """Return the checksum padded to `digest_size` bytes."""
+        return from_legacy(self._checksum)
+
+
+class _Wrapped(Hasher):
+    """Hasher wrapping an object providing the hashlib interface."""
+
+    def __init__(self, hasher: Any) -> None:
+        """Initialize object with the hashlib-like `hasher`."""
+        self._hasher = hasher
+
+    def update(self, data: BytesLike) -> None:
+        """Feed `data` to the wrapped hasher."""
+        self._hasher.update(data)
+
+    def digest(self) -> bytes:
+        """Return the digest of the wrapped hasher."""
+        return bytes(self._hasher.digest()[:digest_size])
+
+
+def _blake2b() -> Hasher:
+    """Create a BLAKE2b hasher."""
+    return _Wrapped(hashlib.blake2b(digest_size=digest_size))
+
+
+def _xxh3() -> Hasher:
+    """Create a XXH3 hasher."""
+    import xxhash
+    return _Wrapped(xxhash.xxh3_128())
+
+
+def _blake3() -> Hasher:
+    """Create a BLAKE3 hasher."""
+    import blake3
+    return _Wrapped(blake3.blake3(max_threads=blake3.blake3.AUTO))
+
+
+_ALGORITHMS: Dict[str, Callable[[], Hasher]] = {
+    'xxh3': _xxh3,
+    'blake2b': _blake2b,
+    'blake3': _blake3,
+    legacy_algorithm: _Adler32,
+}
+
+
+def new(algorithm: str) -> Hasher:
+    """Create a hasher using `algorithm`.
+
+    Raise `exceptions.UnsupportedHashAlgorithm` if the algorithm is unknown or if the package
+    implementing it is not installed.
+    """
+    factory = _ALGORITHMS.get(algorithm)
+    if factory is None:
+        raise exceptions.UnsupportedHashAlgorithm(
+            available(), 'Unknown hash algorithm {}.'.format(algorithm))
+    try:
+        return factory()
+    except ImportError:
+        raise exceptions.UnsupportedHashAlgorithm(
+            available(), 'Hash algorithm {} requires an optional package.'.format(algorithm))
+
+
+def available() -> List[str]:
+    """List the algorithms usable in this environment."""
+    usable = []
+    for algorithm, factory in _ALGORITHMS.items():
+        try:
+            factory()
+        except ImportError:
+            continue
+        usable.append(algorithm)
+    return usable
+
+
+def from_legacy(checksum: Union[int, bytes]) -> bytes:
+    """Convert an adler32 checksum stored as integer by former versions to a digest."""
+    if isinstance(checksum, int):
+        return checksum.to_bytes(digest_size, 'big')
+    return checksum
@@ -0,0 +1,133 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Record the progress of partial downloads so that interrupted synchronizations resume.
+
+The journal maps each file being assembled in a partial file to the content it is being
+assembled into and to the blocks already written. Written blocks are checked against their
+published signature before being trusted, as the journal may be saved ahead of the data.
+"""
+
+import os
+from typing import AbstractSet, Dict, NamedTuple, Set
+
+from . import configuration, signature, utils
+
+
+class PartialFile(NamedTuple):
+    """Progress of a partial file: target content and bitmap of the blocks written."""
+
+    content: bytes
+    size: int
+    block_size: int
+    blocks: bytearray
+
+    @classmethod
+    def create(cls, sync_data: signature.FileSignature) -> 'PartialFile':
+        """Start tracking a file to be assembled as described by `sync_data`."""
+        return cls(sync_data.content_id(), sync_data.size, sync_data.block_size,
+                   bytearray((len(sync_data.blocks) + 7) // 8))
+
+    def matches(self, sync_data: signature.FileSignature) -> bool:
+        """Check whether the partial file is being assembled as described by `sync_data`."""
+        return (self.content, self.size, self.block_size) == \
+            (sync_data.content_id(), sync_data.size, sync_data.block_size)
+
+    def written_blocks(self) -> Set[int]:
+        """Return the indexes of the blocks written."""
+        return {index for index in range(len(self.blocks) * 8)
+                if self.blocks[index // 8] & (1 << index % 8)}
+
+
+class Journal(object):
+    """Progress of partial downloads, persisted at `path`.
+
+    Changes are saved every `save_interval` bytes written, and whenever `save` is called.
+    Starting files larger than a block and than `save_interval` saves the journal as well, so
+    that their progress is never lost; smaller files are quickly fetched again.
+    """
+
+    def __init__(self, path: str, save_interval: int = configuration.journal_interval) -> None:
+        """Initialize object, loading the journal stored at `path` if any."""
+        self.path = path
+        self.save_interval = save_interval
+        self.files: Dict[str, PartialFile] = {}
+        self._unsaved = 0
+        self._saved: Set[str] = set()  # Keys of the files recorded by the stored journal
+
+        if os.path.isfile(path):
+            for key, (content, size, block_size, blocks) in utils.read_metadata(path).items():
+                self.files[key] = PartialFile(content, size, block_size, bytearray(blocks))
+        self._saved = set(self.files)
+
+    def written_blocks(self, key: str, sync_data: signature.FileSignature) -> Set[int]:
+        """Return the blocks written in the partial file of `key`, if it matches `sync_data`."""
+        partial = self.files.get(key)
+        if partial is None or not partial.matches(sync_data):
+            return set()
+        return partial.written_blocks()
+
+    def start(self, key: str, sync_data: signature.FileSignature,
+              written_blocks: AbstractSet[int] = frozenset()) -> None:
+        """Track the partial file of `key`, having `written_blocks` already."""
+        partial = PartialFile.create(sync_data)
+        for index in written_blocks:
+            partial.blocks[index // 8] |= 1 << index % 8
+        self.files[key] = partial
+        if sync_data.size > max(sync_data.block_size, self.save_interval):
+            self.save()
+
+    def mark(self, key: str, start: int, end: int) -> bool:
+        """Record the bytes from `start` to `end` of the partial file of `key` as written.
+
+        `start` must be aligned on a block. Return whether the journal is due to be saved, in
+        which case the written data should be flushed before calling `save`.
+        """
+        partial = self.files[key]
+        first = start // partial.block_size
+        last = -(-end // partial.block_size) if end >= partial.size else end // partial.block_size
+        for index in range(first, last):
+            partial.blocks[index // 8] |= 1 << index % 8
+        self._unsaved += end - start
+        return self._unsaved >= self.save_interval
+
+    def finish(self, key: str) -> None:
+        """Stop tracking the partial file of `key`, saving the journal if it recorded the file."""
+        self.files.pop(key, None)
+        if key in self._saved:
+            self.save()
+
+    def save(self) -> None:
+        """Persist the journal, removing it when no partial file is tracked."""
+        self._unsaved = 0
+        self._saved = set(self.files)
+        if not self.files:
+            if os.path.isfile(self.path):
+                os.remove(self.path)
+            return
+
+        temporary_path = self.path + '.tmp'
+        utils.write_metadata(temporary_path, {key: list(partial[:3]) + [bytes(partial.blocks)]
+                                              for key, partial in self.files.items()})
+        os.replace(temporary_path, self.path)
@@ -0,0 +1,127 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Store synchronization data of many files in a single pack.
+
+Synchronization data is grouped in one pack per mod (top level directory of the repository), plus
+one for files stored at the repository root. A pack is made of:
+
+* a fixed size header holding the length of the index;
+* the index, mapping each file path to the offset and length of its record;
+* the records, each one being the encoded synchronization data of a file.
+
+Clients can fetch the header and index with a single range request, then only the records they
+need.
+"""
+
+import os
+import struct
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+from . import utils
+
+magic = b'PASPACK\x00'
+format_version = 1
+header = struct.Struct('<8sHxxI')
+
+# Offset, relative to the end of the index, and length of a record
+Location = Tuple[int, int]
+
+
+def pack_name(key: str) -> str:
+    """Return the name of the pack holding synchronization data of the file at `key`."""
+    mod, separator, _ = key.partition('/')
+    return 'mods/' + mod if separator else 'root'
+
+
+def pack(records: Mapping[str, bytes]) -> bytes:
+    """Encode `records`, keyed by file path, as a pack."""
+    index: Dict[str, Location] = {}
+    offset = 0
+    for key in sorted(records):
+        index[key] = (offset, len(records[key]))
+        offset += len(records[key])
+
+    encoded_index = utils.pack_metadata(index)
+    content = [header.pack(magic, format_version, len(encoded_index)), encoded_index]
+    content.extend(records[key] for key in index)
+    return b''.join(content)
+
+
+def index_length(content: bytes) -> int:
+    """Return the length of the index of the pack starting with `content`."""
+    signature, version, length = header.unpack_from(content, 0)
+    if signature != magic or version != format_version:
+        raise ValueError('Not a pack or unsupported format version.')
+    return length
+
+
+def load_index(content: bytes) -> Tuple[Dict[str, Location], int]:
+    """Decode the index of the pack starting with `content`, return it with the records offset.
+
+    `content` must contain at least the header and the whole index.
+    """
+    end = header.size + index_length(content)
+    index = utils.unpack_metadata(content[header.size:end])
+    return {key: (offset, length) for key, (offset, length) in index.items()}, end
+
+
+def unpack(content: bytes) -> Dict[str, bytes]:
+    """Decode a whole pack, return its records keyed by file path."""
+    index, records_offset = load_index(content)
+    return {key: content[records_offset + offset:records_offset + offset + length]
+            for key, (offset, length) in index.items()}
+
+
+def read(path: str) -> Dict[str, bytes]:
+    """Load records of the pack stored at `path`, return no record if there is no pack."""
+    if not os.path.isfile(path):
+        return {}
+
+    with open(path, mode='rb') as file:
+        return unpack(file.read())
+
+
+def write(path: str, records: Mapping[str, bytes]) -> int:
+    """Store `records` in a pack at `path`, replacing any previous pack atomically.
+
+    Return the size of the pack.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, mode='wb') as file:
+        written = file.write(pack(records))
+    os.replace(temporary_path, path)
+    return written
+
+
+def coalesce(locations: Iterable[Location], max_gap: int) -> List[Tuple[int, int]]:
+    """Merge record locations into `(start, end)` ranges, bridging gaps up to `max_gap` bytes."""
+    ranges: List[List[int]] = []
+    for offset, length in sorted(locations):
+        if ranges and offset - ranges[-1][1] <= max_gap:
+            ranges[-1][1] = max(ranges[-1][1], offset + length)
+        else:
+            ranges.append([offset, offset + length])
+    return [(start, end) for start, end in ranges]
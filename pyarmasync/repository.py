@@ -24,55 +24,90 @@
 
 """Provide an interface for operations on a repository."""
 
+import concurrent.futures
+import contextlib
+import functools
+import itertools
 import os
-import zlib
-from typing import Dict, Iterable, List
-
-from . import configuration, utils
-
-
-def list_files(path: str, bl_subdirs: Iterable[str] = None, bl_extensions: Iterable[str] = None) \
-        -> List:
-    """List the absolute path to every file in a directory, subdirectories included."""
-    if bl_subdirs is None:
-        bl_subdirs = tuple()
-    if bl_extensions is None:
-        bl_extensions = tuple()
-
-    dir_list = os.walk(path)
-    file_list = []
-
-    for dir_entry in dir_list:
-        skip = False
-        for bl_subdir in bl_subdirs:
-            if bl_subdir in dir_entry[0].replace(path, ''):
-                skip = True
-        if skip:
-            continue
-        for file in dir_entry[2]:
-            add = True
-            for bl_extension in bl_extensions:
-                if file.endswith(bl_extension):
-                    add = False
-            if add:
-                file_list.append(dir_entry[0] + '/' + file)
-
-    return file_list
-
-
-def file_checksum(path: str) -> int:
-    """Compute adler32 checksum of the whole content of a file."""
-    with open(path, mode='rb') as file:
-        checksum = zlib.adler32(file.read())
-
-    return checksum
+import shutil
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from . import (compression, configuration, delta, exceptions, hashing, pack, signature, stats,
+               tree, utils, watch)
+
+# Counters reported by `Repository.build` and `Repository.update`
+build_counters = ('directories_scanned', 'files_scanned', 'files_hashed', 'files_skipped',
+                  'files_updated', 'files_removed', 'files_failed', 'bytes_read', 'bytes_written',
+                  'stat_calls', 'packs_written', 'packs_removed', 'sync_files_removed',
+                  'files_compressed', 'generations_removed', 'patches_written', 'patches_skipped')
+
+
+def list_files(path: str, bl_subdirs: Optional[Iterable[str]] = None,
+               bl_extensions: Optional[Iterable[str]] = None,
+               stats: Optional[stats.Stats] = None) -> Iterator[os.DirEntry]:
+    """Yield an `os.DirEntry` for every file in a directory, subdirectories included.
+
+    Subdirectories named as one of `bl_subdirs` are not descended into, files ending with one of
+    `bl_extensions` are skipped. Symbolic links to directories are not followed. Scanned
+    directories are counted in `stats`, if given.
+    """
+    excluded_subdirs = frozenset(bl_subdirs or ())
+    excluded_extensions = tuple(bl_extensions or ())
+    pending = [path]
+
+    while pending:
+        if stats is not None:
+            stats.count('directories_scanned')
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in excluded_subdirs:
+                        pending.append(entry.path)
+                elif not entry.name.endswith(excluded_extensions) and entry.is_file():
+                    yield entry
+
+
+def file_checksum(path: str, algorithm: str = configuration.hash_algorithm,
+                  buffer_size: int = configuration.read_buffer_size) -> bytes:
+    """Hash the whole content of a file with `algorithm`, see `hashing`.
+
+    The file is streamed through a single reusable buffer of `buffer_size` bytes, so memory usage
+    does not depend on the size of the file.
+    """
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    hasher = hashing.new(algorithm)
+
+    with open(path, mode='rb', buffering=0) as file:
+        read = file.readinto(buffer)
+        while read:
+            hasher.update(view[:read])
+            read = file.readinto(buffer)
+
+    return hasher.digest()
+
+
+def _has_prefix(key: str, prefixes: Set[str]) -> bool:
+    """Check whether `key` or one of its parent directories is in `prefixes`."""
+    while key:
+        if key in prefixes:
+            return True
+        key = key.rpartition('/')[0]
+    return False
 
 
 class Repository(object):
     """Wrap operations on a directory that contains a repository."""
 
-    def __init__(self, path: str, url: str, display_name: str = None) -> None:
-        """Initialize object properties."""
+    def __init__(self, path: str, url: str, display_name: str = None,
+                 hash_algorithm: Optional[str] = None) -> None:
+        """Initialize object properties.
+
+        Files are hashed with `hash_algorithm` if given, otherwise with the algorithm recorded in
+        the repository index.
+        """
         self.repo_path: str = os.path.abspath(path)
         self.url = utils.RepositoryURL(url)
         self.display_name = display_name
@@ -82,10 +117,76 @@ class Repository(object):
         self._index_path: str = os.path.join(self.repo_path, self._index_subdir)
         self._index_file_path: str = os.path.join(self._index_path, configuration.index_file)
         self._tree_file_path: str = os.path.join(self._index_path, configuration.tree_file)
+        self._directory_hashes_path: str = os.path.join(self._index_path,
+                                                        configuration.directory_hashes_file)
+        self._build_file_path: str = os.path.join(self._index_path, configuration.build_file)
+        self._pack_directory: str = os.path.join(self._index_path, configuration.pack_directory)
         self._sync_file_extension: str = configuration.extension
 
-        # Contains whole file checksums to quickly check if a file has been updated
-        self.file_checksums: Dict[str, int] = {}
+        # Statistics of the last build or update, and hooks run around each of their phases
+        self.stats = stats.Stats('build', build_counters)
+        self.hooks: List[stats.Hook] = []
+
+        # Contains whole file checksums and stat signatures, keyed by path relative to the
+        # repository, to quickly check if a file has been updated
+        self.file_checksums: Dict[str, tree.FileEntry] = tree.read_tree(self._tree_file_path)
+
+        index: Dict[str, Any] = {}
+        if os.path.isfile(self._index_file_path):
+            index = utils.read_metadata(self._index_file_path)
+        self.hash_algorithm: str = configuration.hash_algorithm
+        if index:
+            self.hash_algorithm = index.get('hash_algorithm', hashing.legacy_algorithm)
+
+        # Codec of the compressed payloads served along with files, None not to produce any
+        self.block_compression: Optional[str] = index.get('block_compression',
+                                                          configuration.block_compression)
+        if self.block_compression:
+            compression.codec(self.block_compression)  # Fail early if the codec is not available
+        self._compressed_path: str = os.path.join(self._index_path,
+                                                  configuration.compressed_directory)
+
+        # Whether former versions of large files are kept to publish delta patches
+        self.delta_patches: bool = index.get('delta_patches', configuration.delta_patches)
+        self._previous_path: str = os.path.join(self._index_path,
+                                                configuration.previous_directory)
+        self._patches_path: str = os.path.join(self._index_path, configuration.patches_directory)
+
+        # Number of the last generation published, see `_publish_generation`
+        self.generation: int = index.get('generation', 0)
+        self._generations_path: str = os.path.join(self._index_path,
+                                                   configuration.generations_directory)
+        self._changes_path: str = os.path.join(self._index_path, configuration.changes_directory)
+
+        # Settings the tree and packs were built with; changing them processes every file again.
+        # They are recorded apart from the index, which `initialize` overwrites, by each build;
+        # repositories built before that were built with the settings of their index
+        self._built_settings: Optional[Tuple[str, str, Optional[str], bool]] = None
+        built = index
+        if os.path.isfile(self._build_file_path):
+            built = utils.read_metadata(self._build_file_path)
+        if built:
+            self._built_settings = (
+                built.get('hash_algorithm', hashing.legacy_algorithm),
+                # Blocks of repositories not recording their strong hash were hashed with BLAKE2b
+                built.get('block_hash', signature.default_block_hash),
+                built.get('block_compression', configuration.block_compression),
+                built.get('delta_patches', configuration.delta_patches))
+        self.hash_algorithm = hash_algorithm or self.hash_algorithm
+        hashing.new(self.hash_algorithm)  # Fail early if the algorithm is not available
+
+        # Merkle tree of the repository as of the last build: the hash of each directory
+        self.directory_hashes: Dict[str, bytes] = {}
+
+    @property
+    def block_hash(self) -> str:
+        """Return the strong hash of blocks, see `signature.strong_algorithm`."""
+        return signature.strong_algorithm(self.hash_algorithm)
+
+    @property
+    def duplicates(self) -> Dict[bytes, List[str]]:
+        """Group the paths of files sharing the same content, keyed by content id."""
+        return tree.content_index(self.file_checksums)
 
     @staticmethod
     def check_presence(directory: str) -> bool:
@@ -101,9 +202,16 @@ class Repository(object):
         ])
 
     @classmethod
-    def initialize(cls, directory: str, display_name: str, url: str, overwrite: bool = False) \
-            -> 'Repository':
-        """Create new repository using `directory` as location."""
+    def initialize(cls, directory: str, display_name: str, url: str, overwrite: bool = False,
+                   hash_algorithm: str = configuration.hash_algorithm,
+                   block_compression: Optional[str] = configuration.block_compression,
+                   delta_patches: bool = configuration.delta_patches) -> 'Repository':
+        """Create new repository using `directory` as location.
+
+        Files of the repository are hashed with `hash_algorithm`, see `hashing`, and served
+        compressed with `block_compression` if set, see `compression`. Delta patches between
+        versions of large files are published if `delta_patches` is set, see `delta`.
+        """
         path = os.path.abspath(directory)
         if not os.path.isdir(path):
             try:
@@ -121,75 +229,478 @@ class Repository(object):
         repository_index = {'display_name': display_name, 'url': url,
                             'configuration_version': configuration.version,
                             'index_file_name': configuration.index_file,
-                            'sync_file_extension': configuration.extension}
+                            'sync_file_extension': configuration.extension,
+                            'hash_algorithm': hash_algorithm,
+                            'block_hash': signature.strong_algorithm(hash_algorithm),
+                            'block_compression': block_compression,
+                            'delta_patches': delta_patches}
 
         utils.write_metadata(index_file_path, repository_index)
 
         return cls(directory, url)
 
-    def build(self) -> None:
-        """Update repository to reflect file changes."""
-        self._clean_tree()
-
-        updated_files: Dict[str, int] = self._detect_updated_files()
-        for file, checksum in updated_files.items():
-            self.file_checksums[file] = checksum
-            self._update_synchronization_file(file)
-
-        self._update_index_file()
-        self._update_tree_file()
-        self._clean_repository()
-
-    def _detect_updated_files(self) -> Dict[str, int]:
-        """Return updated files path and whole file checksum."""
-        file_list = list_files(self.repo_path, [self._index_subdir],
-                               [self._sync_file_extension])
-        updated_files: Dict[str, int] = {}
-
-        for file in file_list:
-            whole_file_checksum: int = file_checksum(file)
-            if file not in self.file_checksums or whole_file_checksum != self.file_checksums[file]:
-                updated_files[file] = whole_file_checksum
-
-        return updated_files
-
-    def _clean_tree(self) -> None:
-        """Remove nonexistent files from object tree."""
-        self.file_checksums = {key: val for key, val in self.file_checksums.items()
-                               if os.path.isfile(key)}
+    def build(self, paranoid: bool = False, jobs: int = configuration.build_jobs) -> stats.Stats:
+        """Update repository to reflect file changes.
+
+        Files whose stat signature did not change since the last build are not hashed again,
+        unless `paranoid` is set or the hash algorithm or block compression changed, which also
+        regenerates all synchronization data packs and compressed payloads. Up to `jobs` files
+        are processed concurrently.
+
+        Files that cannot be processed keep their previous tree entry; they are reported through
+        `exceptions.BuildError` once the rest of the repository has been updated.
+
+        The repository is walked once: the same pass feeds updated files to the workers and
+        collects what is needed to detect deleted files and leftover synchronization files.
+
+        Return the statistics of the build, also available as `stats`.
+        """
+        self.stats = stats.Stats('build', build_counters, self.hooks)
+        paranoid = paranoid or self._settings_changed()
+        tracked_files: Set[str] = set()
+        sync_files: List[str] = []
+        files = self._scan(tracked_files, sync_files)
+
+        updated_files, errors = self._detect_updated_files(files, paranoid, jobs)
+        with self.stats.phase('tree'):
+            removed_files = self._clean_tree(tracked_files)
+        self._commit(updated_files, removed_files, errors, jobs)
+        with self.stats.phase('cleanup'):
+            self._clean_repository(sync_files)
+        return self.stats.finish()
+
+    def update(self, paths: Iterable[str], jobs: int = configuration.build_jobs) -> stats.Stats:
+        """Update the repository to reflect changes of `paths` only.
+
+        `paths` may point to files or directories, existing or removed. Only their tree entries,
+        the synchronization data packs holding them and the tree file are updated. Return the
+        statistics of the update, also available as `stats`. The whole repository is rebuilt if the
+        hash algorithm or block compression changed.
+        """
+        paths = {os.path.abspath(path) for path in paths}
+        if self.repo_path in paths or self._settings_changed():
+            return self.build(jobs=jobs)
+        self.stats = stats.Stats('update', build_counters, self.hooks)
+
+        # Existing files are processed from their directory entry, like `build` does
+        directories: Dict[str, Optional[Set[str]]] = {}
+        removed_keys: Set[str] = set()
+        for path in paths:
+            key = self._tree_key(path)
+            if self._index_subdir in key.split('/') or key.startswith('../'):
+                continue
+            if os.path.isdir(path):
+                directories[path] = None
+            elif os.path.isfile(path):
+                names = directories.setdefault(os.path.dirname(path), set())
+                if names is not None:
+                    names.add(os.path.basename(path))
+            else:
+                removed_keys.add(key)
+
+        # Files gone from rescanned directories are removed too
+        files = list(self.stats.timed('walk', self._scan_paths(directories)))
+        found_keys = {self._tree_key(file.path) for file in files}
+        removed_keys.update(self._tree_key(path) for path, names in directories.items()
+                            if names is None)
+        updated_files, errors = self._detect_updated_files(files, jobs=jobs)
+        with self.stats.phase('tree'):
+            removed_files = {key for key in self.file_checksums
+                             if key not in found_keys and _has_prefix(key, removed_keys)}
+            for key in removed_files:
+                del self.file_checksums[key]
+            self.stats.count('files_removed', len(removed_files))
+        self._commit(updated_files, removed_files, errors, jobs)
+        return self.stats.finish()
+
+    def watch(self, stop: Optional[threading.Event] = None,
+              debounce: float = configuration.watch_debounce,
+              jobs: int = configuration.build_jobs) -> None:
+        """Keep the repository updated as files change, until `stop` is set.
+
+        Changes are collected until none happens for `debounce` seconds, then only the touched
+        entries are updated through `update`. Files which could not be processed, e.g. removed
+        while being hashed, are retried along with the next changes. If the watcher fails, e.g.
+        once inotify runs out of watches, the tree is polled instead and checked entirely.
+        """
+        if stop is None:
+            stop = threading.Event()
+
+        with contextlib.ExitStack() as context:
+            watcher = context.enter_context(watch.create(self.repo_path, [self._index_subdir]))
+            pending: Set[str] = set()
+            failed: Set[str] = set()
+            while not stop.is_set():
+                try:
+                    changes = watcher.poll(debounce if pending else min(debounce, 1.0))
+                except OSError:
+                    context.close()
+                    watcher = context.enter_context(
+                        watch.PollingWatcher(self.repo_path, [self._index_subdir]))
+                    changes = {self.repo_path}
+                if changes:
+                    pending.update(changes)
+                elif pending:
+                    paths, pending, failed = pending | failed, set(), set()
+                    try:
+                        self.update(paths, jobs)
+                    except exceptions.BuildError as error:
+                        failed = {os.path.join(self.repo_path, *key.split('/'))
+                                  for key in error.errors}
+
+    def _commit(self, updated_files: Dict[str, Tuple[tree.FileEntry, signature.FileSignature]],
+                removed_files: Set[str], errors: Dict[str, Exception], jobs: int = 1) -> None:
+        """Store processed changes in the tree, index file and synchronization data packs.
+
+        Delta patches, if enabled, are computed using up to `jobs` processes.
+        """
+        former_entries = {key: self.file_checksums[key] for key in updated_files
+                          if key in self.file_checksums}
+        self.file_checksums.update((key, entry) for key, (entry, _) in updated_files.items())
+        if self.delta_patches:
+            with self.stats.phase('patches'):
+                updated_files = self._compute_patches(updated_files, former_entries, jobs)
+
+        # Synchronization data is published before the tree referencing it, and the index last,
+        # so that clients syncing during a build do not see a tree whose data is missing
+        with self.stats.phase('packs'):
+            self._update_sync_packs(
+                {key: sync_data for key, (_, sync_data) in updated_files.items()}, removed_files)
+            self._update_payloads(updated_files, removed_files)
+            self._update_patches(updated_files, removed_files)
+        with self.stats.phase('tree'):
+            self.directory_hashes = tree.directory_hashes(self.file_checksums)
+            self.stats.count('bytes_written', utils.write_metadata(self._directory_hashes_path,
+                                                                   self.directory_hashes))
+            self._update_tree_file()
+        if updated_files or removed_files or not self.generation:
+            with self.stats.phase('generations'):
+                self._publish_generation(updated_files, removed_files)
+        with self.stats.phase('index'):
+            self._update_index_file()
+            self._update_build_file()
+
+        if errors:
+            raise exceptions.BuildError(errors, 'Failed to process {} files'.format(len(errors)),
+                                        stats=self.stats.finish())
+
+    def _scan(self, tracked_files: Set[str], sync_files: List[str]) -> Iterator[os.DirEntry]:
+        """Yield files to be tracked while collecting their keys and per-file sync files."""
+        for file in self.stats.timed('walk', list_files(self.repo_path, [self._index_subdir],
+                                                        stats=self.stats)):
+            if file.name.endswith(self._sync_file_extension):
+                sync_files.append(file.path)
+            else:
+                tracked_files.add(self._tree_key(file.path))
+                yield file
+
+    def _scan_paths(self, directories: Dict[str, Optional[Set[str]]]) -> Iterator[os.DirEntry]:
+        """Yield the files named in `directories`, every file they contain if `None` is given."""
+        for directory, names in directories.items():
+            if names is None:
+                yield from (file for file in list_files(directory, [self._index_subdir],
+                                                        stats=self.stats)
+                            if not file.name.endswith(self._sync_file_extension))
+                continue
+            self.stats.count('directories_scanned')
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name in names and entry.is_file():
+                        if not entry.name.endswith(self._sync_file_extension):
+                            yield entry
+
+    def _detect_updated_files(self, files: Iterable[os.DirEntry], paranoid: bool = False,
+                              jobs: int = 1) \
+            -> Tuple[Dict[str, Tuple[tree.FileEntry, signature.FileSignature]],
+                     Dict[str, Exception]]:
+        """Process updated files.
+
+        Return tree entry and synchronization data of updated files, and errors, keyed by
+        relative path.
+        """
+        process = functools.partial(self._process_file, paranoid=paranoid)
+        updated_files: Dict[str, Tuple[tree.FileEntry, signature.FileSignature]] = {}
+        errors: Dict[str, Exception] = {}
+
+        walk_time = self.stats.phases.get('walk', 0.0)
+        with self.stats.phase('hash'):
+            for file, entry, error in utils.bounded_map(process, files, jobs):
+                self.stats.count('files_scanned')
+                if error is not None:
+                    errors[self._tree_key(file.path)] = error
+                elif entry is not None:
+                    updated_files[self._tree_key(file.path)] = entry
+                else:
+                    self.stats.count('files_skipped')
+        # Files are hashed while walking the repository: do not account the walk twice
+        self.stats.add_time('hash', walk_time - self.stats.phases.get('walk', 0.0))
+        self.stats.count('files_updated', len(updated_files))
+        self.stats.count('files_failed', len(errors))
+
+        return updated_files, errors
+
+    def _process_file(self, file: os.DirEntry, paranoid: bool = False) \
+            -> Optional[Tuple[tree.FileEntry, signature.FileSignature]]:
+        """Hash `file`, return its tree entry and synchronization data or None if unchanged."""
+        relative_path = self._tree_key(file.path)
+        known_entry = self.file_checksums.get(relative_path)
+        stat = file.stat()
+        inode = file.inode()
+        self.stats.count('stat_calls')
+        if not paranoid and known_entry is not None and known_entry.content and \
+                known_entry.same_stat(stat, inode):
+            return None
+
+        sync_data = signature.file_signature(file.path, algorithm=self.hash_algorithm)
+        self.stats.count('files_hashed')
+        self.stats.count('bytes_read', sync_data.size)
+        entry = tree.FileEntry(sync_data.checksum, stat.st_size, stat.st_mtime_ns, inode,
+                               sync_data.content_id())
+        if entry == known_entry and not paranoid:
+            return None
+
+        if self.block_compression:
+            payload_path = self._payload_path(relative_path) + '.tmp'
+            stored = compression.compress_file(file.path, payload_path, sync_data.block_size,
+                                               self.block_compression)
+            if stored:
+                self.stats.count('files_compressed')
+                self.stats.count('bytes_written', sum(stored))
+            sync_data = sync_data._replace(compressed=stored)
+
+        return entry, sync_data
+
+    def _clean_tree(self, tracked_files: Set[str]) -> Set[str]:
+        """Remove files not found by the last scan from object tree, return their keys."""
+        removed_files = set(self.file_checksums) - tracked_files
+        for key in removed_files:
+            del self.file_checksums[key]
+        self.stats.count('files_removed', len(removed_files))
+        return removed_files
 
     def _update_index_file(self) -> None:
         """Update repository index file to reflect object status."""
+        oldest_generation = self.generation - configuration.generation_retention + 1
         content = {'display_name': self.display_name, 'url': self.url.url,
                    'configuration_version': self.config_version,
-                   'index_file_path': self._relative_to_repo(self._index_file_path),
-                   'tree_file_path': self._relative_to_repo(self._tree_file_path),
+                   'index_file_path': self._tree_key(self._index_file_path),
+                   'tree_file_path': self._tree_key(self._tree_file_path),
                    'sync_file_extension': self._sync_file_extension,
+                   'hash_algorithm': self.hash_algorithm,
+                   'block_hash': self.block_hash,
+                   'block_compression': self.block_compression,
+                   'compressed_directory': self._tree_key(self._compressed_path),
+                   'delta_patches': self.delta_patches,
+                   'patches_directory': self._tree_key(self._patches_path),
+                   'sync_pack_directory': self._tree_key(self._pack_directory),
+                   'directory_hashes_path': self._tree_key(self._directory_hashes_path),
+                   'root_hash': self.directory_hashes.get(''),
+                   'generation': self.generation,
+                   'oldest_generation': max(1, oldest_generation),
+                   'generations_directory': self._tree_key(self._generations_path),
+                   'changes_directory': self._tree_key(self._changes_path),
                    }
 
-        utils.write_metadata(self._index_file_path, content)
+        self.stats.count('bytes_written', utils.write_metadata(self._index_file_path, content))
+
+    def _update_build_file(self) -> None:
+        """Record the settings the tree and packs were built with."""
+        self._built_settings = self._settings()
+        content = dict(zip(('hash_algorithm', 'block_hash', 'block_compression', 'delta_patches'),
+                           self._built_settings))
+        self.stats.count('bytes_written', utils.write_metadata(self._build_file_path, content))
 
     def _update_tree_file(self) -> None:
         """Update repository tree file according to object's tree."""
-        utils.write_metadata(self._tree_file_path, self.file_checksums)
-
-    def _update_synchronization_file(self, file: str) -> None:
-        """Generate and store synchronization data for `file`."""
-        sync_data: int = self.file_checksums[file]
-        sync_file_path: str = file + self._sync_file_extension
-
-        utils.write_metadata(sync_file_path, sync_data)
-
-    def _clean_repository(self) -> None:
-        """Remove orphaned synchronization files."""
-        all_files = list_files(self.repo_path, [self._index_subdir])
+        self.stats.count('bytes_written',
+                         tree.write_tree(self._tree_file_path, self.file_checksums))
+
+    def _publish_generation(self, updated_files: Iterable[str], removed_files: Iterable[str]) \
+            -> None:
+        """Publish the tree as a new generation, along with the changes since the previous one.
+
+        The manifest of generation N is an immutable copy of the tree, stored as
+        `generations/N`; `changes/N` lists the entries updated and removed since generation
+        N - 1. Generations older than `configuration.generation_retention` are removed.
+        """
+        self.generation += 1
+        name = str(self.generation)
+        utils.clone_file(self._tree_file_path, os.path.join(self._generations_path, name),
+                         hardlink=True)
+        changes = tree.change_list({key: self.file_checksums[key] for key in updated_files},
+                                   removed_files)
+        self.stats.count('bytes_written',
+                         utils.write_metadata(os.path.join(self._changes_path, name), changes))
+
+        expired = self.generation - configuration.generation_retention
+        for directory in (self._generations_path, self._changes_path):
+            for name in os.listdir(directory):
+                if name.isdigit() and int(name) <= expired:
+                    os.remove(os.path.join(directory, name))
+                    if directory == self._generations_path:
+                        self.stats.count('generations_removed')
+
+    def _update_sync_packs(self, updated_files: Dict[str, signature.FileSignature],
+                           removed_files: Iterable[str]) -> None:
+        """Rewrite the synchronization data packs holding updated or removed files.
+
+        Records of files that did not change are copied from the previous pack.
+        """
+        affected_packs: Dict[str, List[str]] = {
+            pack.pack_name(key): [] for key in itertools.chain(updated_files, removed_files)}
+        for key in self.file_checksums:
+            keys = affected_packs.get(pack.pack_name(key))
+            if keys is not None:
+                keys.append(key)
+
+        for name, keys in affected_packs.items():
+            pack_path = os.path.join(self._pack_directory, *name.split('/'))
+            if not keys:
+                if os.path.isfile(pack_path):
+                    os.remove(pack_path)
+                    self.stats.count('packs_removed')
+                continue
+
+            previous_records = pack.read(pack_path)
+            records = {key: previous_records[key] for key in keys
+                       if key not in updated_files and key in previous_records}
+            records.update((key, utils.pack_metadata(updated_files[key]))
+                           for key in keys if key in updated_files)
+            self.stats.count('bytes_written', pack.write(pack_path, records))
+            self.stats.count('packs_written')
+
+    def _update_payloads(self,
+                         updated_files: Dict[str, Tuple[tree.FileEntry, signature.FileSignature]],
+                         removed_files: Iterable[str]) -> None:
+        """Publish the compressed payloads of updated files, drop those of removed files.
+
+        Payloads are written aside while processing files, they replace the previous ones along
+        with the synchronization data packs describing them.
+        """
+        for key, (_, sync_data) in updated_files.items():
+            payload_path = self._payload_path(key)
+            if sync_data.compressed:
+                os.replace(payload_path + '.tmp', payload_path)
+            elif os.path.isfile(payload_path):
+                os.remove(payload_path)
+        for key in removed_files:
+            payload_path = self._payload_path(key)
+            if os.path.isfile(payload_path):
+                os.remove(payload_path)
+
+    def _clean_repository(self, sync_files: Iterable[str]) -> None:
+        """Remove per-file synchronization files written by former versions.
+
+        Compressed payloads, delta patches and former versions of files are removed altogether
+        when the corresponding setting is disabled.
+        """
+        for sync_file in sync_files:
+            os.remove(sync_file)
+            self.stats.count('sync_files_removed')
+        disabled = [] if self.block_compression else [self._compressed_path]
+        if not self.delta_patches:
+            disabled.extend((self._previous_path, self._patches_path))
+        for directory in disabled:
+            if os.path.isdir(directory):
+                shutil.rmtree(directory)
+
+    def _compute_patches(
+            self, updated_files: Dict[str, Tuple[tree.FileEntry, signature.FileSignature]],
+            former_entries: Dict[str, tree.FileEntry], jobs: int) \
+            -> Dict[str, Tuple[tree.FileEntry, signature.FileSignature]]:
+        """Compute delta patches from the kept former version of large updated files.
+
+        Patches are computed by up to `jobs` processes, within `configuration.patch_time_budget`
+        seconds for the whole build; patches larger than `configuration.patch_max_ratio` times
+        the file are dropped. Return `updated_files` with patches recorded in the synchronization
+        data of files.
+        """
+        deadline = time.monotonic() + configuration.patch_time_budget
+        tasks = {}
+        for key, (entry, sync_data) in updated_files.items():
+            former_entry = former_entries.get(key)
+            previous_path = self._former_version_path(key)
+            if sync_data.size >= configuration.patch_min_size and former_entry is not None and \
+                    former_entry.checksum != sync_data.checksum and \
+                    os.path.isfile(previous_path):
+                tasks[key] = (previous_path, os.path.join(self.repo_path, *key.split('/')),
+                              self._patch_path(key) + '.tmp',
+                              int(configuration.patch_max_ratio * sync_data.size), deadline)
+        if not tasks:
+            return updated_files
+
+        for directory in {os.path.dirname(task[2]) for task in tasks.values()}:
+            os.makedirs(directory, exist_ok=True)
+        updated_files = dict(updated_files)
+        with contextlib.ExitStack() as stack:
+            if jobs > 1 and len(tasks) > 1:
+                executor: concurrent.futures.Executor = stack.enter_context(
+                    concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(tasks))))
+            else:
+                executor = stack.enter_context(concurrent.futures.ThreadPoolExecutor(1))
+            futures = {key: executor.submit(delta.diff, *task) for key, task in tasks.items()}
+            for key, future in futures.items():
+                if future.exception() is not None:
+                    self.stats.count('patches_skipped')
+                    continue
+                entry, sync_data = updated_files[key]
+                updated_files[key] = entry, sync_data._replace(
+                    patch_source=former_entries[key].checksum, patch_size=future.result())
+                self.stats.count('patches_written')
+                self.stats.count('bytes_written', future.result())
+        return updated_files
 
-        for file in all_files:
-            if file.endswith(self._sync_file_extension):
-                tracked_file = file.replace(self._sync_file_extension, '')
-                if not os.path.isfile(tracked_file):
-                    os.remove(file)
+    def _update_patches(self,
+                        updated_files: Dict[str, Tuple[tree.FileEntry, signature.FileSignature]],
+                        removed_files: Iterable[str]) -> None:
+        """Publish the delta patches of updated files and keep their version for the next build.
+
+        Patches and former versions of removed files are dropped.
+        """
+        for key, (_, sync_data) in updated_files.items():
+            patch_path = self._patch_path(key)
+            if sync_data.patch_size:
+                os.replace(patch_path + '.tmp', patch_path)
+            elif os.path.isfile(patch_path):
+                os.remove(patch_path)
+            previous_path = self._former_version_path(key)
+            if self.delta_patches and sync_data.size >= configuration.patch_min_size:
+                utils.clone_file(os.path.join(self.repo_path, *key.split('/')), previous_path)
+            elif os.path.isfile(previous_path):
+                os.remove(previous_path)
+        for key in removed_files:
+            for path in (self._patch_path(key), self._former_version_path(key)):
+                if os.path.isfile(path):
+                    os.remove(path)
+
+    def _patch_path(self, key: str) -> str:
+        """Return the path of the delta patch of `key`."""
+        return os.path.join(self._patches_path, *key.split('/'))
+
+    def _former_version_path(self, key: str) -> str:
+        """Return the path of the version of `key` kept to compute delta patches."""
+        return os.path.join(self._previous_path, *key.split('/'))
+
+    def _payload_path(self, key: str) -> str:
+        """Return the path of the compressed payload of `key`."""
+        return os.path.join(self._compressed_path, *key.split('/'))
+
+    def _settings(self) -> Tuple[str, str, Optional[str], bool]:
+        """Return the settings that affect the data built for every file."""
+        return self.hash_algorithm, self.block_hash, self.block_compression, self.delta_patches
+
+    def _settings_changed(self) -> bool:
+        """Check whether settings affecting every file changed since the last build."""
+        return self._built_settings not in (None, self._settings())
 
     def _relative_to_repo(self, path: str) -> str:
         """Make `path` relative to the repository location."""
         return os.path.relpath(path, start=self.repo_path)
+
+    def _tree_key(self, path: str) -> str:
+        """Make `path` a platform independent key of the repository tree."""
+        if path.startswith(self.repo_path + os.sep):
+            relative_path = path[len(self.repo_path) + 1:]
+        else:
+            relative_path = self._relative_to_repo(path)
+        return relative_path.replace(os.sep, '/')
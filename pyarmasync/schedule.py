@@ -0,0 +1,158 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Schedule the downloads of a synchronization: bandwidth limit, ordering and progress.
+
+A synchronization fetches repository metadata first, then files by priority: those of the mods
+marked as required come first and, within each group, smaller files before larger ones, so
+configuration files and small mods are usable early while large PBOs stream afterwards.
+"""
+
+import collections
+import itertools
+import threading
+import time
+from typing import AbstractSet, Callable, Deque, List, Mapping, Optional, Tuple
+
+from . import tree
+
+# Called with the progress record every time it advances
+ProgressHook = Callable[['Progress'], None]
+
+
+class TokenBucket(object):
+    """Limit the average rate of a flow of bytes shared by several threads.
+
+    Up to `burst` bytes (one second worth of `rate` by default) may be consumed at once.
+    Consuming more tokens than available is allowed, the next consumers then wait until the debt
+    is paid back, which keeps the average rate at `rate` bytes per second.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        """Initialize object, starting with a full bucket."""
+        self.rate = rate
+        self.burst = rate if burst is None else burst
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int) -> float:
+        """Take `amount` tokens, waiting until the bucket is no longer in debt.
+
+        Return the seconds waited.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+def download_order(remote_tree: Mapping[str, tree.FileEntry], keys: List[str],
+                   required: AbstractSet[str] = frozenset()) -> List[str]:
+    """Sort `keys` in the order their files should be downloaded.
+
+    `required` holds the top-level directories, i.e. mods, whose files are fetched first.
+    """
+    def priority(key: str) -> Tuple[bool, int, str]:
+        return _optional(key, required), remote_tree[key].size, key
+
+    return sorted(keys, key=priority)
+
+
+def priority_groups(keys: List[str], required: AbstractSet[str] = frozenset()) \
+        -> List[List[str]]:
+    """Split `keys`, sorted by `download_order`, in groups downloaded one after the other.
+
+    The files of `required` mods form the first group, the other files the second one.
+    """
+    return [list(group)
+            for _, group in itertools.groupby(keys, key=lambda key: _optional(key, required))]
+
+
+def _optional(key: str, required: AbstractSet[str]) -> bool:
+    """Tell whether the file at `key` is not part of a `required` mod."""
+    return key.split('/', 1)[0] not in required
+
+
+class Progress(object):
+    """Progress of the files updated by a synchronization, with an estimate of the time left.
+
+    The throughput is measured over the last `window` seconds. Counters can be read from other
+    threads while the synchronization runs.
+    """
+
+    def __init__(self, files_total: int, bytes_total: int, window: float = 10.0) -> None:
+        """Initialize object, starting the clock."""
+        self.files_total = files_total
+        self.bytes_total = bytes_total
+        self.files_done = 0
+        self.bytes_done = 0
+        self.window = window
+        self.hooks: List[ProgressHook] = []
+
+        self._file_bytes = 0  # Bytes of the current file already accounted for
+        self._samples: Deque[Tuple[float, int]] = collections.deque([(time.monotonic(), 0)])
+
+    @property
+    def throughput(self) -> float:
+        """Return the bytes processed per second over the measurement window."""
+        (first_time, first_bytes), (last_time, last_bytes) = self._samples[0], self._samples[-1]
+        if last_time <= first_time:
+            return 0.0
+        return (last_bytes - first_bytes) / (last_time - first_time)
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Return the seconds left at the current throughput, None until it is measured."""
+        throughput = self.throughput
+        if not throughput:
+            return None
+        return (self.bytes_total - self.bytes_done) / throughput
+
+    def advance(self, size: int) -> None:
+        """Account `size` bytes of the file being updated."""
+        self._file_bytes += size
+        self._update(size)
+
+    def complete(self, size: int) -> None:
+        """Account the file being updated, of `size` bytes, as done."""
+        self.files_done += 1
+        remaining = size - self._file_bytes
+        self._file_bytes = 0
+        self._update(max(remaining, 0))
+
+    def _update(self, size: int) -> None:
+        """Add `size` processed bytes, record a throughput sample and run hooks."""
+        self.bytes_done += size
+        now = time.monotonic()
+        self._samples.append((now, self.bytes_done))
+        while len(self._samples) > 2 and self._samples[1][0] <= now - self.window:
+            self._samples.popleft()
+        for hook in self.hooks:
+            hook(self)
@@ -0,0 +1,226 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Compute block signatures used to synchronize files incrementally.
+
+Files are split in blocks of fixed size. Each block is described by a weak checksum (adler32),
+which can be rolled one byte at a time to search a block at any offset of another file, and by a
+strong hash which confirms a weak match. The whole file is hashed with the algorithm of the
+repository, see `hashing`, and so are blocks, see `strong_algorithm`: with xxh3, building
+signatures runs close to disk speed.
+"""
+
+import hashlib
+import mmap
+import os
+import zlib
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from . import configuration, hashing
+
+_ADLER_MOD = 65521
+BytesLike = Union[bytes, bytearray, memoryview]
+strong_digest_size = 16
+default_block_hash = 'blake2b'  # Strong block hash of repositories not recording theirs
+
+
+class BlockSignature(NamedTuple):
+    """Weak and strong checksum of a single block."""
+
+    weak: int
+    strong: bytes
+
+
+class FileSignature(NamedTuple):
+    """Synchronization data of a whole file.
+
+    `compressed` holds the stored size of each block in the compressed payload of the file, see
+    `compression`; it is empty if the file has none. If a delta patch from the former version of
+    the file is published, see `delta`, `patch_source` is the checksum of that version and
+    `patch_size` the size of the patch.
+    """
+
+    checksum: bytes
+    size: int
+    block_size: int
+    blocks: Tuple[BlockSignature, ...]
+    compressed: Tuple[int, ...] = ()
+    patch_source: bytes = b''
+    patch_size: int = 0
+
+    @classmethod
+    def from_metadata(cls, data: Any) -> 'FileSignature':
+        """Build a signature from its metadata representation.
+
+        Integer checksums, stored by former versions, are adler32 checksums.
+        """
+        checksum, size, block_size, blocks, *optional = data
+        if optional:
+            optional[0] = tuple(optional[0])
+        return cls(hashing.from_legacy(checksum), size, block_size,
+                   tuple(BlockSignature(*block) for block in blocks), *optional)
+
+    def content_id(self) -> bytes:
+        """Identify the content of the file, hashing the strong hashes of its blocks."""
+        digest = hashlib.blake2b(self.size.to_bytes(8, 'little'), digest_size=strong_digest_size)
+        for block in self.blocks:
+            digest.update(block.strong)
+        return digest.digest()
+
+
+def strong_algorithm(algorithm: str) -> str:
+    """Return the strong block hash of repositories hashing whole files with `algorithm`.
+
+    Blocks are hashed like whole files, except for adler32 which is too weak to confirm matches.
+    """
+    return default_block_hash if algorithm == hashing.legacy_algorithm else algorithm
+
+
+def strong_hash(data: BytesLike, algorithm: str = default_block_hash) -> bytes:
+    """Compute the strong hash of a block with `algorithm`, see `hashing`."""
+    if algorithm == default_block_hash:
+        return hashlib.blake2b(data, digest_size=strong_digest_size).digest()
+    hasher = hashing.new(algorithm)
+    hasher.update(data)
+    return hasher.digest()
+
+
+def block_signature(data: BytesLike, algorithm: str = default_block_hash) -> BlockSignature:
+    """Compute the signature of a single block, hashed with `algorithm`."""
+    return BlockSignature(zlib.adler32(data), strong_hash(data, algorithm))
+
+
+def roll(weak: int, removed: int, added: int, block_size: int) -> int:
+    """Slide the adler32 checksum `weak` of a block one byte forward.
+
+    `removed` is the byte leaving the window and `added` the one entering it.
+    """
+    low = weak & 0xffff
+    high = weak >> 16
+    low = (low - removed + added) % _ADLER_MOD
+    high = (high - block_size * removed + low - 1) % _ADLER_MOD
+    return (high << 16) | low
+
+
+def file_signature(path: str, block_size: int = configuration.block_size,
+                   algorithm: str = configuration.hash_algorithm) -> FileSignature:
+    """Compute whole file hash and block signatures of a file in a single pass.
+
+    The whole file is hashed with `algorithm`, blocks with the matching `strong_algorithm`.
+    """
+    block_hash = strong_algorithm(algorithm)
+    buffer = bytearray(block_size * max(1, configuration.read_buffer_size // block_size))
+    view = memoryview(buffer)
+    hasher = hashing.new(algorithm)
+    size = 0
+    blocks = []
+
+    with open(path, mode='rb', buffering=0) as file:
+        while True:
+            filled = 0
+            read = file.readinto(view)
+            while read:
+                filled += read
+                read = file.readinto(view[filled:]) if filled < len(buffer) else 0
+            if not filled:
+                break
+
+            hasher.update(view[:filled])
+            size += filled
+            for offset in range(0, filled, block_size):
+                blocks.append(block_signature(view[offset:min(offset + block_size, filled)],
+                                              block_hash))
+            if filled < len(buffer):
+                break
+
+    return FileSignature(hasher.digest(), size, block_size, tuple(blocks))
+
+
+def match_blocks(path: str, sync_data: FileSignature,
+                 rolling_budget: int = configuration.rolling_budget,
+                 block_hash: str = default_block_hash) -> List[Optional[int]]:
+    """Find the blocks described by `sync_data`, hashed with `block_hash`, in the file at `path`.
+
+    Return, for each block, the offset of a local copy of it or None if it is not available.
+    Blocks are first looked up at every position following a match; after a mismatch the weak
+    checksum is rolled one byte at a time to find blocks shifted by insertions or deletions,
+    scanning at most `rolling_budget` bytes this way.
+    """
+    sources: List[Optional[int]] = [None] * len(sync_data.blocks)
+    block_size = sync_data.block_size
+    if not sync_data.blocks or not os.path.isfile(path) or not os.path.getsize(path):
+        return sources
+
+    full_blocks: Dict[int, List[int]] = {}
+    for index, block in enumerate(sync_data.blocks):
+        if (index + 1) * block_size <= sync_data.size:
+            full_blocks.setdefault(block.weak, []).append(index)
+    unmatched = sum(len(candidates) for candidates in full_blocks.values())
+
+    with open(path, mode='rb') as file, \
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as local:
+        size = len(local)
+
+        def claim(weak: int, offset: int) -> bool:
+            """Record `offset` as source of the blocks matching the one found there."""
+            nonlocal unmatched
+            candidates = full_blocks.get(weak)
+            if not candidates:
+                return False
+            strong = strong_hash(local[offset:offset + block_size], block_hash)
+            matched = [index for index in candidates if sync_data.blocks[index].strong == strong]
+            for index in matched:
+                sources[index] = offset
+                candidates.remove(index)
+            unmatched -= len(matched)
+            return bool(matched)
+
+        offset = 0
+        while unmatched and offset + block_size <= size:
+            weak = zlib.adler32(local[offset:offset + block_size])
+            if claim(weak, offset):
+                offset += block_size
+                continue
+
+            found = False
+            while unmatched and rolling_budget > 0 and offset + block_size < size:
+                weak = roll(weak, local[offset], local[offset + block_size], block_size)
+                offset += 1
+                rolling_budget -= 1
+                if weak in full_blocks and claim(weak, offset):
+                    found = True
+                    break
+            offset += block_size if found else 1 if rolling_budget > 0 else block_size
+
+        tail_index = len(sync_data.blocks) - 1
+        tail_length = sync_data.size - tail_index * block_size
+        if tail_length < block_size:
+            for offset in (tail_index * block_size, size - tail_length):
+                tail = local[offset:offset + tail_length]
+                if len(tail) == tail_length and \
+                        block_signature(tail, block_hash) == sync_data.blocks[tail_index]:
+                    sources[tail_index] = offset
+                    break
+
+    return sources
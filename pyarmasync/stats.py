@@ -0,0 +1,193 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Collect durations and counters of repository and client operations.
+
+Operations such as `Repository.build` and `Client.sync` return a `Stats` record holding the
+duration of each of their phases and counters of the work done. Records can be exported as JSON
+or in the Prometheus text format, e.g. for the textfile collector of the node exporter.
+
+Hooks are context managers entered around every phase, which allows profiling or tracing
+operations without changing them; see `Profiler`.
+"""
+
+import cProfile
+import collections
+import contextlib
+import json
+import os
+import pstats
+import threading
+import time
+from typing import Any, Callable, ContextManager, Dict, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+
+# Called with the stats record and the phase name, entered around the phase
+Hook = Callable[['Stats', str], ContextManager[None]]
+
+
+class Stats(object):
+    """Durations of the phases and counters of an operation.
+
+    Counters can be read as attributes, e.g. `stats.files_hashed`. Updates are thread safe.
+    """
+
+    def __init__(self, operation: str, counters: Iterable[str] = (),
+                 hooks: Iterable[Hook] = ()) -> None:
+        """Initialize object, starting the clock of the operation."""
+        self.operation = operation
+        self.started = time.time()
+        self.duration = 0.0
+        self.phases: Dict[str, float] = collections.OrderedDict()
+        self.counters: Dict[str, int] = collections.OrderedDict((name, 0) for name in counters)
+        self.hooks = list(hooks)
+
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def __getattr__(self, name: str) -> int:
+        """Read the counter `name`."""
+        counters = self.__dict__.get('counters', {})
+        if name not in counters:
+            raise AttributeError(name)
+        return counters[name]
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Add `value` to the counter `name`."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def add_time(self, name: str, seconds: float) -> None:
+        """Add `seconds` to the duration of phase `name`."""
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Account the time spent in the enclosed block to phase `name`, running hooks."""
+        with contextlib.ExitStack() as hooks:
+            for hook in self.hooks:
+                hooks.enter_context(hook(self, name))
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                self.add_time(name, time.perf_counter() - start)
+
+    def timed(self, name: str, items: Iterable[T]) -> Iterator[T]:
+        """Yield `items`, accounting the time spent producing them to phase `name`.
+
+        This measures generators interleaved with other phases, such as a directory walk feeding
+        the hashing workers.
+        """
+        iterator = iter(items)
+        while True:
+            start = time.perf_counter()
+            item = next(iterator, _DONE)
+            self.add_time(name, time.perf_counter() - start)
+            if item is _DONE:
+                return
+            yield item  # type: ignore
+
+    def finish(self) -> 'Stats':
+        """Stop the clock of the operation."""
+        self.duration = time.perf_counter() - self._start
+        return self
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Represent the record as plain data."""
+        return {'operation': self.operation, 'started': self.started, 'duration': self.duration,
+                'phases': dict(self.phases), 'counters': dict(self.counters)}
+
+    def to_json(self) -> str:
+        """Export the record as JSON."""
+        return json.dumps(self.as_dict(), indent=2)
+
+    def to_prometheus(self, prefix: str = 'pyarmasync') -> str:
+        """Export the record in the Prometheus text exposition format."""
+        label = 'operation="{}"'.format(self.operation)
+        lines = [
+            '# HELP {}_last_run_timestamp_seconds Start time of the operation.'.format(prefix),
+            '# TYPE {}_last_run_timestamp_seconds gauge'.format(prefix),
+            '{}_last_run_timestamp_seconds{{{}}} {}'.format(prefix, label, self.started),
+            '# HELP {}_duration_seconds Duration of the operation.'.format(prefix),
+            '# TYPE {}_duration_seconds gauge'.format(prefix),
+            '{}_duration_seconds{{{}}} {}'.format(prefix, label, self.duration),
+            '# HELP {}_phase_duration_seconds Duration of the operation phases.'.format(prefix),
+            '# TYPE {}_phase_duration_seconds gauge'.format(prefix),
+        ]
+        lines.extend('{}_phase_duration_seconds{{{},phase="{}"}} {}'.format(
+            prefix, label, phase, seconds) for phase, seconds in self.phases.items())
+        for name, value in self.counters.items():
+            lines.append('# TYPE {}_{} gauge'.format(prefix, name))
+            lines.append('{}_{}{{{}}} {}'.format(prefix, name, label, value))
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path: str) -> None:
+        """Export the record as JSON to the file at `path`."""
+        _write_atomic(path, self.to_json() + '\n')
+
+    def write_prometheus(self, path: str, prefix: str = 'pyarmasync') -> None:
+        """Export the record to the file at `path`, to be read by a textfile collector."""
+        _write_atomic(path, self.to_prometheus(prefix))
+
+
+class Profiler(object):
+    """Hook profiling every phase with `cProfile`.
+
+    Only the thread running the operation is profiled, not the workers it may start.
+    """
+
+    def __init__(self) -> None:
+        """Initialize object."""
+        self.profiles: Dict[str, cProfile.Profile] = collections.OrderedDict()
+
+    @contextlib.contextmanager
+    def __call__(self, stats: Stats, phase: str) -> Iterator[None]:
+        """Profile `phase`."""
+        profile = self.profiles.setdefault(phase, cProfile.Profile())
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+
+    def print_stats(self, sort: str = 'cumulative', limit: int = 20) -> None:
+        """Print the functions taking most time in each phase."""
+        for phase, profile in self.profiles.items():
+            print('Phase {}:'.format(phase))
+            pstats.Stats(profile).sort_stats(sort).print_stats(limit)
+
+
+_DONE = object()
+
+
+def _write_atomic(path: str, content: str) -> None:
+    """Write `content` to a temporary file which then replaces `path`."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, mode='w') as file:
+        file.write(content)
+    os.replace(temporary_path, path)
@@ -0,0 +1,122 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Content-addressed storage of files shared by the clients of several repositories."""
+
+import contextlib
+import os
+from typing import AbstractSet, Dict, Optional
+
+from . import configuration, tree, utils
+
+
+class ContentStore(object):
+    """Store files once for all the clients using it, named after their whole file checksum.
+
+    Blobs are hard links to synchronized files if `hardlink` is set, otherwise reflinks or
+    copies of them, see `utils.clone_file`. Clients materialize their files from the store in the
+    same way rather than fetching content already downloaded by another client.
+
+    The stat signature of every blob is recorded in an index: since hard links share their
+    content, a blob modified through one of its links no longer matches and is discarded rather
+    than copied to other clients.
+    """
+
+    def __init__(self, path: str, hardlink: bool = configuration.store_hardlinks) -> None:
+        """Initialize object, loading the index of the store at `path`."""
+        self.path = os.path.abspath(path)
+        self.hardlink = hardlink
+        self._index_file_path = os.path.join(self.path, configuration.store_index)
+
+        # Stat signature of the blobs, keyed by algorithm and hexadecimal checksum
+        self.blobs: Dict[str, tree.FileEntry] = tree.read_tree(self._index_file_path)
+
+    @staticmethod
+    def key(algorithm: str, checksum: bytes) -> str:
+        """Return the key of the blob holding content with `checksum`, hashed with `algorithm`."""
+        digest = checksum.hex()
+        return '/'.join((algorithm, digest[:2], digest))
+
+    def get(self, algorithm: str, checksum: bytes) -> Optional[str]:
+        """Return the path of the blob holding the content with `checksum`, None if missing."""
+        key = self.key(algorithm, checksum)
+        entry = self.blobs.get(key)
+        if entry is None:
+            return None
+
+        path = self._path(key)
+        try:
+            intact = entry.same_stat(os.stat(path))
+        except FileNotFoundError:
+            intact = False
+        if not intact:
+            self.remove(key)
+            return None
+        return path
+
+    def add(self, algorithm: str, checksum: bytes, path: str) -> bool:
+        """Store the file at `path` holding the content with `checksum`, unless already stored.
+
+        Return whether the file was added.
+        """
+        if self.get(algorithm, checksum) is not None:
+            return False
+        key = self.key(algorithm, checksum)
+        blob_path = self._path(key)
+        utils.clone_file(path, blob_path, self.hardlink)
+        stat = os.stat(blob_path)
+        self.blobs[key] = tree.FileEntry(checksum, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        return True
+
+    def materialize(self, algorithm: str, checksum: bytes, destination: str) -> bool:
+        """Make `destination` a copy of the content with `checksum`, return False if missing."""
+        path = self.get(algorithm, checksum)
+        if path is None:
+            return False
+        utils.clone_file(path, destination, self.hardlink)
+        return True
+
+    def remove(self, key: str) -> None:
+        """Remove the blob stored as `key`, along with its directory if left empty."""
+        path = self._path(key)
+        if os.path.isfile(path):
+            os.remove(path)
+            with contextlib.suppress(OSError):
+                os.rmdir(os.path.dirname(path))
+        self.blobs.pop(key, None)
+
+    def collect(self, referenced: AbstractSet[str]) -> int:
+        """Remove the blobs whose key is not in `referenced`, return how many were removed."""
+        unreferenced = set(self.blobs) - referenced
+        for key in unreferenced:
+            self.remove(key)
+        return len(unreferenced)
+
+    def save(self) -> int:
+        """Write the index of the store, return its size."""
+        return tree.write_tree(self._index_file_path, self.blobs)
+
+    def _path(self, key: str) -> str:
+        """Resolve a blob key to an absolute path."""
+        return os.path.join(self.path, *key.split('/'))
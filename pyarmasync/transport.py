@@ -0,0 +1,273 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Provide access to repository content over the supported URL schemas."""
+
+import abc
+import http.client
+import os
+import queue
+import threading
+import time
+import urllib.parse
+import urllib.request
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from . import configuration, exceptions, schedule, utils
+
+# A request for the content of a path, from `start` to `end` (excluded), whole file if None
+Request = Tuple[str, Optional[int], Optional[int]]
+
+
+class Transport(abc.ABC):
+    """Fetch content of a repository.
+
+    `direct` tells whether `copy` and `clone` write content to local files without going
+    through memory, in which case they are preferred to `fetch`.
+
+    If `rate_limit` is set, content is transferred by chunks of `configuration.transfer_chunk`
+    bytes, each waiting its turn so that all connections together stay within the limit.
+    """
+
+    direct = False
+
+    def __init__(self, url: str, connections: int = configuration.transport_connections,
+                 rate_limit: Optional[int] = configuration.rate_limit) -> None:
+        """Initialize object."""
+        self.url = url
+        self.connections = connections
+        self.limiter = schedule.TokenBucket(rate_limit) if rate_limit else None
+
+    @abc.abstractmethod
+    def fetch(self, path: str, start: Optional[int] = None, end: Optional[int] = None) -> bytes:
+        """Fetch the content of `path`, or its bytes from `start` to `end` (excluded)."""
+
+    def fetch_many(self, requests: Iterable[Request]) -> Iterator[bytes]:
+        """Fetch `requests` concurrently, yielding their content in order."""
+        def fetch(request: Request) -> bytes:
+            return self.fetch(*request)
+
+        for _, content, error in utils.bounded_map(fetch, requests, self.connections):
+            if error is not None:
+                raise error
+            yield content  # type: ignore
+
+    def copy(self, path: str, destination: int, start: int = 0, end: Optional[int] = None,
+             offset: int = 0) -> int:
+        """Write the bytes of `path` from `start` to `end` (excluded) to `destination` at `offset`.
+
+        `destination` is a file descriptor. Return the number of bytes written.
+        """
+        content = self.fetch(path, start, end)
+        written = 0
+        while written < len(content):
+            written += os.pwrite(destination, content[written:], offset + written)
+        return written
+
+    def clone(self, path: str, destination: str) -> bool:
+        """Make `destination` a copy of `path`, return False if not supported by the transport."""
+        return False
+
+    def close(self) -> None:
+        """Release resources held by the transport."""
+        pass
+
+    def _read(self, read: Callable[..., bytes], length: Optional[int] = None) -> bytes:
+        """Read up to `length` bytes, all available if None, through the rate limit.
+
+        `read` is the `read` method of a file or HTTP response.
+        """
+        if self.limiter is None:
+            return read() if length is None else read(length)
+
+        chunks = []
+        remaining = -1 if length is None else length
+        while remaining:
+            size = configuration.transfer_chunk if remaining < 0 else \
+                min(remaining, configuration.transfer_chunk)
+            chunk = read(size)
+            if not chunk:
+                break
+            self.limiter.consume(len(chunk))
+            chunks.append(chunk)
+            if remaining > 0:
+                remaining -= len(chunk)
+        return b''.join(chunks)
+
+
+class FileTransport(Transport):
+    """Read content of a repository available on a local or mounted file system.
+
+    Files and ranges are copied by the kernel, sharing extents with the repository on file
+    systems supporting reflinks, see `utils.clone_file` and `utils.copy_range`.
+    """
+
+    direct = True
+
+    def __init__(self, url: str, connections: int = configuration.transport_connections,
+                 rate_limit: Optional[int] = configuration.rate_limit) -> None:
+        """Initialize object."""
+        super().__init__(url, connections, rate_limit)
+        self.root = urllib.request.url2pathname(urllib.parse.urlparse(url).path)
+
+    def fetch(self, path: str, start: Optional[int] = None, end: Optional[int] = None) -> bytes:
+        """Fetch the content of `path`, or its bytes from `start` to `end` (excluded)."""
+        with open(self._path(path), mode='rb') as file:
+            if start is not None:
+                file.seek(start)
+            return self._read(file.read, None if start is None or end is None else end - start)
+
+    def copy(self, path: str, destination: int, start: int = 0, end: Optional[int] = None,
+             offset: int = 0) -> int:
+        """Write the bytes of `path` from `start` to `end` (excluded) to `destination` at `offset`.
+
+        `destination` is a file descriptor. Return the number of bytes written.
+        """
+        with open(self._path(path), mode='rb') as file:
+            if end is None:
+                end = os.fstat(file.fileno()).st_size
+            if self.limiter is None:
+                return utils.copy_range(file.fileno(), destination, start, end - start, offset)
+
+            copied = 0
+            while start + copied < end:
+                count = utils.copy_range(
+                    file.fileno(), destination, start + copied,
+                    min(end - start - copied, configuration.transfer_chunk), offset + copied)
+                if not count:
+                    break
+                self.limiter.consume(count)
+                copied += count
+            return copied
+
+    def clone(self, path: str, destination: str) -> bool:
+        """Make `destination` a copy of `path`, return False if not supported by the transport.
+
+        Files are copied by ranges instead when the rate is limited.
+        """
+        if self.limiter is not None:
+            return False
+        utils.clone_file(self._path(path), destination)
+        return True
+
+    def _path(self, path: str) -> str:
+        """Resolve `path`, relative to the repository, to a local path."""
+        return os.path.join(self.root, *path.split('/'))
+
+
+class HTTPTransport(Transport):
+    """Fetch content of a repository through a pool of persistent HTTP connections.
+
+    Failed requests are retried up to `retries` times, waiting `backoff` seconds before the first
+    retry and doubling the delay each time.
+    """
+
+    def __init__(self, url: str, connections: int = configuration.transport_connections,
+                 retries: int = configuration.transport_retries,
+                 backoff: float = configuration.transport_backoff,
+                 timeout: float = configuration.transport_timeout,
+                 rate_limit: Optional[int] = configuration.rate_limit) -> None:
+        """Initialize object."""
+        super().__init__(url, connections, rate_limit)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        parsed_url = urllib.parse.urlparse(url)
+        self._https = parsed_url.scheme == 'https'
+        self._netloc = parsed_url.netloc
+        self._base_path = parsed_url.path.rstrip('/') + '/'
+        self._pool: queue.LifoQueue = queue.LifoQueue()
+        self._pool_lock = threading.Lock()
+        self._opened = 0
+
+    def fetch(self, path: str, start: Optional[int] = None, end: Optional[int] = None) -> bytes:
+        """Fetch the content of `path`, or its bytes from `start` to `end` (excluded)."""
+        headers = {}
+        if start is not None:
+            last = '' if end is None else end - 1
+            headers['Range'] = 'bytes={}-{}'.format(start, last)
+
+        status, content = self._request(self._base_path + urllib.parse.quote(path), headers)
+        if start is not None and status != http.client.PARTIAL_CONTENT:
+            # Server without range support, the whole file has been returned
+            content = content[start:end]
+        return content
+
+    def close(self) -> None:
+        """Close every pooled connection."""
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def _request(self, path: str, headers: dict) -> Tuple[int, bytes]:
+        """Perform a GET request with retries, return status and content."""
+        attempt = 0
+        while True:
+            connection = self._acquire()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                content = self._read(response.read)
+            except (OSError, http.client.HTTPException) as error:
+                connection.close()
+                self._release(connection)
+                failure: Exception = error
+            else:
+                self._release(connection)
+                if response.status < 400:
+                    return response.status, content
+                failure = exceptions.RemoteError(response.status, '{} {} for {}'.format(
+                    response.status, response.reason, path))
+                if response.status < 500 and response.status != 429:
+                    raise failure
+
+            if attempt >= self.retries:
+                raise failure
+            time.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+    def _acquire(self) -> http.client.HTTPConnection:
+        """Take a connection from the pool, opening a new one if the pool is not full yet."""
+        with self._pool_lock:
+            if self._pool.empty() and self._opened < self.connections:
+                self._opened += 1
+                connection_class = http.client.HTTPSConnection if self._https \
+                    else http.client.HTTPConnection
+                return connection_class(self._netloc, timeout=self.timeout)
+        return self._pool.get()
+
+    def _release(self, connection: http.client.HTTPConnection) -> None:
+        """Put `connection` back in the pool."""
+        self._pool.put(connection)
+
+
+def create(url: str, connections: int = configuration.transport_connections,
+           rate_limit: Optional[int] = configuration.rate_limit) -> Transport:
+    """Create the transport suitable to access the repository at `url`."""
+    if urllib.parse.urlparse(url).scheme == 'file':
+        return FileTransport(url, connections, rate_limit=rate_limit)
+    return HTTPTransport(url, connections, rate_limit=rate_limit)
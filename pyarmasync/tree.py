@@ -0,0 +1,397 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Store and query repository trees.
+
+A tree maps the path of every tracked file, relative to the repository and using '/' as
+separator, to its `FileEntry`. Trees are stored in a sorted binary index that can be memory-mapped
+and queried without loading it entirely:
+
+* a fixed size header;
+* an optional table of path prefixes (the directory part of paths), each stored once;
+* one fixed size record per file, sorted by path, which doubles as offset table;
+* the UTF-8 encoded strings referenced by prefixes and records.
+
+Records carry the whole file hash of files, computed with the algorithm of the repository (see
+`hashing`), and their content id, so that files sharing the same content can be found
+through `content_index`.
+
+Repositories publish each tree they build as a numbered generation, along with a change list
+from the previous one (see `change_list`), so that clients can catch up on a few generations
+without fetching the whole tree.
+
+`directory_hashes` rolls the entries of a tree up into one hash per directory, forming a Merkle
+tree: comparing the hashes of two trees tells which directories, if any, differ.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+from typing import (Any, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Set,
+                    Tuple, Union)
+
+from . import hashing, utils
+
+magic = b'PASTREE\x00'
+format_version = 3
+content_id_size = 16
+_HEADER = struct.Struct('<8sHHIIQQQ')
+_PREFIX = struct.Struct('<II')
+_RECORD = struct.Struct('<III4x{}sQqQ{}s'.format(hashing.digest_size, content_id_size))
+_RECORDS = {1: struct.Struct('<III4xQQqQ'),
+            2: struct.Struct('<III4xQQqQ{}s'.format(content_id_size)),
+            format_version: _RECORD}
+_NO_CONTENT = bytes(content_id_size)
+_HASHED_SIZE = struct.Struct('<Q')
+directory_hash_size = 16
+_FLAG_PREFIXES = 0x1
+
+Buffer = Union[bytes, mmap.mmap]
+
+
+class FileEntry(NamedTuple):
+    """Tracked file metadata as stored in the repository tree.
+
+    `size`, `mtime_ns` and `inode` form the stat signature used to detect whether a file may have
+    changed without reading its content. `content` identifies the content of the file across the
+    tree, it is empty for entries built before content ids were introduced. `checksum` is the
+    whole file hash, see `hashing`.
+    """
+
+    checksum: bytes
+    size: int
+    mtime_ns: int
+    inode: int
+    content: bytes = b''
+
+    def same_stat(self, stat: os.stat_result, inode: Optional[int] = None) -> bool:
+        """Check whether `stat` matches the stat signature of the entry.
+
+        `inode` overrides `stat.st_ino`, which is not set by `os.DirEntry.stat` on Windows.
+        """
+        return (self.size, self.mtime_ns, self.inode) == \
+            (stat.st_size, stat.st_mtime_ns, stat.st_ino if inode is None else inode)
+
+
+class TreeIndex(Mapping[str, FileEntry]):
+    """Read-only view of a tree stored in the binary index format.
+
+    Lookups bisect the sorted records, so only the parts of the index actually visited are read
+    from `buffer`, which is typically a memory map.
+    """
+
+    def __init__(self, buffer: Buffer) -> None:
+        """Initialize object, checking the index header."""
+        if len(buffer) < _HEADER.size:
+            raise ValueError('Not a tree index.')
+        header = _HEADER.unpack_from(buffer, 0)
+        signature, version, flags, count, prefix_count = header[:5]
+        if signature != magic or version not in _RECORDS:
+            raise ValueError('Not a tree index or unsupported format version.')
+
+        self._buffer = buffer
+        self._record_struct = _RECORDS[version]
+        self._count: int = count
+        self._prefix_offset, self._records_offset, self._strings_offset = header[5:]
+        self._prefix_count: int = prefix_count if flags & _FLAG_PREFIXES else 0
+        self._prefixes: Dict[int, str] = {}
+        self._mmap: Optional[mmap.mmap] = None
+
+    @classmethod
+    def open(cls, path: str) -> 'TreeIndex':
+        """Memory-map the index stored at `path`."""
+        with open(path, mode='rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        index = cls(buffer)
+        index._mmap = buffer
+        return index
+
+    def close(self) -> None:
+        """Release the memory map, if any."""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self) -> 'TreeIndex':
+        """Use the index as a context manager."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Close the index when leaving the context."""
+        self.close()
+
+    def __len__(self) -> int:
+        """Count files in the tree."""
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over paths in sorted order."""
+        return (self._path(position) for position in range(self._count))
+
+    def __getitem__(self, path: str) -> FileEntry:
+        """Return the entry of `path`."""
+        position = self._bisect(path)
+        if position < self._count and self._path(position) == path:
+            return self._entry(position)
+        raise KeyError(path)
+
+    def items(self) -> Iterator[Tuple[str, FileEntry]]:  # type: ignore
+        """Iterate over paths and entries in sorted order."""
+        return ((self._path(position), self._entry(position)) for position in range(self._count))
+
+    def scan(self, prefix: str) -> Iterator[Tuple[str, FileEntry]]:
+        """Iterate over paths starting with `prefix` and their entries.
+
+        Prefixes are matched as strings: list a mod folder with a trailing ``/``, e.g. ``@ace/``,
+        since ``@ace`` also matches the paths of ``@ace3``.
+        """
+        position = self._bisect(prefix)
+        while position < self._count:
+            path = self._path(position)
+            if not path.startswith(prefix):
+                break
+            yield path, self._entry(position)
+            position += 1
+
+    def _bisect(self, path: str) -> int:
+        """Return the position of the first record not lower than `path`."""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._path(middle) < path:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _record(self, position: int) -> Tuple[Any, ...]:
+        """Unpack the record at `position`."""
+        record_size = self._record_struct.size
+        return self._record_struct.unpack_from(self._buffer,
+                                               self._records_offset + position * record_size)
+
+    def _string(self, offset: int, length: int) -> str:
+        """Decode a string from the strings area."""
+        start = self._strings_offset + offset
+        return bytes(self._buffer[start:start + length]).decode('utf-8')
+
+    def _prefix(self, prefix_id: int) -> str:
+        """Return the path prefix with id `prefix_id`."""
+        if not self._prefix_count:
+            return ''
+        prefix = self._prefixes.get(prefix_id)
+        if prefix is None:
+            offset, length = _PREFIX.unpack_from(self._buffer,
+                                                 self._prefix_offset + prefix_id * _PREFIX.size)
+            prefix = self._prefixes[prefix_id] = self._string(offset, length)
+        return prefix
+
+    def _path(self, position: int) -> str:
+        """Return the path of the record at `position`."""
+        prefix_id, name_offset, name_length = self._record(position)[:3]
+        return self._prefix(prefix_id) + self._string(name_offset, name_length)
+
+    def _entry(self, position: int) -> FileEntry:
+        """Return the entry of the record at `position`."""
+        checksum, *fields = self._record(position)[3:]
+        entry = FileEntry(hashing.from_legacy(checksum), *fields)
+        return entry._replace(content=b'') if entry.content == _NO_CONTENT else entry
+
+
+def pack_tree(tree: Mapping[str, FileEntry], compress_paths: bool = True) -> bytes:
+    """Encode `tree` in the binary index format.
+
+    If `compress_paths` is set, the directory part of paths is stored once in the prefix table.
+    """
+    paths = sorted(tree)
+    strings = bytearray()
+    string_offsets: Dict[str, int] = {}
+
+    def add_string(value: str) -> Tuple[int, int]:
+        encoded = value.encode('utf-8')
+        offset = string_offsets.get(value)
+        if offset is None:
+            offset = string_offsets[value] = len(strings)
+            strings.extend(encoded)
+        return offset, len(encoded)
+
+    prefix_ids: Dict[str, int] = {}
+    prefix_table = bytearray()
+    records = bytearray(len(paths) * _RECORD.size)
+    for position, path in enumerate(paths):
+        prefix_id = 0
+        name = path
+        if compress_paths:
+            separator = path.rfind('/') + 1
+            prefix, name = path[:separator], path[separator:]
+            if prefix not in prefix_ids:
+                prefix_ids[prefix] = len(prefix_ids)
+                prefix_table.extend(_PREFIX.pack(*add_string(prefix)))
+            prefix_id = prefix_ids[prefix]
+        name_offset, name_length = add_string(name)
+        _RECORD.pack_into(records, position * _RECORD.size, prefix_id, name_offset, name_length,
+                          *tree[path])
+
+    prefix_offset = _HEADER.size
+    records_offset = prefix_offset + len(prefix_table)
+    strings_offset = records_offset + len(records)
+    header = _HEADER.pack(magic, format_version, _FLAG_PREFIXES if compress_paths else 0,
+                          len(paths), len(prefix_ids), prefix_offset, records_offset,
+                          strings_offset)
+
+    return b''.join((header, prefix_table, records, strings))
+
+
+def content_index(tree: Mapping[str, FileEntry]) -> Dict[bytes, List[str]]:
+    """Group the paths of `tree` by content id, in sorted order.
+
+    Only contents shared by several paths are returned; entries without content id are ignored.
+    """
+    paths: Dict[bytes, List[str]] = {}
+    for path, entry in tree.items():
+        if entry.content:
+            paths.setdefault(entry.content, []).append(path)
+    return {content: sorted(group) for content, group in paths.items() if len(group) > 1}
+
+
+def match_moves(removed: Mapping[str, FileEntry], added: Mapping[str, FileEntry]) \
+        -> Dict[str, str]:
+    """Match `added` paths to `removed` paths holding the same content, as moved files.
+
+    Entries match if they have the same size and checksum and, when both have one, the same
+    content id. A removed path having the same file name as the added one is preferred, each
+    removed path is matched at most once. Return removed paths keyed by added path.
+    """
+    candidates: Dict[Tuple[int, bytes], List[str]] = {}
+    for path, entry in sorted(removed.items()):
+        if entry.size:
+            candidates.setdefault((entry.size, entry.checksum), []).append(path)
+
+    moves: Dict[str, str] = {}
+    for path, entry in sorted(added.items()):
+        matching = [candidate for candidate in candidates.get((entry.size, entry.checksum), ())
+                    if _same_content(removed[candidate], entry)]
+        if not matching:
+            continue
+        name = path.rpartition('/')[2]
+        source = next((candidate for candidate in matching
+                       if candidate.rpartition('/')[2] == name), matching[0])
+        candidates[(entry.size, entry.checksum)].remove(source)
+        moves[path] = source
+    return moves
+
+
+def directory_hashes(tree: Mapping[str, FileEntry]) -> Dict[str, bytes]:
+    """Compute the hash of every directory of `tree`, keyed by path ('' being the root).
+
+    The hash of a directory covers the names of its children, the checksum, size and content id
+    of its files and the hashes of its subdirectories, so it changes whenever anything under it
+    does. Local details such as modification times are not covered.
+    """
+    # Children of each directory: name, whether it is a directory, and what to hash about it
+    children: Dict[str, List[Tuple[str, bool, bytes]]] = {'': []}
+    for path, entry in tree.items():
+        directory, _, name = path.rpartition('/')
+        data = entry.checksum + _HASHED_SIZE.pack(entry.size) + entry.content
+        if directory not in children:
+            ancestor = directory
+            while ancestor not in children:
+                children[ancestor] = []
+                ancestor = ancestor.rpartition('/')[0]
+        children[directory].append((name, False, data))
+
+    hashes: Dict[str, bytes] = {}
+    # Deeper directories first, so that subdirectory hashes are known when hashing a parent
+    for directory in sorted(children, key=lambda path: -path.count('/') - bool(path)):
+        digest = hashlib.blake2b(digest_size=directory_hash_size)
+        for name, is_directory, data in sorted(children[directory]):
+            digest.update(b'd' if is_directory else b'f')
+            digest.update(name.encode('utf-8') + b'\0')
+            digest.update(data)
+        hashes[directory] = digest.digest()
+        if directory:
+            parent, _, name = directory.rpartition('/')
+            children[parent].append((name, True, hashes[directory]))
+    return hashes
+
+
+def change_list(updated: Mapping[str, FileEntry], removed: Iterable[str]) -> Dict[str, Any]:
+    """Describe in metadata format the entries `updated` and the paths `removed` from a tree."""
+    return {'updated': {path: list(entry) for path, entry in updated.items()},
+            'removed': sorted(removed)}
+
+
+def apply_changes(tree: Dict[str, FileEntry], changes: Mapping[str, Any]) -> Set[str]:
+    """Apply a change list built by `change_list` to `tree`, return the paths it changes."""
+    for path in changes['removed']:
+        tree.pop(path, None)
+    tree.update((path, FileEntry(*entry)) for path, entry in changes['updated'].items())
+    return set(changes['removed']) | set(changes['updated'])
+
+
+def _same_content(first: FileEntry, second: FileEntry) -> bool:
+    """Compare content ids of two entries having the same checksum, if both have one."""
+    return not first.content or not second.content or first.content == second.content
+
+
+def load_tree(content: bytes) -> Mapping[str, FileEntry]:
+    """Decode a tree stored in the binary index format or in the legacy metadata format."""
+    if content.startswith(magic):
+        return TreeIndex(content)
+    data = utils.unpack_metadata(content)
+    # The first trees mapped absolute paths to bare checksums, without stat signatures: nothing
+    # can be reused from them, so files are hashed again
+    if any(isinstance(value, int) for value in data.values()):
+        return {}
+    return {key: FileEntry(hashing.from_legacy(checksum), *fields)
+            for key, (checksum, *fields) in data.items()}
+
+
+def read_tree(path: str) -> Dict[str, FileEntry]:
+    """Load the tree stored at `path` in memory, return an empty tree if there is none."""
+    if not os.path.isfile(path):
+        return {}
+
+    with open(path, mode='rb') as file:
+        if file.read(len(magic)) != magic:
+            file.seek(0)
+            return dict(load_tree(file.read()).items())
+    # Entries are decoded straight from the mapped index, without a copy of the whole file
+    with TreeIndex.open(path) as index:
+        return dict(index.items())
+
+
+def write_tree(path: str, tree: Mapping[str, FileEntry], compress_paths: bool = True) -> int:
+    """Store `tree` at `path` in the binary index format, return the size of the index.
+
+    The index is written to a temporary file which then replaces `path`, so that readers never
+    map a partially written index.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary_path = path + '.tmp'
+    with open(temporary_path, mode='wb') as file:
+        written = file.write(pack_tree(tree, compress_paths))
+    os.replace(temporary_path, path)
+    return written
@@ -23,13 +23,22 @@
 
 """Collection of utility classes, methods and variables."""
 
-from typing import Any
+import collections
+import concurrent.futures
+import shutil
+import sys
+from typing import Any, Callable, Deque, Iterable, Iterator, Optional, Tuple, TypeVar
 from urllib.parse import urlparse
 
 import msgpack
 import os
 
-from . import exceptions
+from . import configuration, exceptions
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+_FICLONE = 0x40049409  # Linux ioctl sharing the extents of a file with another one
 
 
 class RepositoryURL(object):
@@ -61,14 +70,19 @@ class RepositoryURL(object):
         return parsed_url.scheme in cls.supported_url_schemas
 
 
-def write_metadata(to: str, data: Any) -> None:
-    """Persist application metadata ensuring a consistent format is used."""
+def write_metadata(to: str, data: Any) -> int:
+    """Persist application metadata ensuring a consistent format is used, return its size."""
     try:
         os.makedirs(os.path.dirname(to), exist_ok=True)
     except PermissionError:
         raise
     with open(to, mode='w+b') as dest:
-        dest.write(msgpack.packb(data))
+        return dest.write(pack_metadata(data))
+
+
+def pack_metadata(data: Any) -> bytes:
+    """Encode application metadata in a consistent format."""
+    return msgpack.packb(data, use_bin_type=True)
 
 
 def read_metadata(file: str) -> Any:
@@ -78,4 +92,139 @@ def read_metadata(file: str) -> Any:
     with open(file, mode='r+b') as source:
         content = source.read()
 
+    return unpack_metadata(content)
+
+
+def unpack_metadata(content: bytes) -> Any:
+    """Decode application metadata read from any source."""
     return msgpack.unpackb(content, use_list=False, raw=False)
+
+
+def clone_file(source: str, destination: str, hardlink: bool = False) -> str:
+    """Copy the file at `source` to `destination`, sharing storage with it where possible.
+
+    If `hardlink` is set, `destination` is made a hard link of `source`: both paths then share
+    any later modification. Otherwise a reflink (copy-on-write clone) is attempted on file
+    systems supporting them, falling back to a regular copy. `destination` is replaced
+    atomically. Return the method used, one of 'hardlink', 'reflink' and 'copy'.
+    """
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temporary_path = destination + '.tmp'
+    if os.path.lexists(temporary_path):
+        os.remove(temporary_path)
+
+    method = 'copy'
+    try:
+        if hardlink and _hardlink(source, temporary_path):
+            method = 'hardlink'
+        elif _reflink(source, temporary_path):
+            method = 'reflink'
+        else:
+            shutil.copyfile(source, temporary_path)
+        os.replace(temporary_path, destination)
+    finally:
+        if os.path.lexists(temporary_path):
+            os.remove(temporary_path)
+    return method
+
+
+def _hardlink(source: str, destination: str) -> bool:
+    """Create a hard link of `source` at `destination`, return False if not supported."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        return False
+    return True
+
+
+def _reflink(source: str, destination: str) -> bool:
+    """Clone `source` at `destination` sharing its extents, return False if not supported."""
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl
+
+    with open(source, mode='rb') as src, open(destination, mode='wb') as dest:
+        try:
+            fcntl.ioctl(dest.fileno(), _FICLONE, src.fileno())
+        except OSError:
+            return False
+    return True
+
+
+def copy_range(source: int, destination: int, start: int, length: int, offset: int,
+               buffer_size: int = configuration.read_buffer_size) -> int:
+    """Copy `length` bytes of file descriptor `source` from `start` to `destination` at `offset`.
+
+    The kernel copies the data without going through user space where possible, with
+    `os.copy_file_range` (which also shares extents on file systems supporting it) or
+    `os.sendfile`, falling back to reads of `buffer_size` bytes. Copying stops early at the end
+    of `source`. Return the number of bytes copied.
+    """
+    copied = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while copied < length:
+                count = os.copy_file_range(source, destination, length - copied,
+                                           start + copied, offset + copied)
+                if not count:
+                    return copied
+                copied += count
+            return copied
+        except OSError:
+            pass  # Not supported across these file systems, e.g. before Linux 5.3
+    if sys.platform.startswith('linux'):
+        try:
+            os.lseek(destination, offset + copied, os.SEEK_SET)
+            while copied < length:
+                count = os.sendfile(destination, source, start + copied, length - copied)
+                if not count:
+                    return copied
+                copied += count
+            return copied
+        except OSError:
+            pass
+    while copied < length:
+        content = os.pread(source, min(buffer_size, length - copied), start + copied)
+        if not content:
+            break
+        copied += os.pwrite(destination, content, offset + copied)
+    return copied
+
+
+def bounded_map(function: Callable[[T], R], items: Iterable[T], jobs: int = 1,
+                max_pending: Optional[int] = None) \
+        -> Iterator[Tuple[T, Optional[R], Optional[Exception]]]:
+    """Apply `function` to `items` using `jobs` threads, yielding results in input order.
+
+    Each result is yielded as an `(item, result, error)` tuple where `error` is the exception
+    raised by `function`, if any. At most `max_pending` items (twice `jobs` by default) are
+    submitted at once, which bounds both memory usage and the I/O queue depth.
+    """
+    if jobs <= 1:
+        for item in items:
+            try:
+                yield item, function(item), None
+            except Exception as error:  # noqa: B902
+                yield item, None, error
+        return
+
+    if max_pending is None:
+        max_pending = 2 * jobs
+
+    pending: Deque[Tuple[T, concurrent.futures.Future]] = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        for item in items:
+            pending.append((item, executor.submit(function, item)))
+            if len(pending) >= max_pending:
+                yield _future_result(*pending.popleft())
+        while pending:
+            yield _future_result(*pending.popleft())
+
+
+def _future_result(item: T, future: concurrent.futures.Future) \
+        -> Tuple[T, Optional[Any], Optional[Exception]]:
+    """Wait for `future` and unpack it as a `bounded_map` result."""
+    error = future.exception()
+    if error is not None:
+        return item, None, error  # type: ignore
+    return item, future.result(), None
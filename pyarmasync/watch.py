@@ -0,0 +1,248 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+# Copyright (C) 2018 Carpe Noctem - Tactical Operations (aka. CNTO) (contact@carpenoctem.co)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Detect file changes in a directory tree.
+
+Linux inotify is used where available, otherwise the tree is polled periodically.
+"""
+
+import abc
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from . import configuration, repository
+
+# inotify(7) event masks
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO
+_WATCH_MASK |= _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_ONLYDIR
+_EVENT = struct.Struct('iIII')
+
+
+class Watcher(abc.ABC):
+    """Collect paths of files and directories changed under `path`.
+
+    Directories named as one of `excluded_subdirs` are not watched.
+    """
+
+    def __init__(self, path: str, excluded_subdirs: Iterable[str] = ()) -> None:
+        """Initialize object."""
+        self.path = os.path.abspath(path)
+        self.excluded_subdirs = frozenset(excluded_subdirs)
+
+    @abc.abstractmethod
+    def poll(self, timeout: float) -> Set[str]:
+        """Wait up to `timeout` seconds for changes, return the paths changed since last call.
+
+        Returning `path` itself means changes could not be tracked and the whole tree must be
+        checked again.
+        """
+
+    def close(self) -> None:
+        """Stop watching."""
+        pass
+
+    def __enter__(self) -> 'Watcher':
+        """Use the watcher as a context manager."""
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        """Stop watching when leaving the context."""
+        self.close()
+
+
+class PollingWatcher(Watcher):
+    """Detect changes by comparing stat signatures of every file at each poll."""
+
+    def __init__(self, path: str, excluded_subdirs: Iterable[str] = (),
+                 interval: float = configuration.watch_interval) -> None:
+        """Initialize object, taking the first snapshot of the tree."""
+        super().__init__(path, excluded_subdirs)
+        self.interval = interval
+        self._snapshot = self._take_snapshot()
+        self._last_poll = time.monotonic()
+
+    def poll(self, timeout: float) -> Set[str]:
+        """Wait up to `timeout` seconds for changes, return the paths changed since last call."""
+        wait = self._last_poll + self.interval - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(wait, 0))
+
+        snapshot = self._take_snapshot()
+        self._last_poll = time.monotonic()
+        changes = {path for path in snapshot.keys() | self._snapshot.keys()
+                   if snapshot.get(path) != self._snapshot.get(path)}
+        self._snapshot = snapshot
+        return changes
+
+    def _take_snapshot(self) -> Dict[str, Tuple[int, int, int]]:
+        """Return stat signatures of every file in the tree."""
+        snapshot = {}
+        for entry in repository.list_files(self.path, self.excluded_subdirs):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns, entry.inode())
+        return snapshot
+
+
+class InotifyWatcher(Watcher):
+    """Detect changes through Linux inotify, watching every directory of the tree."""
+
+    def __init__(self, path: str, excluded_subdirs: Iterable[str] = ()) -> None:
+        """Initialize object, watching every directory under `path`."""
+        super().__init__(path, excluded_subdirs)
+        libc = _libc()
+        if libc is None:
+            raise OSError('inotify is not available')
+        self._libc: ctypes.CDLL = libc
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._directories: Dict[int, str] = {}
+        self._overflow = False
+        try:
+            self._watch_tree(self.path)
+        except OSError:
+            self.close()
+            raise
+
+    def poll(self, timeout: float) -> Set[str]:
+        """Wait up to `timeout` seconds for changes, return the paths changed since last call.
+
+        Raise `OSError` if a new directory cannot be watched, see `_watch_tree`.
+        """
+        changes: Set[str] = set()
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        while readable:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            changes.update(self._parse(data))
+            readable, _, _ = select.select([self._fd], [], [], 0)
+
+        if self._overflow:
+            self._overflow = False
+            return {self.path}
+        return changes
+
+    def close(self) -> None:
+        """Stop watching."""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _watch_tree(self, path: str) -> None:
+        """Watch `path` and every directory under it.
+
+        Raise `OSError` if a directory cannot be watched, e.g. once the inotify watches allowed
+        by `max_user_watches` are exhausted, since its changes would go unnoticed.
+        """
+        pending = [path]
+        while pending:
+            directory = pending.pop()
+            descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(directory),
+                                                      _WATCH_MASK)
+            if descriptor < 0:
+                error = ctypes.get_errno()
+                if error in (errno.ENOENT, errno.ENOTDIR):
+                    continue  # Removed in the meantime
+                raise OSError(error, 'Cannot watch {}: {}'.format(directory, os.strerror(error)))
+            self._directories[descriptor] = directory
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in self.excluded_subdirs:
+                                pending.append(entry.path)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+    def _parse(self, data: bytes) -> Set[str]:
+        """Decode inotify events, return the changed paths."""
+        changes = set()
+        offset = 0
+        while offset + _EVENT.size <= len(data):
+            descriptor, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length]
+                               .rstrip(b'\0'))
+            offset += _EVENT.size + length
+
+            if mask & _IN_Q_OVERFLOW:
+                self._overflow = True
+                continue
+            directory = self._directories.get(descriptor)
+            if mask & _IN_IGNORED:
+                self._directories.pop(descriptor, None)
+                continue
+            if directory is None or (mask & _IN_ISDIR and name in self.excluded_subdirs):
+                continue
+
+            path = os.path.join(directory, name) if name else directory
+            changes.add(path)
+            if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                self._watch_tree(path)
+        return changes
+
+
+def _libc() -> Optional[ctypes.CDLL]:
+    """Load the C library if it provides inotify."""
+    if not sys.platform.startswith('linux'):
+        return None
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    if not hasattr(libc, 'inotify_init1'):
+        return None
+    return libc
+
+
+def create(path: str, excluded_subdirs: Iterable[str] = ()) -> Watcher:
+    """Create the most efficient watcher available on this system."""
+    try:
+        return InotifyWatcher(path, excluded_subdirs)
+    except OSError:
+        return PollingWatcher(path, excluded_subdirs)
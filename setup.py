@@ -72,6 +72,15 @@ if __name__ == '__main__':
             'msgpack>=0.5.6,<1',
         ],
         extras_require={
+            'xxhash': [
+                'xxhash>=2,<4',
+            ],
+            'blake3': [
+                'blake3>=0.2,<1',
+            ],
+            'zstd': [
+                'zstandard>=0.11,<1',
+            ],
             'dev': [
                 'ipython>=6.1,<7',
             ],
@@ -0,0 +1,123 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+
+"""Fixtures shared by the test suite."""
+
+import functools
+import http.server
+import io
+import os
+import threading
+
+import pyarmasync.repository as repository
+
+import pytest
+
+
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Serve static files supporting single range requests, like common HTTP servers do."""
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    requests = []
+    clients = set()
+
+    def send_head(self):
+        """Answer with partial content if a range is requested."""
+        self.requests.append((self.path, self.headers.get('Range')))
+        self.clients.add(self.client_address)
+        header = self.headers.get('Range')
+        path = self.translate_path(self.path)
+        if header is None or not os.path.isfile(path):
+            return super().send_head()
+
+        first, last = header.replace('bytes=', '').split('-')
+        with open(path, mode='rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            file.seek(start)
+            content = file.read(end - start + 1)
+
+        self.send_response(206)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, size))
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        return io.BytesIO(content)
+
+    def log_message(self, *args):
+        """Keep test output clean."""
+        pass
+
+
+class RepositoryServer(object):
+    """Repository served over HTTP from a temporary directory."""
+
+    def __init__(self, path):
+        """Start serving `path`."""
+        RangeRequestHandler.requests = []
+        RangeRequestHandler.clients = set()
+        handler = functools.partial(RangeRequestHandler, directory=path)
+        self.httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.httpd.daemon_threads = True
+        self.httpd.block_on_close = False
+        self.url = 'http://127.0.0.1:{}/'.format(self.httpd.server_address[1])
+        self.path = path
+        self.repository = repository.Repository.initialize(path, 'test', self.url)
+        self._thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,),
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def requests(self):
+        """List path and range of every request received."""
+        return RangeRequestHandler.requests
+
+    @property
+    def connections(self):
+        """Count connections that sent at least one request."""
+        return len(RangeRequestHandler.clients)
+
+    def write(self, key, content):
+        """Write `content` to the file at `key`, relative to the repository."""
+        path = os.path.join(self.path, *key.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, mode='wb') as file:
+            file.write(content)
+
+    def stop(self):
+        """Stop serving."""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture()
+def server(tmp_path):
+    """Offer an HTTP served repository as pytest fixture."""
+    path = tmp_path / 'server'
+    path.mkdir()
+    repository_server = RepositoryServer(str(path))
+    yield repository_server
+    repository_server.stop()
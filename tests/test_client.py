@@ -0,0 +1,674 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+
+"""Test suite for `pyarmasync.client`."""
+
+import http.server
+import os
+import time
+
+import pyarmasync.client as unit
+import pyarmasync.configuration as config
+import pyarmasync.exceptions as exceptions
+import pyarmasync.repository as repository
+
+import pytest
+
+
+@pytest.fixture()
+def client(tmp_path, server):
+    """Offer a client of the `server` repository as pytest fixture."""
+    return unit.Client.create(str(tmp_path / 'client'), server.url, overwrite=False)
+
+
+def read(base, key):
+    """Read the file at `key`, relative to `base`."""
+    with open(os.path.join(base, *key.split('/')), mode='rb') as file:
+        return file.read()
+
+
+def test_sync_new_files(server, client):
+    """Assert missing files are downloaded."""
+    files = {'@cba/addons/cba.pbo': os.urandom(300000), '@cba/mod.cpp': b'name = "CBA";',
+             '@ace/addons/ace.pbo': b''}
+    for key, content in files.items():
+        server.write(key, content)
+    server.repository.build()
+
+    result = client.sync()
+
+    for key, content in files.items():
+        assert read(client.path, key) == content
+    assert result.bytes_transferred == sum(len(content) for content in files.values())
+    assert result.bytes_reused == 0
+    assert result.files_updated == 3
+
+
+def test_sync_up_to_date(server, client):
+    """Assert nothing is fetched when the client is up to date."""
+    server.write('@cba/mod.cpp', os.urandom(1000))
+    server.repository.build()
+    client.sync()
+
+    result = unit.Client(client.path, server.url).sync()
+
+    assert result.bytes_transferred == 0
+    assert result.bytes_reused == 1000
+    assert result.files_updated == 0
+
+
+def test_sync_without_create(server, tmp_path):
+    """Assert clients constructed directly record the repository on their first sync."""
+    server.write('@cba/mod.cpp', os.urandom(1000))
+    server.repository.build()
+    path = str(tmp_path / 'client')
+
+    unit.Client(path, server.url).sync()
+
+    assert read(path, '@cba/mod.cpp') == read(server.path, '@cba/mod.cpp')
+    assert unit.Client.check_presence(path)
+    assert unit.Client.create(path, server.url, overwrite=False).generation is not None
+
+
+@pytest.mark.parametrize('mutate', [
+    lambda content: content[:200000] + os.urandom(1000) + content[201000:],
+    lambda content: os.urandom(777) + content,
+    lambda content: content[:50000] + content[90000:],
+    lambda content: content + os.urandom(5000),
+    lambda content: content[:300000],
+])
+def test_sync_changed_file_fetches_changed_blocks(mutate, server, client):
+    """Assert only blocks not available locally are fetched."""
+    original = os.urandom(config.block_size * 8 + 123)
+    updated = mutate(original)
+    server.write('@ace/addons/ace.pbo', original)
+    server.repository.build()
+    client.sync()
+
+    server.write('@ace/addons/ace.pbo', updated)
+    server.repository.build()
+    result = client.sync()
+
+    assert read(client.path, '@ace/addons/ace.pbo') == updated
+    assert result.bytes_transferred <= 2 * config.block_size
+    assert result.bytes_transferred + result.bytes_reused == len(updated)
+
+
+def test_sync_removed_files(server, client):
+    """Assert files removed from the repository are removed locally."""
+    server.write('@cba/mod.cpp', b'cba')
+    server.write('@ace/addons/ace.pbo', b'ace')
+    server.repository.build()
+    client.sync()
+
+    os.remove(os.path.join(server.path, '@ace', 'addons', 'ace.pbo'))
+    server.repository.build()
+    result = client.sync()
+
+    assert result.files_removed == 1
+    assert not os.path.exists(os.path.join(client.path, '@ace'))
+    assert read(client.path, '@cba/mod.cpp') == b'cba'
+
+
+def test_sync_repairs_local_changes(server, client):
+    """Assert local modifications are detected through the stat signature and reverted."""
+    server.write('@cba/mod.cpp', b'original')
+    server.repository.build()
+    client.sync()
+
+    with open(os.path.join(client.path, '@cba', 'mod.cpp'), mode='wb') as file:
+        file.write(b'tampered')
+    client.sync()
+
+    assert read(client.path, '@cba/mod.cpp') == b'original'
+
+
+def test_sync_follows_hash_algorithm(server, client):
+    """Assert files are verified with the hash algorithm of the repository, even if it changes."""
+    server.write('@cba/mod.cpp', os.urandom(1000))
+    server.repository.build()
+    client.sync()
+
+    server.repository.hash_algorithm = 'adler32'
+    server.repository.build()
+    result = client.sync()
+
+    assert client.hash_algorithm == 'adler32'
+    assert result.bytes_transferred == 0
+    assert client.file_checksums['@cba/mod.cpp'].checksum == \
+        server.repository.file_checksums['@cba/mod.cpp'].checksum
+
+
+def test_sync_fetches_compressed_blocks(server, client):
+    """Assert compressed blocks are fetched and decompressed when the repository has them."""
+    content = b'class CfgPatches {};\n' * 20000
+    server.write('@cba/config.cpp', content)
+    server.write('@cba/addons/cba.pbo', os.urandom(1000))
+    server.repository.block_compression = 'zlib'
+    server.repository.build()
+
+    result = client.sync()
+
+    assert read(client.path, '@cba/config.cpp') == content
+    assert result.bytes_decompressed == len(content)
+    assert result.bytes_transferred < len(content) // 10 + 1000
+
+
+def test_sync_fetches_pack_records_with_few_requests(server, client):
+    """Assert synchronization data of many files is fetched with a handful of requests."""
+    for index in range(200):
+        server.write('@mod/addons/file{}.paa'.format(index), os.urandom(64))
+    server.repository.build()
+
+    client.sync()
+
+    pack_requests = [path for path, _ in server.requests if '/packs/' in path]
+    assert len(pack_requests) <= 2
+
+
+@pytest.mark.parametrize('prefetch', [16, 200, 400, 64 * 1024])
+def test_sync_reuses_records_fetched_with_index(prefetch, server, client, mocker):
+    """Assert records fetched along with a pack index are not requested again."""
+    mocker.patch('pyarmasync.configuration.pack_prefetch', prefetch)
+    files = {'@mod/addons/file{}.paa'.format(index): os.urandom(64) for index in range(5)}
+    for key, content in files.items():
+        server.write(key, content)
+    server.repository.build()
+
+    client.sync()
+
+    for key, content in files.items():
+        assert read(client.path, key) == content
+    pack_requests = [path for path, _ in server.requests if '/packs/' in path]
+    if prefetch == 64 * 1024:
+        assert len(pack_requests) == len(set(pack_requests))
+
+
+@pytest.mark.parametrize('hardlink', [True, False])
+def test_sync_fetches_duplicates_once(hardlink, server, client):
+    """Assert files sharing the same content are fetched once and copied locally."""
+    content = os.urandom(100000)
+    for mod in ('@cba', '@ace', '@acex'):
+        server.write(mod + '/addons/cba_main.pbo', content)
+    server.repository.build()
+    client.hardlink_duplicates = hardlink
+
+    result = client.sync()
+
+    for mod in ('@cba', '@ace', '@acex'):
+        assert read(client.path, mod + '/addons/cba_main.pbo') == content
+    assert result.bytes_transferred == len(content)
+    assert result.files_updated == 3
+    assert result.files_copied == 2
+    assert os.path.samefile(os.path.join(client.path, '@ace', 'addons', 'cba_main.pbo'),
+                            os.path.join(client.path, '@cba', 'addons', 'cba_main.pbo')) == \
+        hardlink
+
+
+def test_sync_copies_duplicates_of_current_files(server, client):
+    """Assert new duplicates of already synchronized files are copied without fetching."""
+    content = os.urandom(100000)
+    server.write('@cba/addons/cba_main.pbo', content)
+    server.repository.build()
+    client.sync()
+
+    server.write('@ace/addons/cba_main.pbo', content)
+    server.repository.build()
+    result = unit.Client(client.path, server.url).sync()
+
+    assert read(client.path, '@ace/addons/cba_main.pbo') == content
+    assert result.bytes_transferred == 0
+    assert result.files_copied == 1
+
+
+def test_sync_moves_renamed_files(server, client):
+    """Assert files moved in the repository are moved locally instead of fetched."""
+    files = {'addons/ace_main.pbo': os.urandom(100000), 'addons/ace_common.pbo': os.urandom(5000),
+             'mod.cpp': b'name = "ACE";'}
+    for key, content in files.items():
+        server.write('@ace/' + key, content)
+    server.repository.build()
+    client.sync()
+
+    os.rename(os.path.join(server.path, '@ace'), os.path.join(server.path, '@ace3'))
+    server.repository.build()
+    result = client.sync()
+
+    for key, content in files.items():
+        assert read(client.path, '@ace3/' + key) == content
+    assert not os.path.exists(os.path.join(client.path, '@ace'))
+    assert result.bytes_transferred == 0
+    assert result.bytes_relocated == sum(len(content) for content in files.values())
+    assert result.files_moved == 3
+    assert result.files_removed == 0
+
+
+def test_sync_ignores_moves_of_modified_files(server, client):
+    """Assert locally modified files are not moved but fetched again."""
+    server.write('@ace/mod.cpp', b'name = "ACE";')
+    server.repository.build()
+    client.sync()
+    with open(os.path.join(client.path, '@ace', 'mod.cpp'), mode='ab') as file:
+        file.write(b'tampered')
+
+    os.rename(os.path.join(server.path, '@ace'), os.path.join(server.path, '@ace3'))
+    server.repository.build()
+    result = client.sync()
+
+    assert read(client.path, '@ace3/mod.cpp') == b'name = "ACE";'
+    assert result.files_moved == 0
+    assert result.files_removed == 1
+
+
+def test_sync_stats(server, client):
+    """Assert synchronizations report their phases, requests and the work done."""
+    server.write('@cba/mod.cpp', b'cba')
+    server.write('@ace/addons/ace.pbo', os.urandom(10000))
+    server.repository.build()
+
+    stats = client.sync()
+
+    assert stats is client.stats
+    assert set(stats.phases) == {'metadata', 'remove', 'check', 'sync_data', 'update', 'copy',
+                                 'tree'}
+    assert stats.files_checked == 2
+    assert stats.files_updated == 2
+    assert stats.bytes_written == 10003 + sum(os.path.getsize(path) for path in (
+        client._tree_file_path, client._hashes_file_path, client._index_file_path))
+    assert stats.requests == len(server.requests)
+
+
+def test_sync_up_to_date_single_request(server, client):
+    """Assert an up to date client only fetches the repository information."""
+    server.write('@cba/mod.cpp', b'cba')
+    server.write('@ace/addons/ace.pbo', b'ace')
+    server.repository.build()
+    client.sync()
+    server.requests.clear()
+
+    stats = unit.Client(client.path, server.url).sync()
+
+    assert len(server.requests) == 1
+    assert stats.files_skipped == 2
+    assert stats.files_checked == 0
+
+
+def test_sync_descends_changed_directories_only(server, client):
+    """Assert only files of directories whose hash changed are checked."""
+    for index in range(10):
+        server.write('@cba/addons/file{}.pbo'.format(index), os.urandom(100))
+    server.write('@ace/addons/ace.pbo', b'ace')
+    server.repository.build()
+    client.sync()
+
+    server.write('@ace/addons/ace.pbo', b'ace updated')
+    server.repository.build()
+    stats = client.sync()
+
+    assert read(client.path, '@ace/addons/ace.pbo') == b'ace updated'
+    assert stats.files_checked == 1
+    assert stats.files_skipped == 10
+
+
+def test_sync_applies_change_lists(server, client):
+    """Assert clients a few generations behind apply change lists instead of fetching the tree."""
+    server.write('@cba/mod.cpp', b'cba')
+    server.write('@ace/addons/ace.pbo', b'ace')
+    server.repository.build()
+    client.sync()
+
+    server.write('@ace/addons/ace.pbo', b'ace updated')
+    server.repository.build()
+    os.remove(os.path.join(server.path, '@cba', 'mod.cpp'))
+    server.write('@cba/addons/cba.pbo', b'cba addons')
+    server.repository.build()
+    del server.requests[:]
+    client = unit.Client(client.path, server.url)
+    stats = client.sync()
+
+    assert read(client.path, '@ace/addons/ace.pbo') == b'ace updated'
+    assert read(client.path, '@cba/addons/cba.pbo') == b'cba addons'
+    assert not os.path.exists(os.path.join(client.path, '@cba', 'mod.cpp'))
+    assert stats.files_removed == 1
+    fetched = [path for path, _ in server.requests]
+    assert '/.pyarmasync/changes/2' in fetched and '/.pyarmasync/changes/3' in fetched
+    assert '/.pyarmasync/repotree' not in fetched
+    assert client.generation == 3
+
+
+def test_sync_fetches_tree_when_change_lists_expired(server, client, mocker):
+    """Assert the whole tree is fetched when change lists were garbage collected."""
+    mocker.patch('pyarmasync.configuration.generation_retention', 1)
+    server.write('@cba/mod.cpp', b'cba')
+    server.repository.build()
+    client.sync()
+
+    for content in (b'cba 2', b'cba 3'):
+        server.write('@cba/mod.cpp', content)
+        server.repository.build()
+    del server.requests[:]
+    client.sync()
+
+    assert read(client.path, '@cba/mod.cpp') == b'cba 3'
+    assert '/.pyarmasync/repotree' in [path for path, _ in server.requests]
+
+
+@pytest.mark.parametrize('corrupt', [False, True])
+def test_sync_applies_delta_patches(corrupt, server, client, mocker):
+    """Assert delta patches are applied when smaller than the blocks to fetch, if valid."""
+    mocker.patch('pyarmasync.configuration.patch_min_size', 4096)
+    original = os.urandom(config.block_size * 4)
+    server.write('@ace/addons/ace.pbo', original)
+    server.repository.delta_patches = True
+    server.repository.build()
+    client.sync()
+
+    updated = b'header' + original[config.block_size:] + original[:config.block_size]
+    server.write('@ace/addons/ace.pbo', updated)
+    server.repository.build()
+    if corrupt:
+        server.write('.pyarmasync/patches/@ace/addons/ace.pbo', b'garbage')
+    result = client.sync()
+
+    assert read(client.path, '@ace/addons/ace.pbo') == updated
+    assert result.files_patched == (0 if corrupt else 1)
+    if not corrupt:
+        assert result.bytes_transferred < 1024
+    assert os.listdir(os.path.join(client.path, '@ace', 'addons')) == ['ace.pbo']
+
+
+def test_sync_fetches_delta_patches_by_ranges(server, client, mocker):
+    """Assert large delta patches are fetched by ranges and applied as they arrive."""
+    mocker.patch('pyarmasync.configuration.patch_min_size', 4096)
+    original = os.urandom(config.block_size * 4)
+    server.write('@ace/addons/ace.pbo', original)
+    server.repository.delta_patches = True
+    server.repository.build()
+    client.sync()
+
+    updated = os.urandom(3000) + original[config.block_size:] + original[:config.block_size]
+    server.write('@ace/addons/ace.pbo', updated)
+    server.repository.build()
+    mocker.patch('pyarmasync.configuration.max_range_size', 1024)
+    result = client.sync()
+
+    assert read(client.path, '@ace/addons/ace.pbo') == updated
+    assert result.files_patched == 1
+    patch_requests = [path for path, _ in server.requests if '/patches/' in path]
+    assert len(patch_requests) > 1
+
+
+def interrupt_downloads(client, mocker, blocks):
+    """Make the downloads of `client` fail once `blocks` ranges of a file were fetched."""
+    original = client.remote.fetch_many
+
+    def fetch_many(requests):
+        requests = list(requests)
+        for index, content in enumerate(original(requests)):
+            if index == blocks and '/packs/' not in requests[0][0]:
+                raise ConnectionError('interrupted')
+            yield content
+
+    mocker.patch.object(client.remote, 'fetch_many', side_effect=fetch_many)
+
+
+@pytest.mark.parametrize('corrupt', [False, True])
+def test_sync_resumes_interrupted_downloads(corrupt, server, client, mocker):
+    """Assert blocks written before an interruption are checked and kept, not fetched again."""
+    mocker.patch('pyarmasync.configuration.max_range_size', config.block_size)
+    content = os.urandom(config.block_size * 6 + 100)
+    server.write('@ace/addons/ace.pbo', content)
+    server.repository.build()
+    interrupt_downloads(client, mocker, 4)
+    client.journal.save_interval = 0
+
+    with pytest.raises(ConnectionError):
+        client.sync()
+
+    partial_path = os.path.join(client.path, '@ace', 'addons',
+                                'ace.pbo' + config.partial_extension)
+    assert os.path.getsize(partial_path) == 4 * config.block_size
+    if corrupt:
+        with open(partial_path, mode='r+b') as partial:
+            partial.write(b'corrupted')
+
+    resumed = unit.Client(client.path, server.url)
+    stats = resumed.sync()
+
+    assert read(client.path, '@ace/addons/ace.pbo') == content
+    assert stats.bytes_resumed == (3 if corrupt else 4) * config.block_size
+    assert stats.bytes_transferred == len(content) - stats.bytes_resumed
+    assert not os.path.exists(partial_path)
+    assert not resumed.journal.files
+    assert not os.path.exists(resumed.journal.path)
+
+
+def test_sync_discards_unneeded_partial_files(server, client, mocker):
+    """Assert partial files of files removed from the repository meanwhile are deleted."""
+    mocker.patch('pyarmasync.configuration.max_range_size', config.block_size)
+    server.write('@ace/addons/ace.pbo', os.urandom(config.block_size * 3))
+    server.repository.build()
+    interrupt_downloads(client, mocker, 1)
+    client.journal.save_interval = 0
+    with pytest.raises(ConnectionError):
+        client.sync()
+
+    os.remove(os.path.join(server.path, '@ace', 'addons', 'ace.pbo'))
+    server.write('@cba/mod.cpp', b'cba')
+    server.repository.build()
+    resumed = unit.Client(client.path, server.url)
+    resumed.sync()
+
+    assert not os.path.exists(os.path.join(client.path, '@ace'))
+    assert not resumed.journal.files
+
+
+def test_verify_trusts_unchanged_files(server, client):
+    """Assert verification only hashes files whose stat signature changed."""
+    server.write('@cba/mod.cpp', b'cba')
+    server.write('@ace/addons/ace.pbo', os.urandom(10000))
+    server.repository.build()
+    client.sync()
+    path = os.path.join(client.path, '@cba', 'mod.cpp')
+    os.utime(path, ns=(0, 0))
+
+    stats = client.verify()
+
+    assert stats is client.stats
+    assert stats.files_checked == 2
+    assert stats.files_skipped == 1
+    assert stats.files_hashed == 1
+    assert stats.bytes_read == 3
+    assert client.damaged_files == set()
+    assert unit.Client(client.path, server.url).file_checksums['@cba/mod.cpp'].mtime_ns == 0
+    assert client.verify().files_hashed == 0
+
+
+def test_verify_deep(server, client):
+    """Assert a deep verification hashes every file, detecting silent damage."""
+    server.write('@cba/mod.cpp', b'cba')
+    server.write('@ace/addons/ace.pbo', b'ace')
+    server.repository.build()
+    client.sync()
+    path = os.path.join(client.path, '@cba', 'mod.cpp')
+    stat = os.stat(path)
+    with open(path, mode='r+b') as file:
+        file.write(b'xyz')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    assert client.verify().files_damaged == 0
+    stats = client.verify(deep=True, jobs=2)
+
+    assert stats.files_hashed == 2
+    assert stats.files_damaged == 1
+    assert client.damaged_files == {'@cba/mod.cpp'}
+
+    client = unit.Client(client.path, server.url)
+    assert client.sync().files_updated == 1
+    assert read(client.path, '@cba/mod.cpp') == b'cba'
+
+
+def test_verify_missing_files(server, client):
+    """Assert verification reports missing files."""
+    server.write('@cba/mod.cpp', b'cba')
+    server.repository.build()
+    client.sync()
+    os.remove(os.path.join(client.path, '@cba', 'mod.cpp'))
+
+    stats = client.verify()
+
+    assert stats.files_missing == 1
+    assert stats.files_hashed == 0
+    assert client.damaged_files == {'@cba/mod.cpp'}
+
+
+def test_sync_file_url(server, tmp_path):
+    """Assert repositories on local file systems are synchronized by copying files directly."""
+    server.write('@cba/addons/cba.pbo', os.urandom(300000))
+    server.write('@cba/mod.cpp', b'name = "CBA";')
+    server.repository.build()
+    client = unit.Client.create(str(tmp_path / 'client'), 'file://localhost' + server.path,
+                                overwrite=False)
+    client.sync()
+    content = bytearray(read(server.path, '@cba/addons/cba.pbo'))
+    content[150000:150010] = os.urandom(10)
+    server.write('@cba/addons/cba.pbo', bytes(content))
+    server.repository.build()
+
+    stats = client.sync()
+
+    assert read(client.path, '@cba/addons/cba.pbo') == content
+    assert read(client.path, '@cba/mod.cpp') == b'name = "CBA";'
+    assert 0 < stats.bytes_transferred < 300000
+    assert stats.files_updated == 1
+    assert not server.requests
+
+
+def test_sync_schedule(server, tmp_path, mocker):
+    """Assert files of required mods are fetched first, within the rate limit, with progress."""
+    mock_sleep = mocker.patch('time.sleep')
+    server.write('@cba/addons/cba.pbo', os.urandom(50000))
+    server.write('@cba/mod.cpp', b'cba')
+    server.write('@ace/addons/ace.pbo', os.urandom(20000))
+    server.repository.build()
+    client = unit.Client(unit.Client.create(str(tmp_path / 'client'), server.url, False).path,
+                         server.url, connections=2, rate_limit=10000, required_mods=['@cba'])
+    updates = []
+    client.progress_hooks.append(lambda progress: updates.append(
+        (progress.files_done, progress.bytes_done)))
+    server.requests.clear()
+
+    client.sync()
+
+    fetched = [path for path, _ in server.requests if path.endswith(('.pbo', '.cpp'))]
+    assert set(fetched[:2]) == {'/%40cba/mod.cpp', '/%40cba/addons/cba.pbo'}
+    assert fetched[2:] == ['/%40ace/addons/ace.pbo']
+    assert updates[-1] == (3, 70003)
+    assert client.progress.files_total == 3
+    assert sum(call.args[0] for call in mock_sleep.call_args_list) >= 5.0
+
+
+def test_sync_required_mods_before_small_files(server, tmp_path, mocker):
+    """Assert large files of required mods are fetched before small files of other mods."""
+    mocker.patch('pyarmasync.configuration.max_range_size', 4096)
+    server.write('@required/addons/big.pbo', os.urandom(20000))
+    server.write('@other/addons/small.pbo', os.urandom(1000))
+    server.repository.build()
+    client = unit.Client(unit.Client.create(str(tmp_path / 'client'), server.url, False).path,
+                         server.url, required_mods=['@required'])
+    server.requests.clear()
+
+    client.sync()
+
+    fetched = [path for path, _ in server.requests if path.endswith('.pbo')]
+    assert fetched == ['/%40required/addons/big.pbo', '/%40other/addons/small.pbo']
+    assert read(client.path, '@required/addons/big.pbo') == \
+        read(server.path, '@required/addons/big.pbo')
+
+
+def test_multi_client_shares_content(server, tmp_path):
+    """Assert content shared by repositories is downloaded once and materialized from the store."""
+    shared = os.urandom(100000)
+    server.write('@cba/addons/cba.pbo', shared)
+    server.write('@main/mod.cpp', b'main')
+    server.repository.build()
+    training_path = tmp_path / 'training'
+    training_path.mkdir()
+    training_url = 'file://localhost' + str(training_path)
+    training = repository.Repository.initialize(str(training_path), 'training', training_url)
+    for key, content in (('@cba/addons/cba.pbo', shared), ('@training/mod.cpp', b'training')):
+        os.makedirs(os.path.join(str(training_path), os.path.dirname(key)), exist_ok=True)
+        with open(os.path.join(str(training_path), key), mode='wb') as file:
+            file.write(content)
+    training.build()
+
+    multi_client = unit.MultiClient(str(tmp_path / 'store'))
+    multi_client.subscribe('main', str(tmp_path / 'main'), server.url)
+    multi_client.subscribe('training', str(tmp_path / 'mods'), training_url, ['@training'])
+    results = multi_client.sync()
+
+    assert results['main'].files_shared == 0
+    assert results['training'].files_shared == 1
+    assert results['training'].bytes_transferred == len(b'training')
+    assert os.path.samefile(str(tmp_path / 'main' / '@cba' / 'addons' / 'cba.pbo'),
+                            str(tmp_path / 'mods' / '@cba' / 'addons' / 'cba.pbo'))
+    assert read(str(tmp_path / 'mods'), '@training/mod.cpp') == b'training'
+
+    reloaded = unit.MultiClient(str(tmp_path / 'store'))
+    assert reloaded.clients['training'].required_mods == {'@training'}
+    reloaded.unsubscribe('main')
+    assert reloaded.collect() == 1
+    assert sorted(unit.MultiClient(str(tmp_path / 'store')).clients) == ['training']
+
+
+def test_sync_small_files_concurrently(server, client, mocker):
+    """Assert many small new files are fetched through several connections at once."""
+    original_send_head = http.server.SimpleHTTPRequestHandler.send_head
+
+    def slow_send_head(self):
+        time.sleep(0.05)
+        return original_send_head(self)
+
+    mocker.patch.object(http.server.SimpleHTTPRequestHandler, 'send_head', slow_send_head)
+    files = {'@mod/file{}.paa'.format(index): os.urandom(index + 1) for index in range(60)}
+    for key, content in files.items():
+        server.write(key, content)
+    server.repository.build()
+
+    stats = client.sync()
+
+    assert stats.files_updated == 60
+    assert server.connections > 1
+    for key, content in files.items():
+        assert read(client.path, key) == content
+
+
+def test_sync_missing_sync_data(server, client, mocker):
+    """Assert files without published synchronization data fail the sync cleanly."""
+    server.write('@cba/mod.cpp', b'cba')
+    server.repository.build()
+    mocker.patch('pyarmasync.pack.load_index', return_value=({}, 0))
+
+    with pytest.raises(exceptions.SyncError):
+        client.sync()
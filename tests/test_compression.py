@@ -0,0 +1,81 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+
+"""Test suite for `pyarmasync.compression`."""
+
+import os
+import sys
+
+import pyarmasync.compression as unit
+from pyarmasync import exceptions
+
+import pytest
+
+
+@pytest.mark.parametrize('codec', unit.available())
+def test_compress_file(codec, tmp_path):
+    """Assert blocks are compressed one by one, incompressible ones being stored raw."""
+    content = b'a' * 4096 + os.urandom(4096) + b'b' * 1000
+    path = tmp_path / 'file.pbo'
+    path.write_bytes(content)
+    payload_path = str(tmp_path / 'payload' / 'file.pbo')
+
+    stored = unit.compress_file(str(path), payload_path, 4096, codec, ratio=1)
+
+    with open(payload_path, mode='rb') as payload:
+        data = payload.read()
+    offsets = unit.offsets(stored)
+    assert stored[0] < 4096 and stored[1] == 4096 and stored[2] < 1000
+    assert offsets[-1] == len(data)
+    assert unit.decompress_blocks(codec, data, [4096, 4096, 1000], stored) == content
+    assert unit.decompress_blocks(codec, data[offsets[1]:], [4096, 1000], stored[1:]) == \
+        content[4096:]
+
+
+@pytest.mark.parametrize('content', [b'', os.urandom(10000)])
+def test_compress_file_not_worth_it(content, tmp_path):
+    """Assert no payload is stored for empty or incompressible files."""
+    path = tmp_path / 'file.pbo'
+    path.write_bytes(content)
+    payload_path = str(tmp_path / 'file.pbo.payload')
+
+    assert unit.compress_file(str(path), payload_path, 4096, 'zlib') == ()
+    assert not os.path.exists(payload_path)
+
+
+def test_unknown_codec():
+    """Assert unknown codecs are rejected, listing the available ones."""
+    with pytest.raises(exceptions.UnsupportedCompression) as error:
+        unit.codec('lzma')
+
+    assert 'zlib' in error.value.supported_codecs
+
+
+def test_missing_optional_package(mocker):
+    """Assert codecs whose package is not installed are reported as unsupported."""
+    mocker.patch.dict(sys.modules, {'zstandard': None})
+
+    with pytest.raises(exceptions.UnsupportedCompression):
+        unit.codec('zstd')
+    assert unit.available() == ['zlib']
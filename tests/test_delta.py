@@ -0,0 +1,112 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+
+"""Test suite for `pyarmasync.delta`."""
+
+import os
+import time
+
+import pyarmasync.delta as unit
+
+import pytest
+
+
+def shuffled(content, parts):
+    """Split `content` in `parts` and reorder them, inserting some new data."""
+    size = len(content) // parts
+    pieces = [content[offset:offset + size] for offset in range(0, len(content), size)]
+    return os.urandom(77) + b''.join(pieces[1::2]) + os.urandom(1000) + b''.join(pieces[::2])
+
+
+@pytest.mark.parametrize('source,target', [
+    (b'', b''),
+    (b'', b'new content'),
+    (b'former content', b''),
+    (os.urandom(100), os.urandom(100)),
+])
+def test_roundtrip_small(source, target, tmp_path):
+    """Assert patches rebuild the new version whatever the sizes of both versions."""
+    (tmp_path / 'source').write_bytes(source)
+    (tmp_path / 'target').write_bytes(target)
+
+    unit.diff(str(tmp_path / 'source'), str(tmp_path / 'target'), str(tmp_path / 'patch'))
+
+    patch = (tmp_path / 'patch').read_bytes()
+    assert b''.join(unit.apply(str(tmp_path / 'source'), patch)) == target
+
+
+def test_patch_of_shuffled_content(tmp_path):
+    """Assert moved data is copied from the former version rather than carried by the patch."""
+    source = os.urandom(1024 * 1024)
+    target = shuffled(source, 8)
+    (tmp_path / 'source').write_bytes(source)
+    (tmp_path / 'target').write_bytes(target)
+
+    size = unit.diff(str(tmp_path / 'source'), str(tmp_path / 'target'), str(tmp_path / 'patch'))
+
+    patch = (tmp_path / 'patch').read_bytes()
+    assert size == len(patch) < 4096
+    assert b''.join(unit.apply(str(tmp_path / 'source'), patch, chunk_size=1000)) == target
+
+
+def test_apply_streamed_patch(tmp_path):
+    """Assert patches received in chunks are applied as they come, in bounded chunks."""
+    source = os.urandom(100000)
+    target = shuffled(source, 4) + os.urandom(5000)
+    (tmp_path / 'source').write_bytes(source)
+    (tmp_path / 'target').write_bytes(target)
+    unit.diff(str(tmp_path / 'source'), str(tmp_path / 'target'), str(tmp_path / 'patch'))
+    patch = (tmp_path / 'patch').read_bytes()
+
+    chunks = list(unit.apply(str(tmp_path / 'source'),
+                             (patch[offset:offset + 7] for offset in range(0, len(patch), 7)),
+                             chunk_size=1000))
+
+    assert b''.join(chunks) == target
+    assert max(len(chunk) for chunk in chunks) <= 1000
+    with pytest.raises(ValueError):
+        b''.join(unit.apply(str(tmp_path / 'source'), [patch[:len(patch) // 2]]))
+
+
+@pytest.mark.parametrize('max_size,deadline', [(10000, None), (None, 0)])
+def test_budget_exceeded(max_size, deadline, tmp_path, mocker):
+    """Assert nothing is stored when the patch is too large or takes too long."""
+    mocker.patch.object(unit, '_CHECK_INTERVAL', 1024)
+    (tmp_path / 'source').write_bytes(os.urandom(100000))
+    (tmp_path / 'target').write_bytes(os.urandom(100000))
+
+    with pytest.raises(unit.BudgetExceeded):
+        unit.diff(str(tmp_path / 'source'), str(tmp_path / 'target'), str(tmp_path / 'patch'),
+                  max_size, deadline if deadline is None else time.monotonic() + deadline)
+    assert not (tmp_path / 'patch').exists()
+
+
+@pytest.mark.parametrize('patch', [b'garbage', unit.zlib.compress(b'PASDELTA'),
+                                   unit.zlib.compress(unit._HEADER.pack(unit.magic, 1, 10))])
+def test_invalid_patch(patch, tmp_path):
+    """Assert invalid or truncated patches are rejected."""
+    (tmp_path / 'source').write_bytes(b'content')
+
+    with pytest.raises(ValueError):
+        b''.join(unit.apply(str(tmp_path / 'source'), patch))
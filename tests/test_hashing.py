@@ -0,0 +1,82 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+
+"""Test suite for `pyarmasync.hashing`."""
+
+import hashlib
+import sys
+import zlib
+
+import pyarmasync.hashing as unit
+from pyarmasync import exceptions
+
+import pytest
+
+
+@pytest.mark.parametrize('algorithm', unit.available())
+def test_incremental_digest(algorithm):
+    """Assert digests do not depend on how data is split and have the same size."""
+    content = bytes(range(256)) * 100
+    whole = unit.new(algorithm)
+    whole.update(content)
+    split = unit.new(algorithm)
+    for offset in range(0, len(content), 1000):
+        split.update(memoryview(content)[offset:offset + 1000])
+
+    assert whole.digest() == split.digest()
+    assert len(whole.digest()) == unit.digest_size
+
+
+def test_known_digests():
+    """Assert digests match the reference implementations."""
+    blake2b = unit.new('blake2b')
+    blake2b.update(b'content')
+    adler32 = unit.new('adler32')
+    adler32.update(b'content')
+
+    assert blake2b.digest() == hashlib.blake2b(b'content', digest_size=16).digest()
+    assert adler32.digest() == unit.from_legacy(zlib.adler32(b'content'))
+
+
+def test_from_legacy():
+    """Assert integer checksums are padded to the digest size and digests left untouched."""
+    assert unit.from_legacy(0x01020304) == bytes(12) + b'\x01\x02\x03\x04'
+    assert unit.from_legacy(b'\x01' * 16) == b'\x01' * 16
+
+
+def test_unknown_algorithm():
+    """Assert unknown algorithms are rejected, listing the available ones."""
+    with pytest.raises(exceptions.UnsupportedHashAlgorithm) as error:
+        unit.new('md4')
+
+    assert 'blake2b' in error.value.supported_algorithms
+
+
+def test_missing_optional_package(mocker):
+    """Assert algorithms whose package is not installed are reported as unsupported."""
+    mocker.patch.dict(sys.modules, {'xxhash': None, 'blake3': None})
+
+    with pytest.raises(exceptions.UnsupportedHashAlgorithm):
+        unit.new('xxh3')
+    assert unit.available() == ['blake2b', 'adler32']
@@ -0,0 +1,86 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Test suite for `pyarmasync.journal`."""
+
+import pyarmasync.journal as unit
+from pyarmasync import signature
+
+import pytest
+
+
+@pytest.fixture()
+def sync_data():
+    """Offer the signature of a file made of 4 blocks and a partial one as pytest fixture."""
+    blocks = tuple(signature.block_signature(bytes([index]) * 1024) for index in range(5))
+    return signature.FileSignature(1, 4 * 1024 + 10, 1024, blocks)
+
+
+def test_journal_roundtrip(sync_data, tmp_path):
+    """Assert written blocks are persisted and reloaded."""
+    journal = unit.Journal(str(tmp_path / 'clientjournal'), save_interval=2048)
+    journal.start('@ace/ace.pbo', sync_data, {0})
+
+    assert not journal.mark('@ace/ace.pbo', 1024, 2048)
+    assert journal.mark('@ace/ace.pbo', 3072, 4106)
+    journal.save()
+
+    reloaded = unit.Journal(journal.path)
+    assert reloaded.written_blocks('@ace/ace.pbo', sync_data) == {0, 1, 3, 4}
+
+
+def test_journal_ignores_other_contents(sync_data, tmp_path):
+    """Assert partial files assembled for another content are not reported."""
+    journal = unit.Journal(str(tmp_path / 'clientjournal'))
+    journal.start('@ace/ace.pbo', sync_data, {0, 1})
+    other = sync_data._replace(blocks=sync_data.blocks[:4] + (sync_data.blocks[0],))
+
+    assert journal.written_blocks('@ace/ace.pbo', other) == set()
+    assert journal.written_blocks('@cba/cba.pbo', sync_data) == set()
+
+
+def test_journal_removed_when_empty(sync_data, tmp_path):
+    """Assert the journal file is removed once no partial file is tracked."""
+    journal = unit.Journal(str(tmp_path / 'clientjournal'), save_interval=2048)
+    journal.start('@ace/ace.pbo', sync_data)
+    assert (tmp_path / 'clientjournal').exists()
+
+    journal.finish('@ace/ace.pbo')
+
+    assert not (tmp_path / 'clientjournal').exists()
+
+
+def test_journal_skips_small_files(sync_data, tmp_path, mocker):
+    """Assert files smaller than the save interval are only journaled when saved explicitly."""
+    journal = unit.Journal(str(tmp_path / 'clientjournal'))
+    spy = mocker.spy(unit.utils, 'write_metadata')
+
+    journal.start('@ace/ace.pbo', sync_data)
+    journal.finish('@ace/ace.pbo')
+    journal.start('@ace/ace.pbo', sync_data, {0})
+    journal.save()
+
+    assert spy.call_count == 1
+    assert unit.Journal(journal.path).written_blocks('@ace/ace.pbo', sync_data) == {0}
+    journal.finish('@ace/ace.pbo')
+    assert not (tmp_path / 'clientjournal').exists()
@@ -0,0 +1,73 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+
+"""Test suite for `pyarmasync.pack`."""
+
+import pyarmasync.pack as unit
+
+import pytest
+
+
+@pytest.mark.parametrize('key,name', [
+    ('@ace/addons/ace_common.pbo', 'mods/@ace'),
+    ('@ace/mod.cpp', 'mods/@ace'),
+    ('readme.txt', 'root'),
+])
+def test_pack_name(key, name):
+    """Assert files are grouped by top level directory."""
+    assert unit.pack_name(key) == name
+
+
+def test_pack_roundtrip(tmp_path):
+    """Assert records are stored and read back by key."""
+    records = {'@ace/b.pbo': b'second', '@ace/a.pbo': b'first', '@ace/empty.pbo': b''}
+    path = str(tmp_path / 'packs' / 'mods' / '@ace')
+
+    unit.write(path, records)
+
+    assert unit.read(path) == records
+    assert unit.read(str(tmp_path / 'missing')) == {}
+
+
+def test_load_index_locations():
+    """Assert index locations point to records relative to the end of the index."""
+    content = unit.pack({'a': b'first', 'b': b'second'})
+
+    index, records_offset = unit.load_index(content)
+
+    offset, length = index['b']
+    assert content[records_offset + offset:records_offset + offset + length] == b'second'
+
+
+def test_invalid_pack():
+    """Assert content not starting with a pack header is rejected."""
+    with pytest.raises(ValueError):
+        unit.unpack(b'garbage' * 10)
+
+
+def test_coalesce():
+    """Assert close records are merged in a single range."""
+    locations = [(100, 10), (0, 10), (15, 5), (1000, 1)]
+
+    assert unit.coalesce(locations, max_gap=10) == [(0, 20), (100, 110), (1000, 1001)]
@@ -24,12 +24,15 @@
 
 """Test suite for `pyarmasync.repository`."""
 
+import hashlib
 import os
+import threading
+import zlib
 from unittest.mock import call
 
 import pyarmasync.configuration as config
 import pyarmasync.repository as unit
-from pyarmasync import exceptions
+from pyarmasync import exceptions, pack
 
 import pytest
 
@@ -147,3 +150,516 @@ def test_init_repo_permission_denied(common_mock):
 
     with pytest.raises(PermissionError):
         unit.Repository.initialize(directory, name, url)
+
+
+@pytest.mark.parametrize('size', [0, 1, 4095, 4096, 4097, 3 * 4096 + 17])
+def test_file_checksum_streaming(size, tmp_path):
+    """Assert streamed hash matches the hash of the whole content."""
+    content = os.urandom(size)
+    path = tmp_path / 'file.pbo'
+    path.write_bytes(content)
+
+    assert unit.file_checksum(str(path), buffer_size=4096) == \
+        hashlib.blake2b(content, digest_size=16).digest()
+    assert unit.file_checksum(str(path), 'adler32', buffer_size=4096) == \
+        zlib.adler32(content).to_bytes(16, 'big')
+
+
+@pytest.fixture()
+def repository(tmp_path) -> unit.Repository:
+    """Offer a repository containing a couple of mods as pytest fixture."""
+    for mod, files in {'@cba': ('addons/cba.pbo', 'mod.cpp'), '@ace': ('addons/ace.pbo',)}.items():
+        for file in files:
+            path = tmp_path.joinpath(mod, file)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(os.urandom(1024))
+
+    return unit.Repository.initialize(str(tmp_path), 'test', 'http://localhost/')
+
+
+def test_build_tree_persisted(repository):
+    """Assert a new repository object loads the tree stored by the previous build."""
+    repository.build()
+
+    reloaded = unit.Repository(repository.repo_path, 'http://localhost/')
+
+    assert reloaded.file_checksums == repository.file_checksums
+    assert set(reloaded.file_checksums) == {'@cba/addons/cba.pbo', '@cba/mod.cpp',
+                                            '@ace/addons/ace.pbo'}
+
+
+def test_open_baseline_repository(repository):
+    """Assert repositories whose tree maps absolute paths to bare checksums are rebuilt."""
+    path = os.path.join(repository.repo_path, '@cba', 'mod.cpp')
+    unit.utils.write_metadata(repository._index_file_path, {
+        'display_name': 'test', 'url': 'http://localhost/', 'configuration_version': '0.1.0',
+        'index_file_path': '.pyarmasync/repoinfo', 'tree_file_path': '.pyarmasync/repotree',
+        'sync_file_extension': '.pyarmasync'})
+    unit.utils.write_metadata(repository._tree_file_path, {path: 123456})
+
+    reloaded = unit.Repository(repository.repo_path, 'http://localhost/')
+    assert reloaded.file_checksums == {}
+    reloaded.build()
+
+    assert set(reloaded.file_checksums) == {'@cba/addons/cba.pbo', '@cba/mod.cpp',
+                                            '@ace/addons/ace.pbo'}
+
+
+def test_build_skips_unchanged_files(repository, mocker):
+    """Assert only files whose stat signature changed are hashed again."""
+    repository.build()
+    changed = os.path.join(repository.repo_path, '@ace', 'addons', 'ace.pbo')
+    with open(changed, mode='ab') as file:
+        file.write(b'update')
+
+    spy = mocker.spy(unit.signature, 'file_signature')
+    unit.Repository(repository.repo_path, 'http://localhost/').build()
+
+    spy.assert_called_once_with(changed, algorithm='blake2b')
+
+
+def test_build_paranoid_rehashes_everything(repository, mocker):
+    """Assert paranoid builds hash every file regardless of its stat signature."""
+    repository.build()
+
+    spy = mocker.spy(unit.signature, 'file_signature')
+    repository.build(paranoid=True)
+
+    assert spy.call_count == 3
+
+
+def test_build_parallel_deterministic(repository, tmp_path):
+    """Assert parallel builds produce the same tree as sequential ones."""
+    repository.build(jobs=1)
+    sequential = open(repository._tree_file_path, mode='rb').read()
+
+    repository.build(paranoid=True, jobs=4)
+
+    assert open(repository._tree_file_path, mode='rb').read() == sequential
+
+
+def test_build_errors_reported_per_file(repository, mocker):
+    """Assert failing files are reported while the others are still processed."""
+    original = unit.signature.file_signature
+
+    def failing_signature(path, *args, **kwargs):
+        if path.endswith('cba.pbo'):
+            raise PermissionError(path)
+        return original(path, *args, **kwargs)
+
+    mocker.patch('pyarmasync.signature.file_signature', side_effect=failing_signature)
+
+    with pytest.raises(exceptions.BuildError) as error:
+        repository.build(jobs=2)
+
+    assert list(error.value.errors) == ['@cba/addons/cba.pbo']
+    assert isinstance(error.value.errors['@cba/addons/cba.pbo'], PermissionError)
+    assert set(repository.file_checksums) == {'@cba/mod.cpp', '@ace/addons/ace.pbo'}
+
+
+def test_build_synchronization_packs(repository):
+    """Assert each mod has a pack holding the block signatures of its files."""
+    repository.build()
+    pack_path = os.path.join(repository.repo_path, config.index_directory, config.pack_directory,
+                             'mods', '@cba')
+    records = pack.read(pack_path)
+
+    assert set(records) == {'@cba/addons/cba.pbo', '@cba/mod.cpp'}
+    path = os.path.join(repository.repo_path, '@cba', 'mod.cpp')
+    sync_data = unit.signature.FileSignature.from_metadata(
+        unit.utils.unpack_metadata(records['@cba/mod.cpp']))
+    assert sync_data == unit.signature.file_signature(path)
+    assert sync_data.checksum == repository.file_checksums['@cba/mod.cpp'].checksum
+
+
+def test_build_publishes_sync_data_before_tree(repository, mocker):
+    """Assert packs are written before the tree and the index referencing them."""
+    original = unit.Repository._update_sync_packs
+    published = []
+
+    def update_sync_packs(self, *args):
+        published.append((os.path.exists(self._tree_file_path),
+                          'root_hash' in unit.utils.read_metadata(self._index_file_path)))
+        return original(self, *args)
+
+    mocker.patch.object(unit.Repository, '_update_sync_packs', update_sync_packs)
+    repository.build()
+
+    assert published == [(False, False)]
+    assert 'root_hash' in unit.utils.read_metadata(repository._index_file_path)
+
+
+def test_build_rewrites_changed_packs_only(repository):
+    """Assert packs of mods without changes are left untouched."""
+    repository.build()
+    pack_directory = os.path.join(repository.repo_path, config.index_directory,
+                                  config.pack_directory)
+    cba_stat = os.stat(os.path.join(pack_directory, 'mods', '@cba'))
+    with open(os.path.join(repository.repo_path, '@ace', 'addons', 'ace.pbo'), mode='ab') as file:
+        file.write(b'update')
+    with open(os.path.join(repository.repo_path, 'readme.txt'), mode='wb') as file:
+        file.write(b'readme')
+
+    repository.build()
+
+    assert os.stat(os.path.join(pack_directory, 'mods', '@cba')) == cba_stat
+    assert set(pack.read(os.path.join(pack_directory, 'root'))) == {'readme.txt'}
+    ace_records = pack.read(os.path.join(pack_directory, 'mods', '@ace'))
+    sync_data = unit.signature.FileSignature.from_metadata(
+        unit.utils.unpack_metadata(ace_records['@ace/addons/ace.pbo']))
+    assert sync_data.size == 1030
+
+
+def test_list_files(tmp_path, mocker):
+    """Assert blacklisted subdirectories are pruned and blacklisted extensions skipped."""
+    for file in ('@ace/addons/ace.pbo', '@ace/addons/ace.pbo.pyarmasync', '@ace/mod.cpp',
+                 '.pyarmasync/repotree', '@ace/.pyarmasync/repotree', 'root.txt'):
+        path = tmp_path.joinpath(*file.split('/'))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'')
+    spy = mocker.spy(os, 'scandir')
+
+    entries = list(unit.list_files(str(tmp_path), ['.pyarmasync'], ['.pyarmasync']))
+
+    assert sorted(os.path.relpath(entry.path, str(tmp_path)) for entry in entries) == \
+        [os.path.join('@ace', 'addons', 'ace.pbo'), os.path.join('@ace', 'mod.cpp'), 'root.txt']
+    assert all(isinstance(entry, os.DirEntry) for entry in entries)
+    assert spy.call_count == 3
+
+
+def test_build_removes_deleted_and_orphaned_entries(repository, mocker):
+    """Assert deleted files and legacy synchronization files are cleaned in a single walk."""
+    repository.build()
+    os.remove(os.path.join(repository.repo_path, '@ace', 'addons', 'ace.pbo'))
+    os.remove(os.path.join(repository.repo_path, '@cba', 'mod.cpp'))
+    legacy = os.path.join(repository.repo_path, '@cba', 'addons', 'cba.pbo' + config.extension)
+    open(legacy, mode='wb').close()
+    spy_scandir = mocker.spy(os, 'scandir')
+
+    repository.build()
+
+    pack_directory = os.path.join(repository.repo_path, config.index_directory,
+                                  config.pack_directory)
+    assert set(repository.file_checksums) == {'@cba/addons/cba.pbo'}
+    assert not os.path.exists(legacy)
+    assert not os.path.exists(os.path.join(pack_directory, 'mods', '@ace'))
+    assert set(pack.read(os.path.join(pack_directory, 'mods', '@cba'))) == \
+        {'@cba/addons/cba.pbo'}
+    assert spy_scandir.call_count == 5
+
+
+def test_update_touches_changed_entries_only(repository, mocker):
+    """Assert updates hash the given files only and drop entries of removed paths."""
+    repository.build()
+    changed = os.path.join(repository.repo_path, '@ace', 'addons', 'ace.pbo')
+    with open(changed, mode='ab') as file:
+        file.write(b'update')
+    added = os.path.join(repository.repo_path, '@ace', 'addons', 'new.pbo')
+    with open(added, mode='wb') as file:
+        file.write(b'new')
+    removed = os.path.join(repository.repo_path, '@cba')
+    for path in ('addons/cba.pbo', 'mod.cpp'):
+        os.remove(os.path.join(removed, *path.split('/')))
+    os.rmdir(os.path.join(removed, 'addons'))
+    os.rmdir(removed)
+    spy = mocker.spy(unit.signature, 'file_signature')
+
+    repository.update([changed, added, removed])
+
+    assert sorted(call_args[0][0] for call_args in spy.call_args_list) == [changed, added]
+    assert set(repository.file_checksums) == {'@ace/addons/ace.pbo', '@ace/addons/new.pbo'}
+    reloaded = unit.Repository(repository.repo_path, 'http://localhost/')
+    assert reloaded.file_checksums == repository.file_checksums
+    pack_directory = os.path.join(repository.repo_path, config.index_directory,
+                                  config.pack_directory)
+    assert not os.path.exists(os.path.join(pack_directory, 'mods', '@cba'))
+
+
+def test_update_rescans_directories(repository):
+    """Assert directories given to updates are rescanned, forgetting their vanished files."""
+    repository.build()
+    directory = os.path.join(repository.repo_path, '@cba')
+    os.remove(os.path.join(directory, 'mod.cpp'))
+    with open(os.path.join(directory, 'addons', 'extra.pbo'), mode='wb') as file:
+        file.write(b'extra')
+
+    repository.update([directory])
+
+    assert set(repository.file_checksums) == {'@cba/addons/cba.pbo', '@cba/addons/extra.pbo',
+                                              '@ace/addons/ace.pbo'}
+
+
+def test_watch_updates_until_stopped(repository, mocker):
+    """Assert watched changes are debounced into a single update."""
+    repository.build()
+    stop = threading.Event()
+    changed = os.path.join(repository.repo_path, '@ace', 'addons', 'ace.pbo')
+    watcher = mocker.MagicMock()
+    watcher.__enter__.return_value.poll.side_effect = [{changed}, {changed}, set(), set()]
+    mocker.patch('pyarmasync.watch.create', return_value=watcher)
+    mock_update = mocker.patch.object(repository, 'update', side_effect=lambda *_: stop.set())
+
+    repository.watch(stop, debounce=0)
+
+    mock_update.assert_called_once_with({changed}, config.build_jobs)
+
+
+def test_watch_retries_failed_files(repository, mocker):
+    """Assert failed files are retried with the next changes and failed watchers replaced."""
+    stop = threading.Event()
+    failed = os.path.join(repository.repo_path, '@ace', 'addons', 'ace.pbo')
+    changed = os.path.join(repository.repo_path, '@cba', 'mod.cpp')
+    watcher = mocker.MagicMock()
+    watcher.__enter__.return_value.poll.side_effect = [{failed}, set(), {changed}, set(),
+                                                       OSError(), set()]
+    mocker.patch('pyarmasync.watch.create', return_value=watcher)
+    mock_polling = mocker.patch('pyarmasync.watch.PollingWatcher', return_value=watcher)
+    updates = []
+
+    def update(paths, jobs):
+        updates.append(paths)
+        if len(updates) == 1:
+            raise exceptions.BuildError({'@ace/addons/ace.pbo': FileNotFoundError()})
+        if len(updates) == 3:
+            stop.set()
+
+    mocker.patch.object(repository, 'update', side_effect=update)
+
+    repository.watch(stop, debounce=0)
+
+    assert updates == [{failed}, {changed, failed}, {repository.repo_path}]
+    mock_polling.assert_called_once_with(repository.repo_path, [config.index_directory])
+
+
+def test_build_indexes_duplicates(repository):
+    """Assert files sharing the same content are grouped by content id."""
+    content = os.urandom(2048)
+    for key in ('@cba/addons/shared.pbo', '@ace/addons/shared.pbo', 'shared.pbo'):
+        with open(os.path.join(repository.repo_path, *key.split('/')), mode='wb') as file:
+            file.write(content)
+
+    repository.build()
+
+    assert list(repository.duplicates.values()) == \
+        [['@ace/addons/shared.pbo', '@cba/addons/shared.pbo', 'shared.pbo']]
+    reloaded = unit.Repository(repository.repo_path, 'http://localhost/')
+    assert reloaded.duplicates == repository.duplicates
+
+
+def test_build_stats(repository):
+    """Assert builds report their phases and the work done."""
+    stats = repository.build()
+    with open(os.path.join(repository.repo_path, '@ace', 'addons', 'ace.pbo'), mode='ab') as file:
+        file.write(b'update')
+
+    stats = repository.build()
+
+    assert stats is repository.stats
+    assert set(stats.phases) == {'walk', 'hash', 'tree', 'generations', 'index', 'packs',
+                                 'cleanup'}
+    assert (stats.files_scanned, stats.files_hashed, stats.files_skipped) == (3, 1, 2)
+    assert stats.bytes_read == 1030
+    assert stats.packs_written == 1
+    assert stats.bytes_written > 0
+    assert stats.directories_scanned == 5
+
+
+def test_build_error_carries_stats(repository, mocker):
+    """Assert statistics of failed builds are available from the error."""
+    mocker.patch('pyarmasync.signature.file_signature', side_effect=PermissionError)
+
+    with pytest.raises(exceptions.BuildError) as error:
+        repository.build()
+
+    assert error.value.stats.files_failed == 3
+
+
+def test_build_publishes_directory_hashes(repository):
+    """Assert the root hash is published in the repository information."""
+    repository.build()
+
+    repo_info = unit.utils.read_metadata(repository._index_file_path)
+    hashes = unit.utils.read_metadata(
+        os.path.join(repository.repo_path, *repo_info['directory_hashes_path'].split('/')))
+    assert dict(hashes) == repository.directory_hashes
+    assert repo_info['root_hash'] == unit.tree.directory_hashes(repository.file_checksums)['']
+
+
+def test_hash_algorithm_recorded(tmp_path):
+    """Assert the hash algorithm is recorded in the index and used to hash files."""
+    (tmp_path / 'mod.cpp').write_bytes(b'content')
+    repository = unit.Repository.initialize(str(tmp_path), 'test', 'http://localhost/',
+                                            hash_algorithm='adler32')
+    repository.build()
+
+    reloaded = unit.Repository(str(tmp_path), 'http://localhost/')
+
+    assert reloaded.hash_algorithm == 'adler32'
+    assert unit.utils.read_metadata(repository._index_file_path)['hash_algorithm'] == 'adler32'
+    assert reloaded.file_checksums['mod.cpp'].checksum == \
+        zlib.adler32(b'content').to_bytes(16, 'big')
+
+
+def test_hash_algorithm_of_former_repositories(repository):
+    """Assert repositories indexed before the algorithm was recorded keep using adler32."""
+    repo_info = unit.utils.read_metadata(repository._index_file_path)
+    del repo_info['hash_algorithm']
+    unit.utils.write_metadata(repository._index_file_path, repo_info)
+
+    assert unit.Repository(repository.repo_path, 'http://localhost/').hash_algorithm == 'adler32'
+
+
+def test_hash_algorithm_change_rehashes_everything(repository, mocker):
+    """Assert changing the hash algorithm rehashes unchanged files and rewrites every pack."""
+    repository.build()
+    changed = unit.Repository(repository.repo_path, 'http://localhost/', hash_algorithm='adler32')
+
+    spy = mocker.spy(unit.signature, 'file_signature')
+    stats = changed.update([os.path.join(repository.repo_path, '@cba', 'mod.cpp')])
+
+    assert spy.call_count == 3
+    assert stats.operation == 'build'
+    assert unit.utils.read_metadata(repository._index_file_path)['hash_algorithm'] == 'adler32'
+    assert unit.Repository(repository.repo_path, 'http://localhost/').build().files_hashed == 0
+
+
+def test_block_hash_recorded(repository, mocker):
+    """Assert the strong block hash is recorded and rebuilt if the index predates it."""
+    mocker.patch.dict('pyarmasync.hashing._ALGORITHMS',
+                      {'md5': lambda: unit.hashing._Wrapped(hashlib.md5())})
+    changed = unit.Repository(repository.repo_path, 'http://localhost/', hash_algorithm='md5')
+    changed.build()
+    repo_info = unit.utils.read_metadata(repository._index_file_path)
+    assert repo_info['block_hash'] == 'md5'
+    assert not unit.Repository(repository.repo_path, 'http://localhost/')._settings_changed()
+
+    del repo_info['block_hash']
+    unit.utils.write_metadata(repository._index_file_path, repo_info)
+    os.remove(changed._build_file_path)
+
+    assert unit.Repository(repository.repo_path, 'http://localhost/')._settings_changed()
+
+
+@pytest.mark.parametrize('settings', [{'hash_algorithm': 'adler32'},
+                                      {'block_compression': 'zlib'},
+                                      {'delta_patches': True}])
+def test_reinitialize_rebuilds_everything(settings, repository, mocker):
+    """Assert settings changed by initializing a built repository again process every file."""
+    repository.build()
+
+    changed = unit.Repository.initialize(repository.repo_path, 'test', 'http://localhost/',
+                                         overwrite=True, **settings)
+    spy = mocker.spy(unit.signature, 'file_signature')
+    stats = changed.build()
+
+    assert spy.call_count == 3
+    assert stats.files_hashed == 3
+    built = unit.utils.read_metadata(changed._build_file_path)
+    assert {key: built[key] for key in settings} == settings
+    assert unit.Repository(repository.repo_path, 'http://localhost/').build().files_hashed == 0
+
+
+def test_hash_algorithm_unsupported(tmp_path):
+    """Assert unknown hash algorithms are rejected."""
+    with pytest.raises(exceptions.UnsupportedHashAlgorithm):
+        unit.Repository(str(tmp_path), 'http://localhost/', hash_algorithm='md4')
+
+
+def test_build_compressed_payloads(repository):
+    """Assert compressible files get a compressed payload described by their pack record."""
+    text = os.path.join(repository.repo_path, '@cba', 'mod.cpp')
+    with open(text, mode='wb') as file:
+        file.write(b'name = "CBA";\n' * 1000)
+    repository.block_compression = 'zlib'
+    repository.build()
+
+    payload_directory = os.path.join(repository.repo_path, config.index_directory,
+                                     config.compressed_directory)
+    records = pack.read(os.path.join(repository.repo_path, config.index_directory,
+                                     config.pack_directory, 'mods', '@cba'))
+    sync_data = unit.signature.FileSignature.from_metadata(
+        unit.utils.unpack_metadata(records['@cba/mod.cpp']))
+    assert os.path.getsize(os.path.join(payload_directory, '@cba', 'mod.cpp')) == \
+        sum(sync_data.compressed)
+    assert not os.path.exists(os.path.join(payload_directory, '@cba', 'addons', 'cba.pbo'))
+    assert repository.stats.files_compressed == 1
+    assert unit.utils.read_metadata(repository._index_file_path)['block_compression'] == 'zlib'
+
+    os.remove(text)
+    repository.build()
+    assert not os.path.exists(os.path.join(payload_directory, '@cba', 'mod.cpp'))
+
+    repository.block_compression = None
+    repository.build()
+    assert not os.path.exists(payload_directory)
+
+
+def test_build_publishes_generations(repository):
+    """Assert builds changing the tree publish a generation and the changes since the previous."""
+    repository.build()
+    repository.build()
+    os.remove(os.path.join(repository.repo_path, '@cba', 'mod.cpp'))
+    with open(os.path.join(repository.repo_path, '@ace', 'addons', 'ace.pbo'), mode='ab') as file:
+        file.write(b'update')
+    repository.build()
+
+    index_path = os.path.join(repository.repo_path, config.index_directory)
+    repo_info = unit.utils.read_metadata(repository._index_file_path)
+    changes = unit.utils.read_metadata(os.path.join(index_path, config.changes_directory, '2'))
+    manifest = unit.tree.read_tree(os.path.join(index_path, config.generations_directory, '1'))
+    assert (repo_info['generation'], repo_info['oldest_generation']) == (2, 1)
+    assert list(changes['removed']) == ['@cba/mod.cpp']
+    assert list(changes['updated']) == ['@ace/addons/ace.pbo']
+    assert set(manifest) == {'@cba/addons/cba.pbo', '@cba/mod.cpp', '@ace/addons/ace.pbo'}
+    unit.tree.apply_changes(manifest, changes)
+    assert manifest == repository.file_checksums
+
+
+def test_build_expires_generations(repository, mocker):
+    """Assert generations older than the retention policy are removed."""
+    mocker.patch('pyarmasync.configuration.generation_retention', 2)
+    path = os.path.join(repository.repo_path, '@cba', 'mod.cpp')
+    for round in range(4):
+        with open(path, mode='ab') as file:
+            file.write(b'update')
+        repository.build()
+
+    index_path = os.path.join(repository.repo_path, config.index_directory)
+    assert sorted(os.listdir(os.path.join(index_path, config.generations_directory))) == \
+        ['3', '4']
+    assert sorted(os.listdir(os.path.join(index_path, config.changes_directory))) == ['3', '4']
+    assert unit.utils.read_metadata(repository._index_file_path)['oldest_generation'] == 3
+    assert repository.stats.generations_removed == 1
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_build_delta_patches(repository, mocker, jobs):
+    """Assert large files get a delta patch from their former version when they change."""
+    mocker.patch('pyarmasync.configuration.patch_min_size', 4096)
+    content = os.urandom(64 * 1024)
+    paths = [os.path.join(repository.repo_path, '@ace', 'addons', name)
+             for name in ('ace.pbo', 'ace_other.pbo')]
+    for path in paths:
+        with open(path, mode='wb') as file:
+            file.write(content)
+    repository.delta_patches = True
+    repository.build(jobs=jobs)
+    for path in paths:
+        with open(path, mode='wb') as file:
+            file.write(content[32768:] + b'inserted' + content[:32768])
+    repository.build(jobs=jobs)
+
+    index_path = os.path.join(repository.repo_path, config.index_directory)
+    records = pack.read(os.path.join(index_path, config.pack_directory, 'mods', '@ace'))
+    sync_data = unit.signature.FileSignature.from_metadata(
+        unit.utils.unpack_metadata(records['@ace/addons/ace.pbo']))
+    patch_path = os.path.join(index_path, config.patches_directory, '@ace', 'addons', 'ace.pbo')
+    assert repository.stats.patches_written == 2
+    assert sync_data.patch_size == os.path.getsize(patch_path) < 1024
+    assert sync_data.patch_source == hashlib.blake2b(content, digest_size=16).digest()
+    assert not os.path.exists(os.path.join(index_path, config.previous_directory, '@cba'))
+
+    repository.delta_patches = False
+    repository.build()
+    assert not os.path.exists(os.path.join(index_path, config.patches_directory))
+    assert not os.path.exists(os.path.join(index_path, config.previous_directory))
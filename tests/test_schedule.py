@@ -0,0 +1,89 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+
+"""Test suite for `pyarmasync.schedule`."""
+
+import pyarmasync.schedule as unit
+import pyarmasync.tree as tree
+
+
+def test_token_bucket(mocker):
+    """Assert consumers wait once the burst is spent, keeping the average rate."""
+    clock = mocker.patch('time.monotonic', return_value=100.0)
+    mock_sleep = mocker.patch('time.sleep')
+    bucket = unit.TokenBucket(1000)
+
+    assert bucket.consume(600) == 0
+    assert bucket.consume(600) == 0.2
+    clock.return_value = 100.5
+    assert bucket.consume(100) == 0.0
+    assert bucket.consume(1000) == 0.8
+
+    assert mock_sleep.call_args_list == [mocker.call(0.2), mocker.call(0.8)]
+
+
+def test_download_order():
+    """Assert files of required mods come first, then smaller files before larger ones."""
+    sizes = {'@cba/addons/cba.pbo': 5000, '@cba/mod.cpp': 10, '@ace/addons/ace.pbo': 9000,
+             '@ace/mod.cpp': 20, '@tfar/addons/tfar.pbo': 100}
+    remote_tree = {key: tree.FileEntry(b'', size, 0, 0) for key, size in sizes.items()}
+
+    assert unit.download_order(remote_tree, list(sizes)) == [
+        '@cba/mod.cpp', '@ace/mod.cpp', '@tfar/addons/tfar.pbo', '@cba/addons/cba.pbo',
+        '@ace/addons/ace.pbo']
+    assert unit.download_order(remote_tree, list(sizes), {'@ace'}) == [
+        '@ace/mod.cpp', '@ace/addons/ace.pbo', '@cba/mod.cpp', '@tfar/addons/tfar.pbo',
+        '@cba/addons/cba.pbo']
+
+
+def test_priority_groups():
+    """Assert files of required mods are grouped apart from the others, keeping their order."""
+    keys = ['@ace/mod.cpp', '@ace/addons/ace.pbo', '@cba/mod.cpp', '@cba/addons/cba.pbo']
+
+    assert unit.priority_groups(keys, {'@ace'}) == [keys[:2], keys[2:]]
+    assert unit.priority_groups(keys) == [keys]
+    assert unit.priority_groups([], {'@ace'}) == []
+
+
+def test_progress(mocker):
+    """Assert progress is accounted per file and the time left follows measured throughput."""
+    clock = mocker.patch('time.monotonic', return_value=0.0)
+    progress = unit.Progress(3, 6000, window=10.0)
+    updates = []
+    progress.hooks.append(lambda record: updates.append(record.bytes_done))
+
+    assert progress.eta is None
+    clock.return_value = 1.0
+    progress.advance(500)
+    clock.return_value = 2.0
+    progress.complete(1000)
+    assert progress.throughput == 500.0
+    assert progress.eta == 10.0
+
+    clock.return_value = 20.0
+    progress.complete(3000)
+
+    assert (progress.files_done, progress.bytes_done) == (2, 4000)
+    assert progress.throughput == 3000 / 18
+    assert updates == [500, 1000, 4000]
@@ -0,0 +1,125 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+
+"""Test suite for `pyarmasync.signature`."""
+
+import hashlib
+import os
+import zlib
+
+import pyarmasync.signature as unit
+
+import pytest
+
+
+@pytest.mark.parametrize('size', [0, 1, 4095, 4096, 4097, 10 * 4096 + 3])
+def test_file_signature(size, tmp_path, mocker):
+    """Assert whole file hash and block signatures match the file content."""
+    mocker.patch('pyarmasync.configuration.read_buffer_size', 3 * 4096)
+    content = os.urandom(size)
+    path = tmp_path / 'file.pbo'
+    path.write_bytes(content)
+
+    result = unit.file_signature(str(path), block_size=4096)
+
+    assert result.checksum == hashlib.blake2b(content, digest_size=16).digest()
+    assert result.size == size
+    assert result.blocks == tuple(unit.block_signature(content[offset:offset + 4096])
+                                  for offset in range(0, size, 4096))
+
+
+def test_content_id(tmp_path):
+    """Assert content ids depend on file content only."""
+    content = os.urandom(3 * 4096 + 5)
+    paths = []
+    for name, data in (('a.pbo', content), ('b.pbo', content), ('c.pbo', content[:-1] + b'x')):
+        paths.append(tmp_path / name)
+        paths[-1].write_bytes(data)
+
+    first, second, third = (unit.file_signature(str(path), 4096).content_id() for path in paths)
+
+    assert first == second
+    assert first != third
+    assert len(first) == unit.strong_digest_size
+
+
+def test_roll():
+    """Assert rolling the weak checksum equals computing it on the shifted window."""
+    content = os.urandom(1024)
+    block_size = 64
+    weak = zlib.adler32(content[:block_size])
+
+    for offset in range(1, len(content) - block_size):
+        weak = unit.roll(weak, content[offset - 1], content[offset + block_size - 1], block_size)
+        assert weak == zlib.adler32(content[offset:offset + block_size])
+
+
+def test_match_blocks(tmp_path):
+    """Assert blocks are found at their offset in a local file, even when shifted."""
+    block_size = 1024
+    remote = os.urandom(block_size * 6 + 100)
+    local = os.urandom(10) + remote[:block_size * 3] + os.urandom(block_size) + \
+        remote[block_size * 4:]
+    remote_path = tmp_path / 'remote.pbo'
+    remote_path.write_bytes(remote)
+    local_path = tmp_path / 'local.pbo'
+    local_path.write_bytes(local)
+
+    sync_data = unit.file_signature(str(remote_path), block_size=block_size)
+    sources = unit.match_blocks(str(local_path), sync_data)
+
+    assert sources == [10, 10 + block_size, 10 + 2 * block_size, None,
+                       10 + 4 * block_size, 10 + 5 * block_size, len(local) - 100]
+
+
+def test_match_blocks_missing_file(tmp_path):
+    """Assert no block is found if the local file does not exist."""
+    remote_path = tmp_path / 'remote.pbo'
+    remote_path.write_bytes(os.urandom(3000))
+    sync_data = unit.file_signature(str(remote_path), block_size=1024)
+
+    assert unit.match_blocks(str(tmp_path / 'missing.pbo'), sync_data) == [None] * 3
+
+
+def test_block_hash_algorithm(tmp_path, mocker):
+    """Assert blocks are hashed with the repository algorithm and matched with it."""
+    mocker.patch.dict('pyarmasync.hashing._ALGORITHMS',
+                      {'md5': lambda: unit.hashing._Wrapped(hashlib.md5())})
+    content = os.urandom(3 * 1024 + 7)
+    path = tmp_path / 'file.pbo'
+    path.write_bytes(content)
+
+    sync_data = unit.file_signature(str(path), block_size=1024, algorithm='md5')
+
+    assert [block.strong for block in sync_data.blocks] == \
+        [hashlib.md5(content[offset:offset + 1024]).digest() for offset in range(0, 3073, 1024)]
+    assert unit.match_blocks(str(path), sync_data, block_hash='md5') == [0, 1024, 2048, 3072]
+    assert unit.match_blocks(str(path), sync_data) == [None] * 4
+
+
+def test_strong_algorithm():
+    """Assert blocks of adler32 repositories are hashed with BLAKE2b."""
+    assert unit.strong_algorithm('adler32') == 'blake2b'
+    assert unit.strong_algorithm('blake2b') == 'blake2b'
+    assert unit.strong_algorithm('xxh3') == 'xxh3'
@@ -0,0 +1,130 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Test suite for `pyarmasync.stats`."""
+
+import contextlib
+import json
+import threading
+
+import pyarmasync.stats as unit
+
+import pytest
+
+
+def test_counters():
+    """Assert counters are declared at zero, updated and readable as attributes."""
+    stats = unit.Stats('build', ['files_hashed', 'bytes_read'])
+
+    stats.count('files_hashed')
+    stats.count('bytes_read', 100)
+    stats.count('extra', 2)
+
+    assert stats.counters == {'files_hashed': 1, 'bytes_read': 100, 'extra': 2}
+    assert stats.files_hashed == 1
+    with pytest.raises(AttributeError):
+        stats.missing
+
+
+def test_counters_thread_safe():
+    """Assert concurrent updates are not lost."""
+    stats = unit.Stats('build', ['files_hashed'])
+
+    def work():
+        for _ in range(10000):
+            stats.count('files_hashed')
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert stats.files_hashed == 40000
+
+
+def test_phases_and_hooks(mocker):
+    """Assert phase durations accumulate and hooks run around every phase."""
+    mocker.patch('time.perf_counter', side_effect=[0.0, 1.0, 3.0, 4.0, 5.0, 5.5, 6.0, 10.0])
+    calls = []
+
+    @contextlib.contextmanager
+    def hook(stats, phase):
+        calls.append(('enter', phase))
+        yield
+        calls.append(('exit', phase))
+
+    stats = unit.Stats('sync', hooks=[hook])
+    with stats.phase('check'):
+        pass
+    with stats.phase('update'):
+        pass
+    with stats.phase('check'):
+        pass
+    stats.finish()
+
+    assert stats.phases == {'check': 2.5, 'update': 1.0}
+    assert stats.duration == 10.0
+    assert calls == [('enter', 'check'), ('exit', 'check'), ('enter', 'update'),
+                     ('exit', 'update'), ('enter', 'check'), ('exit', 'check')]
+
+
+def test_timed(mocker):
+    """Assert the time spent producing items is accounted, including the final exhaustion."""
+    mocker.patch('time.perf_counter', side_effect=[0.0, 0.0, 1.0, 5.0, 7.0, 8.0, 8.5])
+    stats = unit.Stats('build')
+
+    assert list(stats.timed('walk', ['a', 'b'])) == ['a', 'b']
+    assert stats.phases == {'walk': 3.5}
+
+
+def test_exporters(tmp_path):
+    """Assert records are exported as JSON and in the Prometheus text format."""
+    stats = unit.Stats('build', ['files_hashed'])
+    stats.count('files_hashed', 3)
+    stats.add_time('hash', 1.5)
+    stats.finish()
+
+    stats.write_json(str(tmp_path / 'build.json'))
+    stats.write_prometheus(str(tmp_path / 'build.prom'))
+
+    data = json.loads((tmp_path / 'build.json').read_text())
+    assert data['operation'] == 'build'
+    assert data['phases'] == {'hash': 1.5}
+    assert data['counters'] == {'files_hashed': 3}
+    lines = (tmp_path / 'build.prom').read_text().splitlines()
+    assert 'pyarmasync_phase_duration_seconds{operation="build",phase="hash"} 1.5' in lines
+    assert '# TYPE pyarmasync_files_hashed gauge' in lines
+    assert 'pyarmasync_files_hashed{operation="build"} 3' in lines
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['build.json', 'build.prom']
+
+
+def test_profiler():
+    """Assert the profiler hook keeps a profile per phase."""
+    profiler = unit.Profiler()
+    stats = unit.Stats('build', hooks=[profiler])
+
+    with stats.phase('hash'):
+        sum(range(1000))
+
+    assert list(profiler.profiles) == ['hash']
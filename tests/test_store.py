@@ -0,0 +1,82 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+
+"""Test suite for `pyarmasync.store`."""
+
+import os
+
+import pyarmasync.store as unit
+
+import pytest
+
+
+@pytest.fixture()
+def content_store(tmp_path):
+    """Offer an empty content store as pytest fixture."""
+    return unit.ContentStore(str(tmp_path / 'store'))
+
+
+@pytest.mark.parametrize('hardlink', [True, False])
+def test_add_and_materialize(hardlink, tmp_path):
+    """Assert files are stored once and materialized as hard links only when requested."""
+    content_store = unit.ContentStore(str(tmp_path / 'store'), hardlink)
+    source = tmp_path / 'cba.pbo'
+    source.write_bytes(b'cba')
+    destination = tmp_path / 'client' / '@cba' / 'cba.pbo'
+
+    assert content_store.add('blake2b', b'c' * 16, str(source))
+    assert not content_store.add('blake2b', b'c' * 16, str(source))
+    assert content_store.materialize('blake2b', b'c' * 16, str(destination))
+    assert not content_store.materialize('blake2b', b'd' * 16, str(destination))
+
+    assert destination.read_bytes() == b'cba'
+    assert os.path.samefile(str(source), str(destination)) == hardlink
+    assert content_store.get('xxh3', b'c' * 16) is None
+
+
+def test_modified_blob_discarded(content_store, tmp_path):
+    """Assert blobs modified through one of their hard links are no longer used."""
+    source = tmp_path / 'cba.pbo'
+    source.write_bytes(b'cba')
+    content_store.add('blake2b', b'c' * 16, str(source))
+
+    source.write_bytes(b'modified')
+
+    assert content_store.get('blake2b', b'c' * 16) is None
+    assert content_store.blobs == {}
+
+
+def test_collect_and_save(content_store, tmp_path):
+    """Assert unreferenced blobs are removed and the index survives reloading the store."""
+    for name in ('cba', 'ace'):
+        (tmp_path / name).write_bytes(name.encode())
+        content_store.add('blake2b', name.encode() * 4, str(tmp_path / name))
+
+    assert content_store.collect({content_store.key('blake2b', b'cba' * 4)}) == 1
+    content_store.save()
+
+    reloaded = unit.ContentStore(content_store.path)
+    assert list(reloaded.blobs) == [content_store.key('blake2b', b'cba' * 4)]
+    assert reloaded.get('blake2b', b'ace' * 4) is None
+    assert not os.path.exists(os.path.join(content_store.path, 'blake2b', '61'))
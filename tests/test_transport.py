@@ -0,0 +1,154 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+
+"""Test suite for `pyarmasync.transport`."""
+
+import http.client
+import os
+
+import pyarmasync.exceptions as exceptions
+import pyarmasync.transport as unit
+
+import pytest
+
+
+@pytest.fixture()
+def files(server):
+    """Offer the content of a few files stored in the `server` repository as pytest fixture."""
+    content = {'@mod/file{}.paa'.format(index): os.urandom(index * 100)
+               for index in range(20)}
+    content['@mod/with space.paa'] = b'space'
+    for key, data in content.items():
+        server.write(key, data)
+    return content
+
+
+def test_http_fetch(server, files):
+    """Assert whole files and ranges are fetched."""
+    transport = unit.create(server.url)
+
+    assert isinstance(transport, unit.HTTPTransport)
+    assert transport.fetch('@mod/file7.paa') == files['@mod/file7.paa']
+    assert transport.fetch('@mod/file7.paa', 10, 20) == files['@mod/file7.paa'][10:20]
+    assert transport.fetch('@mod/with space.paa') == b'space'
+
+
+def test_http_fetch_many_reuses_connections(server, files):
+    """Assert concurrent fetches keep their order and reuse pooled connections."""
+    transport = unit.HTTPTransport(server.url, connections=3)
+    keys = sorted(files)
+
+    result = list(transport.fetch_many((key, None, None) for key in keys * 3))
+
+    assert result == [files[key] for key in keys * 3]
+    assert server.connections <= 3
+    transport.close()
+
+
+def test_http_not_found(server, mocker):
+    """Assert client errors are raised without retrying."""
+    mock_sleep = mocker.patch('time.sleep')
+    transport = unit.HTTPTransport(server.url)
+
+    with pytest.raises(exceptions.RemoteError) as error:
+        transport.fetch('missing.pbo')
+
+    assert error.value.status == 404
+    mock_sleep.assert_not_called()
+
+
+def test_http_retry_with_backoff(server, files, mocker):
+    """Assert failed requests are retried with an exponentially increasing delay."""
+    mock_sleep = mocker.patch('time.sleep')
+    original_request = http.client.HTTPConnection.request
+    failures = [ConnectionResetError(), http.client.RemoteDisconnected()]
+
+    def flaky_request(self, *args, **kwargs):
+        if failures:
+            raise failures.pop(0)
+        return original_request(self, *args, **kwargs)
+
+    mocker.patch.object(http.client.HTTPConnection, 'request', flaky_request)
+    transport = unit.HTTPTransport(server.url, retries=2, backoff=0.5)
+
+    assert transport.fetch('@mod/file3.paa') == files['@mod/file3.paa']
+    assert mock_sleep.call_args_list == [mocker.call(0.5), mocker.call(1.0)]
+
+
+def test_file_fetch(server, files):
+    """Assert whole files and ranges are read from file URLs."""
+    transport = unit.create('file://localhost' + server.path)
+
+    assert isinstance(transport, unit.FileTransport)
+    assert transport.fetch('@mod/file7.paa') == files['@mod/file7.paa']
+    assert transport.fetch('@mod/file7.paa', 10, 20) == files['@mod/file7.paa'][10:20]
+
+
+def test_file_copy(server, files, tmp_path):
+    """Assert files and ranges are copied by file transports."""
+    transport = unit.create('file://localhost' + server.path)
+    destination = tmp_path / 'copy.paa'
+    destination.write_bytes(bytes(100))
+
+    assert transport.direct
+    with open(str(destination), mode='r+b') as file:
+        assert transport.copy('@mod/file7.paa', file.fileno(), 10, 20, 50) == 10
+    assert transport.clone('@mod/file9.paa', str(tmp_path / 'clone.paa'))
+
+    assert destination.read_bytes() == bytes(50) + files['@mod/file7.paa'][10:20] + bytes(40)
+    assert (tmp_path / 'clone.paa').read_bytes() == files['@mod/file9.paa']
+    assert not os.path.samefile(str(tmp_path / 'clone.paa'),
+                                os.path.join(server.path, '@mod', 'file9.paa'))
+
+
+def test_http_copy(server, files, tmp_path):
+    """Assert content fetched over HTTP is written to the destination file."""
+    transport = unit.create(server.url)
+    destination = tmp_path / 'copy.paa'
+
+    assert not transport.direct
+    with open(str(destination), mode='wb') as file:
+        assert transport.copy('@mod/file7.paa', file.fileno(), offset=5) == 700
+    assert not transport.clone('@mod/file7.paa', str(tmp_path / 'clone.paa'))
+
+    assert destination.read_bytes() == bytes(5) + files['@mod/file7.paa']
+
+
+@pytest.mark.parametrize('url', ['http', 'file'])
+def test_rate_limit_per_chunk(url, server, tmp_path, mocker):
+    """Assert rate limited transports charge the limit while content is being read."""
+    mocker.patch('time.sleep')
+    content = os.urandom(300000)
+    server.write('@mod/large.pbo', content)
+    transport = unit.create(server.url if url == 'http' else 'file://localhost' + server.path,
+                            rate_limit=100000)
+    spy = mocker.spy(transport.limiter, 'consume')
+
+    assert transport.fetch('@mod/large.pbo') == content
+    assert transport.fetch('@mod/large.pbo', 1000, 200000) == content[1000:200000]
+    with open(str(tmp_path / 'copy.pbo'), mode='wb') as file:
+        assert transport.copy('@mod/large.pbo', file.fileno()) == 300000
+
+    assert max(call.args[0] for call in spy.call_args_list) <= 64 * 1024
+    assert sum(call.args[0] for call in spy.call_args_list) == 300000 + 199000 + 300000
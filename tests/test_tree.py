@@ -0,0 +1,214 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+
+"""Test suite for `pyarmasync.tree`."""
+
+import msgpack
+
+import pyarmasync.tree as unit
+
+import pytest
+
+
+def checksum(number):
+    """Return the whole file hash of a test entry, padded like converted adler32 checksums."""
+    return number.to_bytes(16, 'big')
+
+
+TREE = {
+    '@ace/addons/ace_common.pbo': unit.FileEntry(checksum(1), 100, 1000, 11, b'\x01' * 16),
+    '@ace/addons/ace_common.pbo.bisign': unit.FileEntry(checksum(2), 200, 2000, 12),
+    '@ace/mod.cpp': unit.FileEntry(checksum(3), 300, 3000, 13),
+    '@acex/addons/acex_main.pbo': unit.FileEntry(checksum(1), 100, 4000, 14, b'\x01' * 16),
+    '@cba/addons/cba_main.pbo': unit.FileEntry(checksum(0xffffffff), 2 ** 40, -5, 2 ** 63),
+    'keys/ünïcode.bikey': unit.FileEntry(checksum(6), 600, 6000, 16),
+    'readme.txt': unit.FileEntry(checksum(7), 700, 7000, 17),
+}
+
+
+@pytest.mark.parametrize('compress_paths', [True, False])
+def test_index_roundtrip(compress_paths):
+    """Assert every entry can be looked up and iteration follows path order."""
+    index = unit.TreeIndex(unit.pack_tree(TREE, compress_paths))
+
+    assert len(index) == len(TREE)
+    assert list(index) == sorted(TREE)
+    assert dict(index.items()) == TREE
+    for path, entry in TREE.items():
+        assert index[path] == entry
+    assert '@ace/addons' not in index
+    assert index.get('missing') is None
+
+
+def test_index_prefix_compression():
+    """Assert the prefix table makes indexes of deep trees smaller."""
+    tree = {'@mod/addons/data/textures/file{}.paa'.format(number):
+            unit.FileEntry(checksum(number), 1, 1, 1) for number in range(100)}
+
+    assert len(unit.pack_tree(tree, True)) < len(unit.pack_tree(tree, False))
+
+
+@pytest.mark.parametrize('prefix,paths', [
+    ('@ace/', ['@ace/addons/ace_common.pbo', '@ace/addons/ace_common.pbo.bisign',
+               '@ace/mod.cpp']),
+    ('@acex/', ['@acex/addons/acex_main.pbo']),
+    ('@ace', ['@ace/addons/ace_common.pbo', '@ace/addons/ace_common.pbo.bisign',
+              '@ace/mod.cpp', '@acex/addons/acex_main.pbo']),
+    ('@rhs/', []),
+    ('', sorted(TREE)),
+])
+def test_index_scan(prefix, paths):
+    """Assert range scans return the entries of a folder only."""
+    index = unit.TreeIndex(unit.pack_tree(TREE))
+
+    assert [path for path, _ in index.scan(prefix)] == paths
+
+
+def test_write_and_open(tmp_path):
+    """Assert indexes written to disk can be memory-mapped."""
+    path = str(tmp_path / 'index' / 'repotree')
+    unit.write_tree(path, TREE)
+
+    with unit.TreeIndex.open(path) as index:
+        assert index['@ace/mod.cpp'] == TREE['@ace/mod.cpp']
+    assert unit.read_tree(path) == TREE
+
+
+def test_read_tree_maps_index(tmp_path, mocker):
+    """Assert stored indexes are decoded from a memory map, legacy trees from their content."""
+    spy = mocker.spy(unit.TreeIndex, 'open')
+    path = str(tmp_path / 'repotree')
+    unit.write_tree(path, TREE)
+    legacy_path = str(tmp_path / 'legacy')
+    unit.utils.write_metadata(legacy_path, {'mod.cpp': (7, 700, 7000, 17)})
+
+    assert unit.read_tree(path) == TREE
+    assert unit.read_tree(legacy_path) == {'mod.cpp': unit.FileEntry(checksum(7), 700, 7000, 17)}
+    assert spy.call_count == 1
+
+
+def test_index_format_1(mocker):
+    """Assert indexes written before content ids were stored can still be read."""
+    mocker.patch.object(unit, 'format_version', 1)
+    mocker.patch.object(unit, '_RECORD', unit._RECORDS[1])
+    content = unit.pack_tree({path: (int.from_bytes(entry.checksum, 'big'), *entry[1:4])
+                              for path, entry in TREE.items()})
+    mocker.stopall()
+
+    index = unit.TreeIndex(content)
+
+    assert dict(index.items()) == {path: entry._replace(content=b'')
+                                   for path, entry in TREE.items()}
+
+
+def test_index_format_2(mocker):
+    """Assert indexes storing adler32 checksums as integers can still be read."""
+    mocker.patch.object(unit, 'format_version', 2)
+    mocker.patch.object(unit, '_RECORD', unit._RECORDS[2])
+    content = unit.pack_tree({path: (int.from_bytes(entry.checksum, 'big'), *entry[1:])
+                              for path, entry in TREE.items()})
+    mocker.stopall()
+
+    assert dict(unit.TreeIndex(content).items()) == TREE
+
+
+def test_content_index():
+    """Assert paths sharing the same content are grouped by content id."""
+    assert unit.content_index(unit.TreeIndex(unit.pack_tree(TREE))) == \
+        {b'\x01' * 16: ['@ace/addons/ace_common.pbo', '@acex/addons/acex_main.pbo']}
+
+
+def test_match_moves():
+    """Assert added paths are matched to removed paths by size, checksum and content id."""
+    removed = {'@ace/addons/ace_main.pbo': unit.FileEntry(checksum(1), 100, 1, 1),
+               '@ace/addons/ace_copy.pbo': unit.FileEntry(checksum(1), 100, 1, 2),
+               '@ace/addons/ace_other.pbo': unit.FileEntry(checksum(1), 100, 1, 3, b'\x01' * 16),
+               '@ace/mod.cpp': unit.FileEntry(checksum(2), 200, 1, 4),
+               '@ace/empty.txt': unit.FileEntry(checksum(1), 0, 1, 5)}
+    added = {'@ace3/addons/ace_main.pbo': unit.FileEntry(checksum(1), 100, 2, 6),
+             '@ace3/addons/ace_renamed.pbo': unit.FileEntry(checksum(1), 100, 2, 7, b'\x02' * 16),
+             '@ace3/mod.cpp': unit.FileEntry(checksum(2), 201, 2, 8),
+             '@ace3/empty.txt': unit.FileEntry(checksum(1), 0, 2, 9)}
+
+    assert unit.match_moves(removed, added) == {
+        '@ace3/addons/ace_main.pbo': '@ace/addons/ace_main.pbo',
+        '@ace3/addons/ace_renamed.pbo': '@ace/addons/ace_copy.pbo',
+    }
+
+
+def test_load_legacy_tree():
+    """Assert trees stored with the former metadata format can still be loaded."""
+    content = msgpack.packb({path: [int.from_bytes(entry.checksum, 'big'), *entry[1:4]]
+                             for path, entry in TREE.items()}, use_bin_type=True)
+
+    assert dict(unit.load_tree(content)) == {path: entry._replace(content=b'')
+                                             for path, entry in TREE.items()}
+
+
+def test_load_baseline_tree():
+    """Assert trees mapping absolute paths to bare checksums are loaded as empty trees."""
+    content = msgpack.packb({'/srv/repo/@cba/mod.cpp': 123456, '/srv/repo/@ace/mod.cpp': 7},
+                            use_bin_type=True)
+
+    assert unit.load_tree(content) == {}
+
+
+def test_invalid_index():
+    """Assert buffers not containing an index are rejected."""
+    with pytest.raises(ValueError):
+        unit.TreeIndex(b'garbage')
+
+
+def test_directory_hashes():
+    """Assert directory hashes change along the path of changed entries only."""
+    hashes = unit.directory_hashes(TREE)
+    changed = dict(TREE)
+    changed['@ace/mod.cpp'] = TREE['@ace/mod.cpp']._replace(checksum=checksum(99))
+    touched = dict(TREE)
+    touched['@ace/mod.cpp'] = TREE['@ace/mod.cpp']._replace(mtime_ns=99, inode=99)
+
+    changed_hashes = unit.directory_hashes(changed)
+
+    assert set(hashes) == {'', '@ace', '@ace/addons', '@acex', '@acex/addons', '@cba',
+                           '@cba/addons', 'keys'}
+    assert {path for path in hashes if hashes[path] != changed_hashes[path]} == {'', '@ace'}
+    assert unit.directory_hashes(touched) == hashes
+    assert unit.directory_hashes(unit.TreeIndex(unit.pack_tree(TREE))) == hashes
+
+
+def test_change_list_roundtrip():
+    """Assert applying a stored change list turns the former tree into the new one."""
+    updated = dict(TREE)
+    del updated['readme.txt']
+    updated['@ace/mod.cpp'] = TREE['@ace/mod.cpp']._replace(checksum=checksum(99))
+    updated['@ace/new.pbo'] = unit.FileEntry(checksum(8), 800, 8000, 18)
+    changes = unit.change_list({path: updated[path] for path in ('@ace/mod.cpp', '@ace/new.pbo')},
+                               ['readme.txt'])
+
+    former = dict(TREE)
+    changed = unit.apply_changes(former, unit.utils.unpack_metadata(
+        unit.utils.pack_metadata(changes)))
+
+    assert former == updated
+    assert changed == {'@ace/mod.cpp', '@ace/new.pbo', 'readme.txt'}
@@ -23,6 +23,8 @@
 
 """Test suite for `pyarmasync.utils`."""
 
+import os
+
 import pyarmasync.exceptions as exceptions
 import pyarmasync.utils as unit
 
@@ -73,3 +75,80 @@ def test_read_metadata(mocker):
     result = unit.read_metadata(filename)
 
     assert result == expected_content
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_bounded_map_order_and_errors(jobs):
+    """Assert results keep input order and errors are reported per item."""
+    def invert(value):
+        return 1 / value
+
+    results = list(unit.bounded_map(invert, [1, 0, 2, 4], jobs=jobs))
+
+    assert [(item, result) for item, result, _ in results] == \
+        [(1, 1.0), (0, None), (2, 0.5), (4, 0.25)]
+    assert isinstance(results[1][2], ZeroDivisionError)
+
+
+def test_bounded_map_max_pending():
+    """Assert no more than `max_pending` items are consumed ahead of the results."""
+    consumed = []
+
+    def items():
+        for item in range(10):
+            consumed.append(item)
+            yield item
+
+    results = unit.bounded_map(lambda item: item, items(), jobs=2, max_pending=3)
+    next(results)
+
+    assert len(consumed) == 3
+    assert [item for item, _, _ in results] == list(range(1, 10))
+
+
+@pytest.mark.parametrize('unsupported', [(), ('os.copy_file_range',),
+                                         ('os.copy_file_range', 'os.sendfile')])
+def test_copy_range(unsupported, tmp_path, mocker):
+    """Assert ranges are copied between files, falling back to plain reads and writes."""
+    for name in unsupported:
+        mocker.patch(name, side_effect=OSError)
+    content = os.urandom(5000)
+    (tmp_path / 'source.pbo').write_bytes(content)
+    (tmp_path / 'destination.pbo').write_bytes(bytes(3000))
+
+    with open(str(tmp_path / 'source.pbo'), mode='rb') as source, \
+            open(str(tmp_path / 'destination.pbo'), mode='r+b') as destination:
+        assert unit.copy_range(source.fileno(), destination.fileno(), 1000, 2000, 500,
+                               buffer_size=300) == 2000
+        assert unit.copy_range(source.fileno(), destination.fileno(), 4500, 1000, 3000) == 500
+
+    assert (tmp_path / 'destination.pbo').read_bytes() == \
+        bytes(500) + content[1000:3000] + bytes(500) + content[4500:]
+
+
+@pytest.mark.parametrize('hardlink', [True, False])
+def test_clone_file(hardlink, tmp_path):
+    """Assert files are cloned atomically, as hard links only when requested."""
+    source = tmp_path / 'source.pbo'
+    source.write_bytes(b'content')
+    destination = tmp_path / 'mod' / 'destination.pbo'
+    destination.parent.mkdir()
+    destination.write_bytes(b'previous content')
+
+    method = unit.clone_file(str(source), str(destination), hardlink)
+
+    assert destination.read_bytes() == b'content'
+    assert os.listdir(str(destination.parent)) == ['destination.pbo']
+    assert (method == 'hardlink') == hardlink
+    assert os.path.samefile(str(source), str(destination)) == hardlink
+
+
+def test_clone_file_falls_back_to_copy(tmp_path, mocker):
+    """Assert files are copied where neither hard links nor reflinks are supported."""
+    mocker.patch('os.link', side_effect=OSError)
+    mocker.patch('fcntl.ioctl', side_effect=OSError)
+    source = tmp_path / 'source.pbo'
+    source.write_bytes(b'content')
+
+    assert unit.clone_file(str(source), str(tmp_path / 'copy.pbo'), True) == 'copy'
+    assert (tmp_path / 'copy.pbo').read_bytes() == b'content'
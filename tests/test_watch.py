@@ -0,0 +1,114 @@
+# --------------------------------License Notice----------------------------------
+# pyarmasync - Arma3 mod synchronization tool
+#
+# Copyright (C) 2018 Enrico Ghidoni (enricoghdn@gmail.com)
+#
+# The authors of this software are listed in the AUTHORS file at the
+# root of this software's source code tree.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+# All rights reserved.
+# --------------------------------License Notice----------------------------------
+
+"""Test suite for `pyarmasync.watch`."""
+
+import ctypes
+import errno
+
+import pyarmasync.watch as unit
+
+import pytest
+
+
+def _inotify_watcher(path, excluded_subdirs):
+    """Create an inotify watcher, skipping the test where inotify is not available."""
+    try:
+        return unit.InotifyWatcher(path, excluded_subdirs)
+    except OSError:
+        pytest.skip('inotify is not available')
+
+
+def _polling_watcher(path, excluded_subdirs):
+    """Create a polling watcher scanning at every poll."""
+    return unit.PollingWatcher(path, excluded_subdirs, interval=0)
+
+
+@pytest.fixture(params=[_polling_watcher, _inotify_watcher])
+def watched(request, tmp_path):
+    """Offer a watched tree with an excluded index directory as pytest fixture."""
+    for file in ('@ace/addons/ace.pbo', '.pyarmasync/repotree'):
+        path = tmp_path.joinpath(*file.split('/'))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'content')
+
+    with request.param(str(tmp_path), ['.pyarmasync']) as watcher:
+        yield tmp_path, watcher
+
+
+def test_watcher_reports_changes(watched):
+    """Assert created, modified and deleted files are reported, excluded directories are not."""
+    tmp_path, watcher = watched
+    modified = tmp_path.joinpath('@ace', 'addons', 'ace.pbo')
+    created = tmp_path.joinpath('@cba', 'addons', 'cba.pbo')
+    created.parent.mkdir(parents=True)
+    created.write_bytes(b'new')
+    with modified.open(mode='ab') as file:
+        file.write(b'update')
+    tmp_path.joinpath('.pyarmasync', 'repotree').write_bytes(b'updated')
+
+    changes = watcher.poll(1)
+
+    assert str(modified) in changes
+    assert str(created) in changes or str(created.parent.parent) in changes
+    assert not any('.pyarmasync' in path for path in changes)
+
+    modified.unlink()
+    changes = watcher.poll(1)
+
+    assert str(modified) in changes
+    assert watcher.poll(0) == set()
+
+
+def test_create_falls_back_to_polling(tmp_path, mocker):
+    """Assert a polling watcher is used where inotify is not available."""
+    mocker.patch('pyarmasync.watch._libc', return_value=None)
+
+    with unit.create(str(tmp_path)) as watcher:
+        assert isinstance(watcher, unit.PollingWatcher)
+
+
+def test_inotify_watch_limit(tmp_path, mocker):
+    """Assert directories which cannot be watched make inotify watchers fail, not skip them."""
+    tmp_path.joinpath('@ace', 'addons').mkdir(parents=True)
+    libc = unit._libc()
+    if libc is None:
+        pytest.skip('inotify is not available')
+    add_watch = libc.inotify_add_watch
+    calls = []
+
+    def limited_add_watch(fd, path, mask):
+        calls.append(path)
+        if len(calls) > 1:
+            ctypes.set_errno(errno.ENOSPC)
+            return -1
+        return add_watch(fd, path, mask)
+
+    libc.inotify_add_watch = limited_add_watch
+    mocker.patch('pyarmasync.watch._libc', return_value=libc)
+
+    with pytest.raises(OSError) as error:
+        unit.InotifyWatcher(str(tmp_path))
+    assert error.value.errno == errno.ENOSPC
+    with unit.create(str(tmp_path)) as watcher:
+        assert isinstance(watcher, unit.PollingWatcher)